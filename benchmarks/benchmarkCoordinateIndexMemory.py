@@ -0,0 +1,73 @@
+"""
+This script compares the memory used by the dictionary built by DataFrame_to_Dictionary_converter.convert_df_to_map
+with the memory used by a CoordinateIndex built from the same synthetic dataframe.
+
+Usage: python benchmarks/benchmarkCoordinateIndexMemory.py [number_of_rows] [snippets_per_image]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetGenerator import DataFrame_to_Dictionary_converter  # noqa: E402
+
+
+def build_dataframe(number_of_rows: int, snippets_per_image: int):
+    """
+    This function builds a dataframe that looks like our annotation files: every image has snippets_per_image fields
+    and the field names repeat from image to image.
+    """
+    rng = np.random.default_rng(0)
+    row_ids = np.arange(number_of_rows)
+    df = pd.DataFrame(
+        {
+            "image_name": [f"image_{i}" for i in row_ids // snippets_per_image],
+            "snip_name": [f"field_{i}" for i in row_ids % snippets_per_image],
+        }
+    )
+
+    for column in ["x1", "y1", "x2", "y2", "x3", "y3", "x4", "y4"]:
+        df[column] = rng.integers(0, 5000, number_of_rows)
+
+    return df
+
+
+def measure(build):
+    """
+    This function returns the object that build returns, the bytes it holds on to and the seconds it took to build it.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, size, seconds
+
+
+if __name__ == "__main__":
+    number_of_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    snippets_per_image = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    df = build_dataframe(number_of_rows, snippets_per_image)
+    converter = DataFrame_to_Dictionary_converter()
+
+    print(f"{number_of_rows} snippets, {snippets_per_image} per image")
+    print(f"{'structure':<12}{'MiB':>10}{'bytes/snippet':>16}{'build s':>10}")
+
+    for name, build in [
+        ("dict", lambda: converter.convert_df_to_map(df)),
+        ("index", lambda: converter.convert_df_to_index(df)),
+    ]:
+        result, size, seconds = measure(build)
+        print(
+            f"{name:<12}{size / 2**20:>10.1f}{size / number_of_rows:>16.1f}{seconds:>10.2f}"
+        )
+        del result
@@ -0,0 +1,118 @@
+"""
+This script compares writing the snippets of each image into a directory of its own one snippet at a time, checking for and creating the directory
+of every snippet, with SnippetWriters.DirectorySnippetWriter, which creates the directory of an image once and writes its snippets in a pool of threads.
+The snippets of the iowa_image.tar test resource are encoded once and written as copies images. latency_ms adds a delay to every stat, mkdir and
+open, to stand in for the round trips of a network file system.
+
+Usage: python benchmarks/benchmarkDirectoryWriter.py [copies] [latency_ms]
+"""
+
+import builtins
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetGenerator import SnippetGenerator  # noqa: E402
+from SnippetWriters import DirectorySnippetWriter  # noqa: E402
+
+
+def get_encoded_snippets():
+    """
+    This function returns the encoded snippets of iowa_image.tar as (snippet_filename, snippet_bytes).
+    """
+    resources = os.path.join(root, "tests", "resources")
+    df = pd.read_csv(os.path.join(resources, "iowa.tsv"), sep="\t")
+    snippet_generator = SnippetGenerator(df)
+
+    return [
+        (snippet_generator.get_snippet_filename(image_name, field), snippet_bytes)
+        for _, image_name, field, snippet_bytes in snippet_generator.stream_snippets(
+            [os.path.join(resources, "iowa_image.tar")], output="bytes"
+        )
+    ]
+
+
+def write_one_snippet_at_a_time(
+    output_directory: str, encoded_snippets: list, copies: int
+):
+    for copy in range(copies):
+        snippet_directory = os.path.join(output_directory, "reel", f"image_{copy}")
+
+        for snippet_filename, snippet_bytes in encoded_snippets:
+            if not os.path.exists(snippet_directory):
+                os.makedirs(snippet_directory)
+
+            with open(os.path.join(snippet_directory, snippet_filename), "wb") as file:
+                file.write(snippet_bytes)
+
+
+def write_with_directory_writer(
+    output_directory: str, encoded_snippets: list, copies: int, threads: int
+):
+    with DirectorySnippetWriter(output_directory, threads) as writer:
+        for copy in range(copies):
+            writer.add_image(os.path.join("reel", f"image_{copy}"), encoded_snippets)
+
+
+@contextlib.contextmanager
+def file_system_latency(seconds: float):
+    """
+    This context manager delays every os.stat, os.mkdir and open by seconds.
+    """
+    functions = [(os, "stat"), (os, "mkdir"), (builtins, "open")]
+    originals = [getattr(module, name) for module, name in functions]
+
+    def delayed(function):
+        def delayed_function(*args, **kwargs):
+            time.sleep(seconds)
+            return function(*args, **kwargs)
+
+        return delayed_function
+
+    for (module, name), function in zip(functions, originals):
+        setattr(module, name, delayed(function))
+    try:
+        yield
+    finally:
+        for (module, name), function in zip(functions, originals):
+            setattr(module, name, function)
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    encoded_snippets = get_encoded_snippets()
+
+    print(
+        f"{copies} images, {copies * len(encoded_snippets)} snippets, {latency_ms} ms latency"
+    )
+    print(f"{'writer':<28}{'ms':>10}")
+
+    for name, write in [
+        ("one snippet at a time", write_one_snippet_at_a_time),
+        (
+            "DirectorySnippetWriter 0",
+            lambda *args: write_with_directory_writer(*args, 0),
+        ),
+        (
+            "DirectorySnippetWriter 4",
+            lambda *args: write_with_directory_writer(*args, 4),
+        ),
+        (
+            "DirectorySnippetWriter 16",
+            lambda *args: write_with_directory_writer(*args, 16),
+        ),
+    ]:
+        with tempfile.TemporaryDirectory() as output_directory:
+            with file_system_latency(latency_ms / 1000):
+                start = time.perf_counter()
+                write(output_directory, encoded_snippets, copies)
+                seconds = time.perf_counter() - start
+
+        print(f"{name:<28}{seconds * 1000:>10.1f}")
@@ -0,0 +1,66 @@
+"""
+This script compares the time it takes to encode the snippets of the test resources with every SnippetEncoder
+with the number of bytes they take up, so the output format of a job can be chosen by trading disk space for throughput.
+
+Usage: python benchmarks/benchmarkSnippetEncoders.py [repeats]
+"""
+
+import os
+import sys
+import time
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetGenerator import SnippetGenerator  # noqa: E402
+from SnippetEncoder import SnippetEncoder  # noqa: E402
+
+ENCODERS = [
+    ("png", SnippetEncoder("png")),
+    ("png level 0", SnippetEncoder("png", compress_level=0)),
+    ("png level 1", SnippetEncoder("png", compress_level=1)),
+    ("png level 9", SnippetEncoder("png", compress_level=9)),
+    ("webp method 0", SnippetEncoder("webp", compress_level=0)),
+    ("webp", SnippetEncoder("webp")),
+    ("jpeg q90", SnippetEncoder("jpeg", quality=90)),
+    ("jpeg q75", SnippetEncoder("jpeg", quality=75)),
+    ("tiff (raw)", SnippetEncoder("tiff")),
+]
+
+
+def get_snippets():
+    """
+    This function crops every snippet of the test resources once, so only encoding is timed.
+    """
+    resources = os.path.join(root, "tests", "resources")
+    df = pd.read_csv(os.path.join(resources, "iowa.tsv"), sep="\t")
+    snippet_generator = SnippetGenerator(df)
+
+    snippets = []
+    for image_name, image in snippet_generator.yield_image_and_name_from_tarfile(
+        os.path.join(resources, "iowa_image.tar")
+    ):
+        for _, snippet in snippet_generator.yield_snippet_and_field(image_name, image):
+            snippets.append(snippet)
+
+    return snippets
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    snippets = get_snippets()
+
+    print(f"{len(snippets)} snippets, best of {repeats}")
+    print(f"{'encoder':<16}{'ms':>10}{'KiB':>10}{'bytes/snippet':>16}")
+
+    for name, snippet_encoder in ENCODERS:
+        seconds = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            size = sum(len(snippet_encoder.encode(snippet)) for snippet in snippets)
+            seconds.append(time.perf_counter() - start)
+
+        print(
+            f"{name:<16}{min(seconds) * 1000:>10.1f}{size / 1024:>10.1f}{size / len(snippets):>16.0f}"
+        )
@@ -0,0 +1,84 @@
+"""
+This script compares the throughput and size of the ways a tarfile of snippets can be written: uncompressed, gzipped by tarfile in the writing
+thread, gzipped by a ParallelGzipFile with several threads, and stored in gzip format without compression.
+The snippets of the test resources are encoded once and written copies times, so only writing and compressing is timed.
+
+Usage: python benchmarks/benchmarkTarCompression.py [copies]
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetGenerator import SnippetGenerator  # noqa: E402
+from SnippetWriters import open_tar_for_writing  # noqa: E402
+
+# (name, outfile, compress_level, compression_threads)
+WRITERS = [
+    ("tar", "snippets.tar", 9, 0),
+    ("w:gz level 9", "snippets.tar.gz", 9, 0),
+    ("w:gz level 6", "snippets.tar.gz", 6, 0),
+    ("w:gz level 1", "snippets.tar.gz", 1, 0),
+    ("parallel 6 x1", "snippets.tar.gz", 6, 1),
+    ("parallel 6 x2", "snippets.tar.gz", 6, 2),
+    ("parallel 6 x4", "snippets.tar.gz", 6, 4),
+    ("stored level 0", "snippets.tar.gz", 0, 1),
+]
+
+
+def get_encoded_snippets():
+    """
+    This function returns the encoded snippets of the test resources as (tar_path, snippet_bytes).
+    """
+    resources = os.path.join(root, "tests", "resources")
+    df = pd.read_csv(os.path.join(resources, "iowa.tsv"), sep="\t")
+    snippet_generator = SnippetGenerator(df)
+
+    return [
+        (
+            os.path.join(reel_name, image_name, f"{image_name}_{field}.png"),
+            snippet_bytes,
+        )
+        for reel_name, image_name, field, snippet_bytes in snippet_generator.stream_snippets(
+            [os.path.join(resources, "iowa_image.tar")], output="bytes"
+        )
+    ]
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    encoded_snippets = get_encoded_snippets()
+    payload = copies * sum(len(snippet_bytes) for _, snippet_bytes in encoded_snippets)
+
+    print(
+        f"{copies * len(encoded_snippets)} snippets, {payload / 2**20:.1f} MiB of PNG"
+    )
+    print(f"{'writer':<16}{'s':>8}{'MiB/s':>10}{'MiB':>10}")
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        for name, outfile, compress_level, compression_threads in WRITERS:
+            outfile_path = os.path.join(output_directory, outfile)
+
+            start = time.perf_counter()
+            with open_tar_for_writing(
+                outfile_path, compress_level, compression_threads
+            ) as tar_out:
+                for copy in range(copies):
+                    for tar_path, snippet_bytes in encoded_snippets:
+                        snippet_info = tarfile.TarInfo(f"{copy}/{tar_path}")
+                        snippet_info.size = len(snippet_bytes)
+                        tar_out.addfile(snippet_info, io.BytesIO(snippet_bytes))
+            seconds = time.perf_counter() - start
+
+            size = os.path.getsize(outfile_path)
+            print(
+                f"{name:<16}{seconds:>8.2f}{payload / 2**20 / seconds:>10.1f}{size / 2**20:>10.1f}"
+            )
+            os.remove(outfile_path)
@@ -0,0 +1,94 @@
+"""
+This script compares writing encoded snippets into a tarfile with tarfile.TarFile.addfile, which copies each snippet out of a BytesIO in chunks
+and keeps a TarInfo per member, with SnippetWriters.write_tar_member, which writes the header and the snippet straight to the tarfile.
+The snippets of the iowa_image.tar test resource are encoded once and written copies times.
+
+Usage: python benchmarks/benchmarkTarWriter.py [copies]
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetGenerator import SnippetGenerator  # noqa: E402
+from SnippetWriters import write_tar_member  # noqa: E402
+
+
+def add_with_addfile(tar_out: tarfile.TarFile, tar_path: str, snippet_bytes: bytes):
+    snippet_info = tarfile.TarInfo(name=tar_path)
+    snippet_info.size = len(snippet_bytes)
+    tar_out.addfile(snippet_info, io.BytesIO(snippet_bytes))
+
+
+def get_encoded_snippets():
+    """
+    This function returns the encoded snippets of iowa_image.tar as (tar_path, snippet_bytes).
+    """
+    resources = os.path.join(root, "tests", "resources")
+    df = pd.read_csv(os.path.join(resources, "iowa.tsv"), sep="\t")
+    snippet_generator = SnippetGenerator(df)
+
+    return [
+        (os.path.join(image_name, f"{image_name}_{field}.png"), snippet_bytes)
+        for _, image_name, field, snippet_bytes in snippet_generator.stream_snippets(
+            [os.path.join(resources, "iowa_image.tar")], output="bytes"
+        )
+    ]
+
+
+def write_snippets(outfile_path: str, add_snippet, encoded_snippets: list, copies: int):
+    """
+    This function writes copies of the encoded snippets to a tarfile with add_snippet. It returns the seconds it took, and the peak and retained
+    bytes allocated while writing if tracemalloc is tracing.
+    """
+    with tarfile.open(outfile_path, "w") as tar_out:
+        start = time.perf_counter()
+
+        for copy in range(copies):
+            for tar_path, snippet_bytes in encoded_snippets:
+                add_snippet(tar_out, f"{copy}/{tar_path}", snippet_bytes)
+
+        seconds = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+
+    os.remove(outfile_path)
+
+    return seconds, peak, retained
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    encoded_snippets = get_encoded_snippets()
+
+    print(f"{copies * len(encoded_snippets)} snippets")
+    print(f"{'writer':<18}{'ms':>10}{'peak KiB':>12}{'retained KiB':>14}")
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        outfile_path = os.path.join(output_directory, "snippets.tar")
+
+        for name, add_snippet in [
+            ("addfile", add_with_addfile),
+            ("write_tar_member", write_tar_member),
+        ]:
+            # Timed without tracemalloc, which slows down every allocation
+            seconds, _, _ = write_snippets(
+                outfile_path, add_snippet, encoded_snippets, copies
+            )
+
+            tracemalloc.start()
+            _, peak, retained = write_snippets(
+                outfile_path, add_snippet, encoded_snippets, copies
+            )
+            tracemalloc.stop()
+
+            print(
+                f"{name:<18}{seconds * 1000:>10.1f}{peak / 1024:>12.1f}{retained / 1024:>14.1f}"
+            )
@@ -0,0 +1,119 @@
+"""
+This file contains the AnnotationDiff class which compares two versions of the annotations of a set of images.
+"""
+
+
+class AnnotationDiff:
+    """
+    This class is the difference between two coordinate maps, ie: image_name -> [(snip_name, box_coordinates), ...], eg: the annotations that
+    snippets were saved from and a new version of them. Snippets are matched by (image_name, snip_name). A snippet is changed if its box moved,
+    added if it is only in the new map and removed if it is only in the previous one. Images whose snippets are all the same are skipped.
+    Boxes are compared rounded to whole pixels, the way a CoordinateIndex stores them and snippets are cropped, so a compiled index and the
+    DataFrame it was built from are the same annotations.
+    """
+
+    def __init__(self, previous_coordinates, coordinates):
+        """
+        Initializes the AnnotationDiff class and compares the two maps.
+
+        Args:
+            previous_coordinates: The previous coordinate map, eg: a dictionary built by convert_df_to_map or a CoordinateIndex.
+            coordinates: The new coordinate map.
+        """
+        self.added = []
+        self.changed = []
+        self.removed = []
+        # The snippets of each image that were added or changed, as a coordinate map
+        self.changed_coordinates = {}
+
+        for image_name in coordinates:
+            fields_and_coordinates = coordinates[image_name]
+            previous_fields_and_coordinates = (
+                previous_coordinates[image_name]
+                if image_name in previous_coordinates
+                else []
+            )
+
+            if self.round_boxes(fields_and_coordinates) != self.round_boxes(
+                previous_fields_and_coordinates
+            ):
+                self.compare_image(
+                    image_name, previous_fields_and_coordinates, fields_and_coordinates
+                )
+
+        for image_name in previous_coordinates:
+            if image_name not in coordinates:
+                self.removed.extend(
+                    (image_name, field) for field, _ in previous_coordinates[image_name]
+                )
+
+    def compare_image(
+        self,
+        image_name: str,
+        previous_fields_and_coordinates: list,
+        fields_and_coordinates: list,
+    ):
+        """
+        This function compares the snippets of an image one by one. A snip_name that appears more than once in an image is saved to the same file,
+        so only its last box is compared.
+
+        Args:
+            image_name: The name of the image.
+            previous_fields_and_coordinates: The (snip_name, box_coordinates) of the image in the previous map.
+            fields_and_coordinates: The (snip_name, box_coordinates) of the image in the new map.
+        """
+        previous_boxes = dict(self.round_boxes(previous_fields_and_coordinates))
+        boxes = {
+            field: tuple(box_coordinates)
+            for field, box_coordinates in fields_and_coordinates
+        }
+        rounded_boxes = dict(self.round_boxes(fields_and_coordinates))
+
+        for field, box_coordinates in boxes.items():
+            if field not in previous_boxes:
+                self.added.append((image_name, field))
+            elif rounded_boxes[field] != previous_boxes[field]:
+                self.changed.append((image_name, field))
+            else:
+                continue
+
+            self.changed_coordinates.setdefault(image_name, []).append(
+                (field, box_coordinates)
+            )
+
+        self.removed.extend(
+            (image_name, field) for field in previous_boxes if field not in boxes
+        )
+
+    @staticmethod
+    def round_boxes(fields_and_coordinates: list):
+        """
+        This function returns the (snip_name, box_coordinates) of an image with every coordinate rounded to a whole pixel. Halves are rounded
+        to even, as np.rint does when a CoordinateIndex is built.
+
+        Args:
+            fields_and_coordinates: The (snip_name, box_coordinates) of the image.
+        """
+        return [
+            (field, tuple(round(coordinate) for coordinate in box_coordinates))
+            for field, box_coordinates in fields_and_coordinates
+        ]
+
+    def get_outdated_snippets(self):
+        """
+        This function returns the (image_name, snip_name) of the snippets whose saved files are out of date: the ones that were changed or removed.
+        """
+        return self.changed + self.removed
+
+    def get_stats(self):
+        """
+        This function returns the number of snippets that were added, changed and removed, and the number of images that have any of them.
+        """
+        snippets = self.added + self.changed + self.removed
+
+        return {
+            "added": len(self.added),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "images": len({image_name for image_name, _ in snippets}),
+        }
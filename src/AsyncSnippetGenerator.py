@@ -0,0 +1,332 @@
+"""
+This file contains the AsyncSnippetGenerator class which snips images with asyncio, for storage where the latency of each file dominates.
+"""
+
+import asyncio
+import collections
+import os
+from concurrent.futures import ThreadPoolExecutor
+from CustomException import CustomException
+from SnippetGenerator import SnippetGenerator
+from SnippetWriters import DirectorySnippetWriter
+
+
+class AsyncSnippetGenerator:
+    """
+    This class runs a SnippetGenerator on an asyncio event loop so that reading images, decoding, cropping and encoding them, and writing snippets
+    overlap across up to concurrency images, instead of each image waiting for the round trips of the one before it.
+    Reads and writes run in a pool of I/O threads. Decoding, cropping and encoding run in a separate executor, where Pillow releases the GIL.
+    Results come out in the order of the input.
+    """
+
+    def __init__(
+        self,
+        snippet_generator: SnippetGenerator,
+        concurrency: int = 16,
+        cpu_threads: int = None,
+    ):
+        """
+        Initializes the AsyncSnippetGenerator class.
+
+        Args:
+            snippet_generator: The SnippetGenerator that holds the coordinates and snips the images.
+            concurrency: The most images being read, snipped or written at a time. It is also the number of I/O threads.
+            cpu_threads: The number of threads that decode, crop and encode. Defaults to the number of CPUs.
+        """
+        if concurrency < 1:
+            raise CustomException(
+                f"The concurrency of an AsyncSnippetGenerator must be at least 1. You provided: {concurrency}"
+            )
+
+        self.snippet_generator = snippet_generator
+        self.concurrency = concurrency
+        self.io_executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.cpu_executor = ThreadPoolExecutor(max_workers=cpu_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        This function shuts down the thread pools.
+        """
+        self.io_executor.shutdown()
+        self.cpu_executor.shutdown()
+
+    async def yield_encoded_snippets(
+        self, input_tarfiles: list = None, image_paths: list = None
+    ):
+        """
+        This async generator yields the encoded snippets of tarfiles and images as (reel_name, image_name, field, snippet_bytes), like
+        SnippetGenerator.stream_snippets with output="bytes". reel_name is None for the snippets of image_paths.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            image_paths: The paths to images to be snipped. They are snipped after the tarfiles.
+        """
+        async for reel_name, image_name, encoded_snippets in self.yield_snipped_images(
+            input_tarfiles or [], image_paths or []
+        ):
+            for field, snippet_bytes in encoded_snippets:
+                yield reel_name, image_name, field, snippet_bytes
+
+    async def save_snippets_to_directory_from_tarfiles(
+        self, input_tarfiles: list, output_directory: str, journal_path: str = None
+    ):
+        """
+        This function saves the snippets of tarfiles in output_directory/reel_name/image_name/, like the SnippetGenerator method of the same name.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            output_directory: The directory the snippets are saved in.
+            journal_path: If given, every image and reel whose snippets are all written is recorded in a RunJournal at this path, and the
+                reels and images it records are skipped. See SnippetGenerator.save_snippets_to_directory_from_tarfiles.
+        """
+        snippet_generator = self.snippet_generator
+        snippet_generator.open_run_journal(journal_path)
+
+        try:
+            for input_tarfile in snippet_generator.get_unfinished_tarfiles(
+                input_tarfiles
+            ):
+                await self.save_snippets_to_directory(
+                    [input_tarfile], [], output_directory
+                )
+                await self.run_io(snippet_generator.mark_reel_complete, input_tarfile)
+        finally:
+            snippet_generator.close_run_journal()
+
+    async def save_snippets_to_directory_from_image_paths(
+        self, image_paths: list, output_directory: str
+    ):
+        """
+        This function saves the snippets of images in output_directory/image_name/, like the SnippetGenerator method of the same name.
+
+        Args:
+            image_paths: The paths to images to be snipped.
+            output_directory: The directory the snippets are saved in.
+        """
+        await self.save_snippets_to_directory([], image_paths, output_directory)
+
+    async def save_snippets_to_directory(
+        self, input_tarfiles: list, image_paths: list, output_directory: str
+    ):
+        """
+        This function saves the snippets of tarfiles and images. Each image is written as soon as it is snipped, while the next images are read and snipped.
+        Once the snippets of an image are written, it is recorded in the run journal of the SnippetGenerator, if there is one, in the order of the input.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            image_paths: The paths to images to be snipped.
+            output_directory: The directory the snippets are saved in.
+        """
+
+        run_journal = self.snippet_generator.run_journal
+
+        with DirectorySnippetWriter(output_directory) as writer:
+
+            async def write(snipped_image):
+                reel_name, image_name, encoded_snippets = await snipped_image
+                await self.run_io(
+                    self.write_snippets_of_image,
+                    writer,
+                    reel_name,
+                    image_name,
+                    encoded_snippets,
+                )
+                return reel_name, image_name
+
+            async for reel_name, image_name in self.yield_snipped_images(
+                input_tarfiles, image_paths, write
+            ):
+                if run_journal is not None:
+                    await self.run_io(
+                        run_journal.mark_complete,
+                        "image",
+                        run_journal.get_image_name(reel_name, image_name),
+                    )
+
+    async def yield_snipped_images(
+        self, input_tarfiles: list, image_paths: list, then=None
+    ):
+        """
+        This async generator yields (reel_name, image_name, [(field, snippet_bytes), ...]) for every annotated image, in the order of the input.
+        The images of a tarfile are read one after the other, since a tarfile is read front to back, while image_paths are read concurrently.
+        Every tarfile is finished before the coordinates of the next reel are loaded.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            image_paths: The paths to images to be snipped.
+            then: If given, an async function that is awaited with the coroutine that snips each image, inside the concurrency window.
+                Whatever it returns is yielded instead of the snipped image.
+        """
+        snippet_generator = self.snippet_generator
+
+        for input_tarfile in input_tarfiles:
+            reel_name = snippet_generator.get_tarfile_name_no_ext(input_tarfile)
+            snippet_generator.load_coordinates_of_reel(reel_name)
+
+            async for result in self.yield_results_in_order(
+                self.yield_snip_jobs_of_tarfile(input_tarfile, reel_name), then
+            ):
+                yield result
+
+            snippet_generator.unload_coordinates_of_reel()
+
+        if image_paths:
+            if snippet_generator.reel_partitions is not None:
+                raise CustomException(
+                    "Coordinates partitioned by reel can only be used to snip tarfiles, since image paths don't belong to a reel."
+                )
+
+            async for result in self.yield_results_in_order(
+                self.yield_snip_jobs_of_image_paths(image_paths), then
+            ):
+                yield result
+
+    async def yield_results_in_order(self, jobs, then=None):
+        """
+        This async generator starts the coroutines of jobs, keeping at most concurrency of them running, and yields their results in order.
+
+        Args:
+            jobs: An async iterator of coroutines.
+            then: If given, each coroutine is wrapped in then(coroutine).
+        """
+        running = collections.deque()
+
+        try:
+            async for job in jobs:
+                running.append(asyncio.ensure_future(then(job) if then else job))
+
+                if len(running) >= self.concurrency:
+                    yield await running.popleft()
+
+            while running:
+                yield await running.popleft()
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def yield_snip_jobs_of_tarfile(self, input_tarfile: str, reel_name: str):
+        """
+        This async generator reads the annotated images of a tarfile one at a time and yields a coroutine that snips each.
+
+        Args:
+            input_tarfile: The path to the tarfile that contains images to be snipped.
+            reel_name: The name of the tarfile without its extension.
+        """
+        raw_images = self.snippet_generator.yield_raw_image_and_name_from_tarfile(
+            input_tarfile
+        )
+
+        try:
+            while True:
+                raw_image = await self.run_io(next, raw_images, None)
+
+                if raw_image is None:
+                    break
+
+                yield self.snip_raw_image(reel_name, *raw_image)
+        finally:
+            await self.run_io(raw_images.close)
+
+    async def yield_snip_jobs_of_image_paths(self, image_paths: list):
+        """
+        This async generator yields a coroutine that reads and snips each annotated image in image_paths.
+
+        Args:
+            image_paths: The paths to images to be snipped.
+        """
+        for image_path in image_paths:
+            image_name = os.path.splitext(os.path.basename(image_path))[0]
+
+            if image_name in self.snippet_generator.map_coordinates_to_images:
+                yield self.snip_image_path(image_name, image_path)
+
+    async def snip_image_path(self, image_name: str, image_path: str):
+        """
+        This function reads an image from disk and snips it. It returns (None, image_name, [(field, snippet_bytes), ...]).
+
+        Args:
+            image_name: The name of the image without its extension.
+            image_path: The path to the image.
+        """
+        image_bytes = await self.run_io(self.read_file, image_path)
+
+        return await self.snip_raw_image(None, image_name, image_bytes)
+
+    async def snip_raw_image(self, reel_name: str, image_name: str, image_bytes: bytes):
+        """
+        This function decodes an image, crops its snippets and encodes them in the CPU executor. It returns (reel_name, image_name, [(field, snippet_bytes), ...]).
+
+        Args:
+            reel_name: The name of the tarfile the image came from without its extension, or None.
+            image_name: The name of the image without its extension.
+            image_bytes: The encoded image.
+        """
+        loop = asyncio.get_running_loop()
+        _, encoded_snippets = await loop.run_in_executor(
+            self.cpu_executor,
+            self.snippet_generator.encode_snippets_of_image,
+            image_name,
+            image_bytes,
+        )
+
+        return reel_name, image_name, encoded_snippets
+
+    async def run_io(self, function, *args):
+        """
+        This function runs a blocking I/O function in the I/O thread pool and returns what it returns.
+
+        Args:
+            function: The function to run.
+            args: The arguments it is called with.
+        """
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.io_executor, function, *args)
+
+    def read_file(self, path: str):
+        """
+        This function returns the bytes of a file.
+
+        Args:
+            path: The path to the file.
+        """
+        with open(path, "rb") as file:
+            return file.read()
+
+    def write_snippets_of_image(
+        self,
+        writer: DirectorySnippetWriter,
+        reel_name: str,
+        image_name: str,
+        encoded_snippets: list,
+    ):
+        """
+        This function writes the encoded snippets of one image into its directory, like SnippetGenerator.write_snippets_to_directory does.
+        Snippets that are duplicates of another snippet of the image are written as hard links.
+
+        Args:
+            writer: The DirectorySnippetWriter of the output directory. It has no write threads, so it writes in the I/O thread this runs in.
+            reel_name: The name of the tarfile the image came from without its extension, or None.
+            image_name: The name of the image without its extension.
+            encoded_snippets: The (field, snippet_bytes) pairs of the image.
+        """
+        snippet_generator = self.snippet_generator
+        snippets, links = snippet_generator.get_snippet_files_of_image(
+            image_name,
+            snippet_generator.yield_encoded_snippets_with_duplicates(
+                (reel_name, image_name, field, snippet_bytes)
+                for field, snippet_bytes in encoded_snippets
+            ),
+        )
+
+        writer.add_image(
+            os.path.join(*([reel_name] if reel_name else []), image_name),
+            snippets,
+            links=links,
+        )
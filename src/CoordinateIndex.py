@@ -0,0 +1,421 @@
+"""
+This file contains the CoordinateIndex class which is a compact replacement for the dictionary that maps images to their snippet coordinates.
+"""
+
+import json
+import os
+import mmap
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from CustomException import CustomException
+
+# The first bytes of every index file written by CoordinateIndex.save.
+INDEX_FILE_MAGIC = b"SGINDEX1"
+
+# Every array in an index file starts at a multiple of this many bytes.
+INDEX_FILE_ALIGNMENT = 64
+
+
+class CoordinateIndex(Mapping):
+    """
+    This class holds the same information as the dictionary built by DataFrame_to_Dictionary_converter.convert_df_to_map, ie: image_name -> [(snip_name, (left, upper, right, lower)), ...],
+    but stores it in a few flat arrays instead of millions of Python lists and tuples:
+        image_names: The name of every image. The position of a name is the id of the image.
+        offsets: An int64 array of length len(image_names) + 1. The snippets of image i are rows offsets[i] to offsets[i + 1] of the arrays below.
+        boxes: An int32 array of shape (number of snippets, 4) with the left, upper, right and lower coordinates of every snippet, grouped by image.
+        snip_name_ids: An int32 array with the position of the name of every snippet in snip_names.
+        snip_names: Every distinct snip_name once.
+    Looking up an image returns the same list of tuples as the dictionary, so it can be used wherever the dictionary is read.
+    """
+
+    def __init__(
+        self,
+        image_names: list,
+        offsets: np.ndarray,
+        boxes: np.ndarray,
+        snip_name_ids: np.ndarray,
+        snip_names: list,
+    ):
+        """
+        Initializes the CoordinateIndex from its arrays. Use from_arrays to build one from unsorted rows.
+
+        Args:
+            image_names: The name of every image. The position of a name is the id of the image.
+            offsets: The start of the snippets of each image in boxes and snip_name_ids, followed by the total number of snippets.
+            boxes: The int32 (left, upper, right, lower) coordinates of every snippet, grouped by image.
+            snip_name_ids: The position of the name of every snippet in snip_names.
+            snip_names: Every distinct snip_name once.
+        """
+        self.image_names = image_names
+        self.offsets = offsets
+        self.boxes = boxes
+        self.snip_name_ids = snip_name_ids
+        self.snip_names = snip_names
+        self.image_ids = {
+            image_name: image_id for image_id, image_name in enumerate(image_names)
+        }
+
+    @classmethod
+    def from_arrays(
+        cls,
+        image_names: np.ndarray,
+        snip_names: np.ndarray,
+        box_coordinates: np.ndarray,
+    ):
+        """
+        This function builds a CoordinateIndex from one entry per snippet. Images keep the order in which they first appear, and the snippets
+        of an image keep their order, so lookups return the same lists as convert_df_to_map.
+
+        Args:
+            image_names: The image_name of every snippet.
+            snip_names: The snip_name of every snippet.
+            box_coordinates: An array of shape (number of snippets, 4) with the left, upper, right and lower coordinates of every snippet.
+                The coordinates are rounded to integers the same way PIL.Image.crop rounds them.
+        """
+        image_ids, unique_image_names = pd.factorize(np.asarray(image_names))
+        snip_name_ids, unique_snip_names = pd.factorize(np.asarray(snip_names))
+
+        order = np.argsort(image_ids, kind="stable")
+
+        offsets = np.zeros(len(unique_image_names) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(image_ids, minlength=len(unique_image_names)),
+            out=offsets[1:],
+        )
+
+        boxes = np.rint(np.asarray(box_coordinates, dtype=np.float64).reshape(-1, 4))
+
+        return cls(
+            unique_image_names.tolist(),
+            offsets,
+            boxes[order].astype(np.int32),
+            snip_name_ids[order].astype(np.int32),
+            unique_snip_names.tolist(),
+        )
+
+    def get_image_id(self, image_name: object):
+        """
+        This function returns the id of an image, or None if the image isn't in the index.
+
+        Args:
+            image_name: The name of the image without its extension.
+        """
+        return self.image_ids.get(image_name)
+
+    def __getitem__(self, image_name: str):
+        image_id = self.get_image_id(image_name)
+
+        if image_id is None:
+            raise KeyError(image_name)
+
+        start, end = self.offsets[image_id], self.offsets[image_id + 1]
+
+        return [
+            (self.snip_names[snip_name_id], tuple(box))
+            for snip_name_id, box in zip(
+                self.snip_name_ids[start:end].tolist(), self.boxes[start:end].tolist()
+            )
+        ]
+
+    def __contains__(self, image_name: object):
+        return self.get_image_id(image_name) is not None
+
+    def __iter__(self):
+        return iter(self.image_names)
+
+    def __len__(self):
+        return len(self.image_names)
+
+    def number_of_snippets(self):
+        """
+        This function returns the total number of snippets in the index.
+        """
+        return int(self.offsets[-1])
+
+    def save(self, index_path: str):
+        """
+        This function writes the index to a single file that CoordinateIndex.load can memory map. The file starts with INDEX_FILE_MAGIC, followed by the
+        length of a JSON header as 8 little endian bytes, the header itself and the raw arrays. The header holds the dtype, shape and offset of every array.
+        Names are stored as UTF-8 bytes plus offsets, and image_name_order lists the image ids sorted by name so names can be found with a binary search.
+
+        Args:
+            index_path: The path of the file to write.
+        """
+        image_names = StringTable.from_strings(self.image_names)
+        snip_names = StringTable.from_strings(self.snip_names)
+
+        arrays = {
+            "offsets": np.asarray(self.offsets, dtype="<i8"),
+            "boxes": np.asarray(self.boxes, dtype="<i4"),
+            "snip_name_ids": np.asarray(self.snip_name_ids, dtype="<i4"),
+            "image_name_data": image_names.data,
+            "image_name_offsets": image_names.offsets,
+            "image_name_order": image_names.get_sorted_order(),
+            "snip_name_data": snip_names.data,
+            "snip_name_offsets": snip_names.offsets,
+        }
+
+        header = {"arrays": {}}
+        position = 0
+        for name, array in arrays.items():
+            position = -(-position // INDEX_FILE_ALIGNMENT) * INDEX_FILE_ALIGNMENT
+            header["arrays"][name] = {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": position,
+            }
+            position += array.nbytes
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = len(INDEX_FILE_MAGIC) + 8 + len(header_bytes)
+        data_start = -(-data_start // INDEX_FILE_ALIGNMENT) * INDEX_FILE_ALIGNMENT
+
+        with open(index_path, "wb") as index_file:
+            index_file.write(INDEX_FILE_MAGIC)
+            index_file.write(len(header_bytes).to_bytes(8, "little"))
+            index_file.write(header_bytes)
+
+            for name, array in arrays.items():
+                index_file.seek(data_start + header["arrays"][name]["offset"])
+                index_file.write(np.ascontiguousarray(array).tobytes())
+
+            index_file.truncate(data_start + position)
+
+    @staticmethod
+    def load(index_path: str):
+        """
+        This function memory maps an index file written by CoordinateIndex.save and returns it as a MappedCoordinateIndex. Nothing is read up front:
+        the pages of the file are loaded by the operating system when they are first used, and processes that load the same file share them.
+
+        Args:
+            index_path: The path to the index file.
+        """
+        return MappedCoordinateIndex(index_path)
+
+
+class MappedCoordinateIndex(CoordinateIndex):
+    """
+    This class is a CoordinateIndex whose arrays are read only views of a memory mapped index file. Image names are looked up with a binary search
+    over the sorted names in the file instead of a dictionary, so opening an index costs the same no matter how many images it holds.
+    When it is pickled, eg: to be sent to a worker process, only the path is pickled and the worker maps the file itself.
+    """
+
+    def __init__(self, index_path: str):
+        """
+        Initializes the MappedCoordinateIndex by memory mapping the index file.
+
+        Args:
+            index_path: The path to an index file written by CoordinateIndex.save.
+        """
+        self.index_path = index_path
+
+        with open(index_path, "rb") as index_file:
+            self.index_mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic_length = len(INDEX_FILE_MAGIC)
+        if self.index_mmap[:magic_length] != INDEX_FILE_MAGIC:
+            raise CustomException(
+                f"The file is not a snippet generator index file: {index_path}"
+            )
+
+        header_length = int.from_bytes(
+            self.index_mmap[magic_length : magic_length + 8], "little"
+        )
+        header_end = magic_length + 8 + header_length
+        header = json.loads(self.index_mmap[magic_length + 8 : header_end])
+        data_start = -(-header_end // INDEX_FILE_ALIGNMENT) * INDEX_FILE_ALIGNMENT
+
+        arrays = {}
+        for name, description in header["arrays"].items():
+            dtype = np.dtype(description["dtype"])
+            shape = tuple(description["shape"])
+            count = int(np.prod(shape))
+
+            if count == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+
+            arrays[name] = np.frombuffer(
+                self.index_mmap,
+                dtype=dtype,
+                count=count,
+                offset=data_start + description["offset"],
+            ).reshape(shape)
+
+        self.offsets = arrays["offsets"]
+        self.boxes = arrays["boxes"]
+        self.snip_name_ids = arrays["snip_name_ids"]
+        self.image_names = StringTable(
+            arrays["image_name_data"], arrays["image_name_offsets"]
+        )
+        self.image_name_order = arrays["image_name_order"]
+        self.snip_names = StringTable(
+            arrays["snip_name_data"], arrays["snip_name_offsets"]
+        )
+
+    def get_image_id(self, image_name: object):
+        """
+        This function returns the id of an image, or None if the image isn't in the index, with a binary search over the sorted image names.
+
+        Args:
+            image_name: The name of the image without its extension.
+        """
+        if not isinstance(image_name, str):
+            return None
+
+        key = image_name.encode("utf-8")
+        low, high = 0, len(self.image_name_order)
+
+        while low < high:
+            middle = (low + high) // 2
+            if self.image_names.get_bytes(self.image_name_order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < len(self.image_name_order):
+            image_id = int(self.image_name_order[low])
+            if self.image_names.get_bytes(image_id) == key:
+                return image_id
+
+        return None
+
+    def __reduce__(self):
+        return (MappedCoordinateIndex, (self.index_path,))
+
+
+class StringTable:
+    """
+    This class stores many strings as one array of UTF-8 bytes and an array of offsets, so they can be written to and memory mapped from an index file.
+    String i is data[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        """
+        Initializes the StringTable from its arrays.
+
+        Args:
+            data: A uint8 array with every string encoded as UTF-8, one after the other.
+            offsets: An int64 array with the start of every string in data, followed by the length of data.
+        """
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        """
+        This function builds a StringTable from an iterable of strings.
+
+        Args:
+            strings: The strings to store. Values that aren't strings are converted with str.
+        """
+        encoded_strings = [str(string).encode("utf-8") for string in strings]
+
+        offsets = np.zeros(len(encoded_strings) + 1, dtype="<i8")
+        np.cumsum(
+            np.fromiter(map(len, encoded_strings), dtype=np.int64),
+            out=offsets[1:],
+        )
+
+        return cls(np.frombuffer(b"".join(encoded_strings), dtype=np.uint8), offsets)
+
+    def get_bytes(self, position: int):
+        """
+        This function returns string number position as UTF-8 bytes.
+
+        Args:
+            position: The position of the string in the table.
+        """
+        return self.data[self.offsets[position] : self.offsets[position + 1]].tobytes()
+
+    def get_sorted_order(self):
+        """
+        This function returns the positions of the strings sorted by their UTF-8 bytes.
+        """
+        return np.array(sorted(range(len(self)), key=self.get_bytes), dtype="<i8")
+
+    def __getitem__(self, position: int):
+        return self.get_bytes(position).decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+
+class ReelPartitions:
+    """
+    This class is the base for the coordinates of many reels that are handed out one reel at a time. SnippetGenerator loads the partition of a tarfile
+    when it starts snipping it and drops it before the next tarfile, so only one reel's coordinates are in memory at a time, and images with the same
+    name in different reels don't collide.
+    """
+
+    def get_partition(self, reel_name: str):
+        """
+        This function returns the coordinate map, ie: image_name -> [(snip_name, box_coordinates), ...], of one reel. Reels without coordinates get an empty map.
+
+        Args:
+            reel_name: The name of the reel's tarfile without its extension.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def get_reel_name_no_ext(reel_name: object):
+        """
+        This function strips a .tar or .tar.gz extension from a reel name, so reel_name values like 14.tar match the tarfile 14.tar.gz.
+
+        Args:
+            reel_name: A value from the reel_name column.
+        """
+        reel_name = str(reel_name)
+
+        for ext in (".tar.gz", ".tar"):
+            if reel_name.endswith(ext):
+                return reel_name[: -len(ext)]
+
+        return reel_name
+
+
+class IndexDirectoryReelPartitions(ReelPartitions):
+    """
+    This class reads the partition of each reel from its own index file, <reel_name>.index, in a directory written by SnippetGenerator.compile_index_file
+    with partition_by_reel=True. Each partition is memory mapped when it is loaded, and the files can be copied to different machines to shard a job by reel.
+    """
+
+    def __init__(self, index_directory: str):
+        """
+        Initializes the IndexDirectoryReelPartitions with the directory that holds the index files.
+
+        Args:
+            index_directory: The path to the directory of <reel_name>.index files.
+        """
+        self.index_directory = index_directory
+
+    def get_partition(self, reel_name: str):
+        index_path = os.path.join(self.index_directory, f"{reel_name}.index")
+
+        if not os.path.exists(index_path):
+            return {}
+
+        return CoordinateIndex.load(index_path)
+
+
+class MappingReelPartitions(ReelPartitions):
+    """
+    This class holds the coordinate map of every reel in a dictionary, eg: the snippets of each reel that changed between two versions of the annotations.
+    """
+
+    def __init__(self, coordinates_of_reels: dict):
+        """
+        Initializes the MappingReelPartitions class.
+
+        Args:
+            coordinates_of_reels: The coordinate map of each reel, by the name of the reel's tarfile without its extension.
+        """
+        self.coordinates_of_reels = coordinates_of_reels
+
+    def get_partition(self, reel_name: str):
+        return self.coordinates_of_reels.get(reel_name, {})
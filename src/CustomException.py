@@ -0,0 +1,14 @@
+"""
+This file contains the CustomException class which is raised by the modules of the snippet generator.
+"""
+
+
+class CustomException(Exception):
+    """A custom exception class. Used to identify error with our scripts."""
+
+    def __init__(self, message=""):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return f"{self.__class__.__name__}: {self.message}"
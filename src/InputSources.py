@@ -0,0 +1,296 @@
+"""
+This file contains the input sources that the images of a reel are read from: tarfiles, zip files and directories.
+"""
+
+import os
+import tarfile
+import zipfile
+from CustomException import CustomException
+from TarIndex import TarIndex, get_image_name_of_member, map_tarfile
+
+
+# The extensions of the archives that can be read, longest first so .tar.gz isn't taken for .gz.
+ARCHIVE_EXTENSIONS = (".tar.gz", ".tar", ".zip")
+
+
+class InputSource:
+    """
+    This class is the base of the input sources. An input source is one reel of images, eg: a tarfile, and yields the still encoded bytes of the
+    images that are asked for, so every source feeds the same decoding, cropping and batching code in SnippetGenerator.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the InputSource class.
+
+        Args:
+            path: The path to the source.
+        """
+        self.path = path
+        self.name = get_input_source_name(path)
+
+    def yield_raw_images(self, image_names, byte_range: tuple = None):
+        """
+        This function yields (image_name, image_bytes) for every image in the source whose name, without directories or extension, is in image_names.
+
+        Args:
+            image_names: The names of the images to read, eg: a coordinate map.
+            byte_range: If given, only the images whose data starts in [start, end) of the source are read. See get_index.
+        """
+        raise NotImplementedError
+
+    def get_index(self):
+        """
+        This function returns a TarIndex of the members of the source, which is used to split the source into byte ranges, or None if the source
+        can't be split.
+        """
+        return None
+
+    def get_image_names(self):
+        """
+        This function returns the set of names, without directories or extensions, of the files in the source.
+        """
+        raise NotImplementedError
+
+    def check_byte_range_is_supported(self, byte_range: tuple):
+        """
+        This function raises a CustomException if a byte range is given for a source that can't be read by byte range.
+
+        Args:
+            byte_range: The byte range that was asked for, or None.
+        """
+        if byte_range is not None:
+            raise CustomException(
+                f"A byte range can only be read from an uncompressed .tar file with use_tar_index set to True, or from a .zip file. You provided: {self.path}"
+            )
+
+
+class TarSource(InputSource):
+    """
+    This class reads the images of a .tar or .tar.gz file. With a TarIndex, the images of a .tar file are read by seeking straight to them,
+    and a tarfile that holds none of the images isn't opened at all. Otherwise the tarfile is read from start to end.
+    """
+
+    def __init__(self, path: str, tar_index: TarIndex = None, map_tar: bool = False):
+        """
+        Initializes the TarSource class.
+
+        Args:
+            path: The path to the .tar or .tar.gz file.
+            tar_index: The TarIndex of the tarfile, if there is one.
+            map_tar: If True, a .tar file is memory mapped and the images are yielded as memoryviews of the mapping. See TarIndex.map_tarfile.
+        """
+        super().__init__(path)
+        self.tar_index = tar_index
+        self.map_tar = map_tar and not path.endswith("gz")
+
+    def yield_raw_images(self, image_names, byte_range: tuple = None):
+        if self.tar_index is not None:
+            members = self.tar_index.get_members_of_images(image_names, byte_range)
+
+            # The tarfile holds none of the images, so it isn't opened
+            if not members:
+                return
+
+            if not self.path.endswith("gz"):
+                yield from self.yield_raw_images_of_members(members)
+                return
+
+        self.check_byte_range_is_supported(byte_range)
+
+        read_param = "r:gz" if self.path.endswith("gz") else "r"
+
+        tar_view = None
+        if self.map_tar:
+            tar_view = map_tarfile(self.path)
+
+        with tarfile.open(self.path, read_param) as tar_in:
+            for encoded_image in tar_in:
+                if encoded_image.isfile():
+                    try:
+                        image_name = get_image_name_of_member(encoded_image.name)
+                        if image_name not in image_names:
+                            continue
+                        elif tar_view is not None:
+                            yield (
+                                image_name,
+                                tar_view[
+                                    encoded_image.offset_data : encoded_image.offset_data
+                                    + encoded_image.size
+                                ],
+                            )
+                        else:
+                            yield image_name, tar_in.extractfile(encoded_image).read()
+
+                    except Exception as e:
+                        print("An error occured: ", e)
+
+    def yield_raw_images_of_members(self, members: list):
+        """
+        This function reads images out of a .tar file by seeking straight to them, instead of reading every header in the tarfile.
+        If map_tar is True, the images are slices of the mapped tarfile instead.
+
+        Args:
+            members: The (member_name, offset, size) of the images, as recorded in the TarIndex of the tarfile.
+        """
+        if self.map_tar:
+            tar_view = map_tarfile(self.path)
+
+            for member_name, offset, size in members:
+                yield (
+                    get_image_name_of_member(member_name),
+                    tar_view[offset : offset + size],
+                )
+            return
+
+        with open(self.path, "rb") as tar_in:
+            for member_name, offset, size in members:
+                tar_in.seek(offset)
+                yield get_image_name_of_member(member_name), tar_in.read(size)
+
+    def get_index(self):
+        return self.tar_index
+
+    def get_image_names(self):
+        if self.tar_index is not None:
+            return self.tar_index.get_image_names()
+
+        read_param = "r:gz" if self.path.endswith("gz") else "r"
+
+        with tarfile.open(self.path, read_param) as tar_in:
+            return {
+                get_image_name_of_member(member.name)
+                for member in tar_in
+                if member.isfile()
+            }
+
+
+class ZipSource(InputSource):
+    """
+    This class reads the images of a .zip file. A zip file lists its members in a central directory at its end, so the images that are asked for
+    are read by seeking straight to them, without a TarIndex or reading the rest of the file. Members are read in the order they are stored,
+    which the central directory doesn't have to list them in.
+    """
+
+    def yield_raw_images(self, image_names, byte_range: tuple = None):
+        with zipfile.ZipFile(self.path) as zip_in:
+            for member in self.get_stored_members(zip_in):
+                if member.is_dir():
+                    continue
+                if byte_range is not None and not (
+                    byte_range[0] <= member.header_offset < byte_range[1]
+                ):
+                    continue
+
+                try:
+                    image_name = get_image_name_of_member(member.filename)
+                    if image_name in image_names:
+                        yield image_name, zip_in.read(member)
+                except Exception as e:
+                    print("An error occured: ", e)
+
+    def get_index(self):
+        """
+        This function returns a TarIndex of the members of the zip file, built from its central directory. The offset of each member is
+        the offset of its local header and the size is its compressed size.
+        """
+        with zipfile.ZipFile(self.path) as zip_in:
+            members = [
+                (member.filename, member.header_offset, member.compress_size)
+                for member in self.get_stored_members(zip_in)
+                if not member.is_dir()
+            ]
+
+        return TarIndex(members)
+
+    def get_stored_members(self, zip_in: zipfile.ZipFile):
+        """
+        This function returns the members of an open zip file sorted by the offsets of their local headers, ie: in the order they are stored.
+        A TarIndex and its byte ranges expect members in that order.
+
+        Args:
+            zip_in: The zip file, opened for reading.
+        """
+        return sorted(zip_in.infolist(), key=lambda member: member.header_offset)
+
+    def get_image_names(self):
+        with zipfile.ZipFile(self.path) as zip_in:
+            return {
+                get_image_name_of_member(member.filename)
+                for member in zip_in.infolist()
+                if not member.is_dir()
+            }
+
+
+class DirectorySource(InputSource):
+    """
+    This class reads the images in a directory and its subdirectories, eg: a reel that was extracted from its tarfile. The directory is walked in
+    sorted order, so the images come out in the same order on every run.
+    """
+
+    def yield_raw_images(self, image_names, byte_range: tuple = None):
+        self.check_byte_range_is_supported(byte_range)
+
+        for image_path in self.yield_file_paths():
+            image_name = get_image_name_of_member(image_path)
+            if image_name not in image_names:
+                continue
+
+            try:
+                with open(image_path, "rb") as image_file:
+                    yield image_name, image_file.read()
+            except Exception as e:
+                print("An error occured: ", e)
+
+    def yield_file_paths(self):
+        """
+        This function yields the path of every file in the directory and its subdirectories.
+        """
+        for directory, subdirectories, filenames in os.walk(self.path):
+            subdirectories.sort()
+
+            for filename in sorted(filenames):
+                yield os.path.join(directory, filename)
+
+    def get_image_names(self):
+        return {
+            get_image_name_of_member(image_path)
+            for image_path in self.yield_file_paths()
+        }
+
+
+def get_input_source_name(path: str):
+    """
+    This function returns the name of an input source without its extension, which is the reel name its images are matched against.
+    Ie: reels/iowa.tar.gz and reels/iowa/ both give iowa
+
+    Args:
+        path: The path to the tarfile, zip file or directory.
+    """
+    if os.path.isdir(path):
+        return os.path.basename(os.path.normpath(path))
+
+    source_name = os.path.basename(path)
+
+    for extension in ARCHIVE_EXTENSIONS:
+        if source_name.endswith(extension):
+            return source_name[: -len(extension)]
+
+    return os.path.splitext(source_name)[0]
+
+
+def open_input_source(path: str, tar_index: TarIndex = None, map_tar: bool = False):
+    """
+    This function returns the InputSource that reads a path: a DirectorySource for a directory, a ZipSource for a .zip file and a TarSource otherwise.
+
+    Args:
+        path: The path to the tarfile, zip file or directory.
+        tar_index: The TarIndex of a tarfile, if there is one.
+        map_tar: If True, a .tar file is memory mapped. See TarSource.
+    """
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if path.endswith(".zip"):
+        return ZipSource(path)
+
+    return TarSource(path, tar_index, map_tar)
@@ -0,0 +1,148 @@
+"""
+This file contains the RunJournal class which records the work a run has finished, so a run that is restarted after a crash skips it.
+"""
+
+import json
+import os
+
+
+class RunJournal:
+    """
+    This class is an append only journal of the units of work a run has finished, eg: the images and reels whose snippets were all written,
+    or the shards that were closed. Every unit is a JSON line of its kind, its name and any details, and is appended, flushed and synced to disk
+    only after the output of the unit is complete. A unit that isn't in the journal is redone when the run is restarted, which overwrites
+    whatever part of its output was written before the crash.
+    The journal can be appended to by several processes at once, eg: the workers of a pool, since each record is written with a single append.
+    """
+
+    def __init__(self, journal_path: str):
+        """
+        Initializes the RunJournal class and loads the units that an earlier run finished.
+
+        Args:
+            journal_path: The path to the journal. It is created if it doesn't exist.
+        """
+        self.journal_path = journal_path
+        self.records = {}
+        self.journal_file = None
+
+        self.load()
+
+    def __getstate__(self):
+        # The journal file is opened again by each process that appends to it
+        state = self.__dict__.copy()
+        state["journal_file"] = None
+        return state
+
+    def load(self):
+        """
+        This function reads the records of the journal. A last line that was cut off by a crash is removed from the journal, since the unit it records
+        wasn't finished, and so that the next record starts on a line of its own.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "rb") as journal_file:
+            journal_bytes = journal_file.read()
+
+        complete_length = journal_bytes.rfind(b"\n") + 1
+        if complete_length < len(journal_bytes):
+            with open(self.journal_path, "r+b") as journal_file:
+                journal_file.truncate(complete_length)
+
+        for line in journal_bytes[:complete_length].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self.records[(record["kind"], record["name"])] = record
+
+    def is_complete(self, kind: str, name: str):
+        """
+        This function returns True if the unit is in the journal.
+
+        Args:
+            kind: The kind of unit, eg: image, reel or shard.
+            name: The name of the unit.
+        """
+        return (kind, name) in self.records
+
+    def get_records(self, kind: str):
+        """
+        This function returns the records of every unit of a kind, in the order they were finished.
+
+        Args:
+            kind: The kind of unit.
+        """
+        return [record for (kind_, _), record in self.records.items() if kind_ == kind]
+
+    def mark_complete(self, kind: str, name: str, **details):
+        """
+        This function appends a unit to the journal and waits for it to reach the disk.
+
+        Args:
+            kind: The kind of unit, eg: image, reel or shard.
+            name: The name of the unit.
+            details: Anything else to record about the unit. It must be serializable to JSON.
+        """
+        record = {"kind": kind, "name": name, **details}
+
+        if self.journal_file is None:
+            self.journal_file = open(self.journal_path, "a")
+
+        self.journal_file.write(json.dumps(record) + "\n")
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+        self.records[(kind, name)] = record
+
+    def get_image_name(self, reel_name: str, image_name: str):
+        """
+        This function returns the name an image is journaled under. Ie: reel_name/image_name
+
+        Args:
+            reel_name: The name of the reel the image belongs to, or None for images that don't belong to a reel.
+            image_name: The name of the image without its extension.
+        """
+        return f"{reel_name}/{image_name}" if reel_name is not None else image_name
+
+    def get_unfinished_image_names(self, reel_name: str, image_names):
+        """
+        This function returns the names in image_names of the images of a reel that aren't in the journal.
+
+        Args:
+            reel_name: The name of the reel.
+            image_names: The names of the images to read, eg: a coordinate map.
+        """
+        return UnfinishedImageNames(self, reel_name, image_names)
+
+    def close(self):
+        """
+        This function closes the journal file. It is opened again by the next record.
+        """
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+
+class UnfinishedImageNames:
+    """
+    This class is the container of image names returned by RunJournal.get_unfinished_image_names. It holds the names that are in image_names and
+    whose images aren't in the journal, without copying image_names.
+    """
+
+    def __init__(self, run_journal: RunJournal, reel_name: str, image_names):
+        """
+        Initializes the UnfinishedImageNames class.
+
+        Args:
+            run_journal: The journal of finished images.
+            reel_name: The name of the reel.
+            image_names: The names of the images to read, eg: a coordinate map.
+        """
+        self.run_journal = run_journal
+        self.reel_name = reel_name
+        self.image_names = image_names
+
+    def __contains__(self, image_name: str):
+        return image_name in self.image_names and not self.run_journal.is_complete(
+            "image", self.run_journal.get_image_name(self.reel_name, image_name)
+        )
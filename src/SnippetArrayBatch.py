@@ -0,0 +1,97 @@
+"""
+This file contains the SnippetArrayBatch class which packs a batch of snippets into a single contiguous NumPy buffer.
+"""
+
+import numpy as np
+from CustomException import CustomException
+
+
+class SnippetArrayBatch:
+    """
+    This class holds a batch of snippets in one contiguous buffer, so a model can take the whole batch at once without a Python object per snippet.
+    The snippets are stored in one of two layouts:
+        padded: data is an (N, H, W[, C]) array where H and W are the largest height and width in the batch. Every snippet is in the top left corner
+            of its slot and the rest of the slot is filled with pad_value.
+        flat: data is a 1 dimensional array in which the snippets follow each other without padding. Snippet i is data[offsets[i]:offsets[i + 1]].
+    In both layouts shapes[i] is the shape of snippet i, ie: (height, width) or (height, width, channels).
+    """
+
+    def __init__(
+        self, data: np.ndarray, shapes: np.ndarray, offsets: np.ndarray, padded: bool
+    ):
+        """
+        Initializes the SnippetArrayBatch class. Use from_arrays to build one from snippets.
+
+        Args:
+            data: The buffer that holds the snippets.
+            shapes: An int64 array of shape (N, 2) or (N, 3) with the shape of every snippet.
+            offsets: An int64 array of N + 1 element offsets into data.reshape(-1), one to the start of every snippet's slot and one to the end of the buffer.
+            padded: True if data is in the padded layout, False if it is in the flat layout.
+        """
+        self.data = data
+        self.shapes = shapes
+        self.offsets = offsets
+        self.padded = padded
+
+    @classmethod
+    def from_arrays(cls, arrays: list, padded: bool = True, pad_value: int = 0):
+        """
+        This function copies snippets into a new SnippetArrayBatch. Every snippet is copied exactly once.
+
+        Args:
+            arrays: The snippets as NumPy arrays. They must all have the same dtype and number of channels.
+            padded: If True, the padded layout is used. Otherwise the flat layout is used.
+            pad_value: The value the padding of the padded layout is filled with.
+        """
+        if not arrays:
+            raise CustomException("A SnippetArrayBatch needs at least one snippet.")
+
+        dtype, channels = arrays[0].dtype, arrays[0].shape[2:]
+        for array in arrays:
+            if array.dtype != dtype or array.shape[2:] != channels:
+                raise CustomException(
+                    f"Every snippet of a SnippetArrayBatch must have the same dtype and channels. Found {dtype} {channels} and {array.dtype} {array.shape[2:]}. "
+                    "Converting snippets to one mode with a SnippetTransform, eg: SnippetTransform(grayscale=True), avoids this."
+                )
+
+        shapes = np.array([array.shape for array in arrays], dtype=np.int64)
+
+        if padded:
+            height, width = shapes[:, 0].max(), shapes[:, 1].max()
+            data = np.full((len(arrays), height, width) + channels, pad_value, dtype)
+            for slot, array in zip(data, arrays):
+                slot[: array.shape[0], : array.shape[1]] = array
+
+            offsets = np.arange(len(arrays) + 1, dtype=np.int64) * data[0].size
+        else:
+            offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+            np.cumsum(np.prod(shapes, axis=1), out=offsets[1:])
+
+            data = np.empty(offsets[-1], dtype)
+            for start, array in zip(offsets, arrays):
+                data[start : start + array.size] = array.reshape(-1)
+
+        return cls(data, shapes, offsets, padded)
+
+    def __getitem__(self, snippet_id: int):
+        """
+        This function returns a view of one snippet without its padding.
+
+        Args:
+            snippet_id: The position of the snippet in the batch.
+        """
+        shape = tuple(self.shapes[snippet_id])
+
+        if self.padded:
+            return self.data[snippet_id, : shape[0], : shape[1]]
+
+        return self.data[
+            self.offsets[snippet_id] : self.offsets[snippet_id + 1]
+        ].reshape(shape)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __iter__(self):
+        for snippet_id in range(len(self)):
+            yield self[snippet_id]
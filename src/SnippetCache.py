@@ -0,0 +1,246 @@
+"""
+This file contains the SnippetCache class which keeps encoded snippets on disk between runs, so snippets whose image and box haven't changed
+aren't cut and encoded again.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+
+
+class SnippetCache:
+    """
+    This class is a content addressed cache of encoded snippets in a directory. A snippet is stored under a digest of the bytes of the image it
+    was cropped out of, its box and the options it was cut and encoded with (see SnippetGenerator.get_snippet_options), so it is found again
+    whatever its reel, image or field is called, and a changed image, box or option is a miss instead of a stale hit.
+    The cache holds at most max_bytes of snippets. When it is full, the snippets that were used least recently are evicted. The order snippets
+    were used in is kept in the modification times of their files, so it carries over to the next run.
+    Every process that uses the cache, eg: the workers of a pool, keeps its own order and stats, and a snippet that another process evicted is a miss.
+    A SnippetGenerator merges the stats of its workers into the cache it was given, and reloads the cache once the pool is done so it is back
+    within max_bytes. While the pool runs, each process evicts only against the snippets it knows of, so the cache can hold up to max_bytes per process.
+    """
+
+    def __init__(self, cache_directory: str, max_bytes: int = None):
+        """
+        Initializes the SnippetCache class and loads the snippets that are already in the cache directory.
+
+        Args:
+            cache_directory: The directory the snippets are cached in. It is created if it doesn't exist.
+            max_bytes: The most bytes of snippets the cache holds. If it isn't given, nothing is evicted.
+        """
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        # The size of every cached snippet by key, least recently used first
+        self.snippet_sizes = collections.OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        self.load()
+
+    def __getstate__(self):
+        # Every process gets a lock of its own
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        This function lists the snippets in the cache directory, from the least to the most recently used, and evicts snippets if the cache
+        holds more than max_bytes.
+        """
+        os.makedirs(self.cache_directory, exist_ok=True)
+        snippets = []
+
+        for directory, _, filenames in os.walk(self.cache_directory):
+            for filename in filenames:
+                # Files a crashed process left half written
+                if filename.endswith(".tmp"):
+                    continue
+
+                snippet_stat = os.stat(os.path.join(directory, filename))
+                snippets.append(
+                    (snippet_stat.st_mtime_ns, filename, snippet_stat.st_size)
+                )
+
+        for _, snippet_key, size in sorted(snippets):
+            self.snippet_sizes[snippet_key] = size
+            self.cached_bytes += size
+
+        self.evict()
+
+    @staticmethod
+    def get_image_digest(image_bytes):
+        """
+        This function returns the digest of the bytes of an image, which the keys of its snippets are made from.
+
+        Args:
+            image_bytes: The encoded image as read from the tarfile, as bytes or a memoryview.
+        """
+        return hashlib.blake2b(image_bytes, digest_size=20).hexdigest()
+
+    @staticmethod
+    def get_snippet_key(
+        image_digest: str, box_coordinates: tuple, snippet_options: str
+    ):
+        """
+        This function returns the key a snippet is cached under.
+
+        Args:
+            image_digest: The digest of the image the snippet is cropped out of. See get_image_digest.
+            box_coordinates: The box of the snippet. Coordinates are compared as floats, so 70 and 70.0 are the same box.
+            snippet_options: The options the snippet is cut and encoded with.
+        """
+        box = ",".join(repr(float(coordinate)) for coordinate in box_coordinates)
+
+        return hashlib.blake2b(
+            f"{image_digest}/{box}/{snippet_options}".encode(), digest_size=20
+        ).hexdigest()
+
+    def get_snippet_path(self, snippet_key: str):
+        """
+        This function returns the path of a cached snippet. Snippets are spread over subdirectories by the first two characters of their keys,
+        so no directory holds too many files.
+
+        Args:
+            snippet_key: The key of the snippet. See get_snippet_key.
+        """
+        return os.path.join(self.cache_directory, snippet_key[:2], snippet_key)
+
+    def get(self, snippet_key: str):
+        """
+        This function returns the encoded snippet cached under a key and marks it as the most recently used, or returns None if it isn't cached.
+
+        Args:
+            snippet_key: The key of the snippet. See get_snippet_key.
+        """
+        snippet_path = self.get_snippet_path(snippet_key)
+
+        try:
+            with open(snippet_path, "rb") as snippet_file:
+                snippet_bytes = snippet_file.read()
+            os.utime(snippet_path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+                self.cached_bytes -= self.snippet_sizes.pop(snippet_key, 0)
+            return None
+
+        with self.lock:
+            self.hits += 1
+            if snippet_key not in self.snippet_sizes:
+                self.snippet_sizes[snippet_key] = len(snippet_bytes)
+                self.cached_bytes += len(snippet_bytes)
+            self.snippet_sizes.move_to_end(snippet_key)
+
+        return snippet_bytes
+
+    def put(self, snippet_key: str, snippet_bytes: bytes):
+        """
+        This function caches an encoded snippet, and evicts the least recently used snippets if the cache is then holding more than max_bytes.
+        The snippet is written under a temporary name and renamed, so other processes never read a partly written snippet.
+
+        Args:
+            snippet_key: The key of the snippet. See get_snippet_key.
+            snippet_bytes: The encoded snippet.
+        """
+        snippet_path = self.get_snippet_path(snippet_key)
+        os.makedirs(os.path.dirname(snippet_path), exist_ok=True)
+
+        temporary_path = f"{snippet_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as snippet_file:
+            snippet_file.write(snippet_bytes)
+        os.replace(temporary_path, snippet_path)
+
+        with self.lock:
+            self.cached_bytes += len(snippet_bytes) - self.snippet_sizes.pop(
+                snippet_key, 0
+            )
+            self.snippet_sizes[snippet_key] = len(snippet_bytes)
+
+            self.evict()
+
+    def evict(self):
+        """
+        This function removes the least recently used snippets until the cache holds at most max_bytes.
+        """
+        while self.max_bytes is not None and self.cached_bytes > self.max_bytes:
+            snippet_key, size = self.snippet_sizes.popitem(last=False)
+            self.cached_bytes -= size
+            self.evictions += 1
+
+            try:
+                os.remove(self.get_snippet_path(snippet_key))
+            except FileNotFoundError:
+                pass
+
+    def reload(self):
+        """
+        This function lists the snippets in the cache directory again, eg: once the processes of a pool have added and evicted snippets,
+        and evicts snippets if the cache holds more than max_bytes.
+        """
+        with self.lock:
+            self.snippet_sizes = collections.OrderedDict()
+            self.cached_bytes = 0
+
+            self.load()
+
+    def pop_counts(self):
+        """
+        This function returns the hits, misses and evictions counted since the cache was loaded, or since they were last popped, and starts
+        counting them again from 0. The workers of a pool hand them back to the process that started it. See merge_counts.
+        """
+        with self.lock:
+            counts = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+            self.hits, self.misses, self.evictions = 0, 0, 0
+
+        return counts
+
+    def merge_counts(self, counts: dict):
+        """
+        This function adds the hits, misses and evictions that another process counted to the stats of this cache.
+
+        Args:
+            counts: The counts, as returned by pop_counts.
+        """
+        with self.lock:
+            self.hits += counts["hits"]
+            self.misses += counts["misses"]
+            self.evictions += counts["evictions"]
+
+    def get_stats(self):
+        """
+        This function returns the hits, misses, hit rate and evictions of the cache since it was loaded, and the number and bytes of snippets it holds.
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "snippets": len(self.snippet_sizes),
+            "bytes": self.cached_bytes,
+        }
+
+    def report(self):
+        """
+        This function returns the stats of the cache as a line of text. Ie: Snippet cache: 95 hits, 5 misses (95.0% hit rate), 0 evictions, 100 snippets, 81920 bytes
+        """
+        stats = self.get_stats()
+
+        return (
+            f"Snippet cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+            f"{stats['evictions']} evictions, {stats['snippets']} snippets, {stats['bytes']} bytes"
+        )
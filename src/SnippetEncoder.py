@@ -0,0 +1,79 @@
+"""
+This file contains the SnippetEncoder class which encodes snippets in the output format chosen for a job.
+"""
+
+import io
+from PIL import Image
+from CustomException import CustomException
+
+
+class SnippetEncoder:
+    """
+    This class encodes snippets before they are written out. Encoding is the largest CPU cost of a job, so the format trades disk space for throughput:
+        png: Lossless. compress_level goes from 0 (no compression, fastest) to 9 (smallest, slowest). Pillow's default is 6.
+        webp: Lossless WebP. compress_level (0 to 6) is the WebP method: higher is smaller and slower.
+        jpeg: Lossy. quality goes from 1 to 95. Snippets that JPEG can't store, eg: black and white ones, are converted to grayscale or RGB.
+        tiff: Uncompressed TIFF. The raw pixels with a small header, so encoding is little more than a copy.
+    """
+
+    # Maps the name of every output format to its Pillow format name and file extension.
+    FORMATS = {
+        "png": ("PNG", ".png"),
+        "webp": ("WEBP", ".webp"),
+        "jpeg": ("JPEG", ".jpg"),
+        "tiff": ("TIFF", ".tif"),
+    }
+
+    def __init__(
+        self, output_format: str = "png", compress_level: int = None, quality: int = 90
+    ):
+        """
+        Initializes the SnippetEncoder class.
+
+        Args:
+            output_format: One of png, webp, jpeg or tiff.
+            compress_level: The compression level of png or webp snippets. If it isn't given, Pillow's default is used.
+            quality: The quality of jpeg snippets.
+        """
+        if output_format not in self.FORMATS:
+            raise CustomException(
+                f"The output format of snippets must be one of {', '.join(self.FORMATS)}. You provided: {output_format}"
+            )
+
+        self.output_format = output_format
+        self.compress_level = compress_level
+        self.quality = quality
+        self.pillow_format, self.extension = self.FORMATS[output_format]
+
+    def get_save_options(self):
+        """
+        This function returns the keyword arguments passed to PIL.Image.save for the output format.
+        """
+        if self.output_format == "png" and self.compress_level is not None:
+            return {"compress_level": self.compress_level}
+        if self.output_format == "webp":
+            options = {"lossless": True}
+            if self.compress_level is not None:
+                options["method"] = self.compress_level
+            return options
+        if self.output_format == "jpeg":
+            return {"quality": self.quality}
+
+        return {}
+
+    def encode(self, snippet: Image.Image):
+        """
+        This function encodes a snippet and returns the bytes.
+
+        Args:
+            snippet: The PIL.Image to encode.
+        """
+        if self.output_format == "jpeg" and snippet.mode not in ("L", "RGB", "CMYK"):
+            snippet = snippet.convert("L" if snippet.mode in ("1", "I", "F") else "RGB")
+
+        snippet_byte_arr = io.BytesIO()
+        snippet.save(
+            snippet_byte_arr, format=self.pillow_format, **self.get_save_options()
+        )
+
+        return snippet_byte_arr.getvalue()
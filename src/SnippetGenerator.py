@@ -5,43 +5,221 @@ This file contains the SnippetGenerator class which is used to crop snippets out
 import tarfile
 import io
 import pandas as pd
+import numpy as np
 import math
 import os
+import shutil
+import tempfile
+import multiprocessing
+import queue
+import threading
+import collections
+import copy
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from PIL import Image
+from CoordinateIndex import (
+    CoordinateIndex,
+    ReelPartitions,
+    IndexDirectoryReelPartitions,
+    MappingReelPartitions,
+)
+from AnnotationDiff import AnnotationDiff
+from CustomException import CustomException
+from SnippetTransform import SnippetTransform
+from SnippetEncoder import SnippetEncoder
+from TarIndex import TarIndex, MemoryViewFile
+from InputSources import open_input_source, get_input_source_name
+from RunJournal import RunJournal
+from SnippetCache import SnippetCache
+from SnippetArrayBatch import SnippetArrayBatch
+from SnippetWriters import (
+    ShardedTarWriter,
+    open_tar_for_writing,
+    write_shard_manifest,
+    write_tar_member,
+    write_tar_link,
+    write_tar_part,
+    DirectorySnippetWriter,
+)
+from collections.abc import Mapping
 from typing import Tuple
 
 
-class CustomException(Exception):
-    """A custom exception class. Used to identify error with our scripts."""
-
-    def __init__(self, message=""):
-        self.message = message
-        super().__init__(self.message)
-
-    def __str__(self):
-        return f"{self.__class__.__name__}: {self.message}"
-
-
 class SnippetGenerator:
     """
     This class generates image snippets from a tar file containing images
     and a pandas dataframe that contains coordinate information for the snippets.
     """
 
-    def __init__(self, df: pd.DataFrame):
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        compact_index: bool = False,
+        partition_by_reel: bool = False,
+        decode_scale: int = 1,
+        snippet_transform: SnippetTransform = None,
+        snippet_encoder: SnippetEncoder = None,
+        use_tar_index: bool = False,
+        tar_index_directory: str = None,
+        map_tarfiles: bool = False,
+        deduplicate_boxes: bool = False,
+        snippet_cache: SnippetCache = None,
+    ):
         """
         Initializes the snippet_generator class with the paths to the tar files containing images and json files.
 
         Args:
             df: A DataFrame object that should contain at least the following information: reel_name, image_name, snip_name, x1, y1, ... x4, y4.
+                A coordinate map that was already built, eg: a CoordinateIndex, or ReelPartitions are used as they are.
+            compact_index: If True, the coordinates are stored in a CoordinateIndex instead of a dictionary of lists of tuples. It takes a fraction of the memory for
+                large dataframes, but it can't be modified after it is built.
+            partition_by_reel: If True, the coordinates are keyed by the reel_name column as well as the image_name, and only the coordinates of the
+                tarfile being snipped are converted and held in map_coordinates_to_images. Reel names are matched against the tarfile names without extensions.
+                Each tarfile is then read only until every annotated image of its reel has been found, and the annotated images that weren't
+                in it are listed in missing_images, by reel name. It needs a DataFrame: a coordinate map that was already built has no reel names,
+                and CustomException is raised for one.
+            decode_scale: Snippets are cut at 1/decode_scale of the resolution of the images, which must be 1, 2, 4 or 8. JPEG images are then decoded
+                at the reduced size, which takes a fraction of the time and memory of a full decode. See decode_region_of_interest.
+            snippet_transform: If given, every snippet is resized, converted to grayscale and/or binarized right after it is cropped, so smaller snippets
+                are encoded and saved. When it shrinks every snippet of a JPEG image, the image is also decoded at a reduced size. See get_draft_scale.
+            snippet_encoder: The format and compression that snippets are saved with. If it isn't given, snippets are saved as PNGs with Pillow's default compression.
+            use_tar_index: If True, the input tarfiles are read through a TarIndex of their members, which is built the first time a tarfile is read
+                and reused after that. The images of a .tar file are then read by seeking straight to them, and a tarfile that holds no annotated
+                images isn't opened at all.
+            tar_index_directory: The directory the TarIndex of each tarfile is cached in. If it isn't given, it is saved next to the tarfile.
+            map_tarfiles: If True, uncompressed .tar files are memory mapped, and each image is decoded straight out of the mapping instead of being
+                copied into a bytes object first, so the page cache holds the only copy of the image. See TarIndex.map_tarfile.
+            deduplicate_boxes: If True, snippets of an image whose boxes are exactly the same are cropped and encoded once. When they are written,
+                the copies are saved as hard links to the first snippet, in directories and tarfiles alike. Boxes that only overlap aren't deduplicated.
+            snippet_cache: If given, the encoded snippets of tarfiles are looked up in the cache by the bytes of their image, their box and the options
+                they are made with before they are cut, and the snippets that weren't in it are added to it. An image whose snippets are all
+                in the cache isn't decoded. See SnippetCache.
+        """
+        if decode_scale not in (1, 2, 4, 8):
+            raise CustomException(
+                f"decode_scale must be 1, 2, 4 or 8. You provided: {decode_scale}"
+            )
+
+        converter = DataFrame_to_Dictionary_converter()
+        self.decode_scale = decode_scale
+        self.snippet_transform = snippet_transform
+        self.snippet_encoder = (
+            snippet_encoder if snippet_encoder is not None else SnippetEncoder()
+        )
+        self.use_tar_index = use_tar_index
+        self.tar_index_directory = tar_index_directory
+        self.tar_indexes = {}
+        self.map_tarfiles = map_tarfiles
+        self.deduplicate_boxes = deduplicate_boxes
+        self.snippet_cache = snippet_cache
+        self.run_journal = None
+        self.missing_images = {}
+        # If it isn't None, the annotated images found in each reel are added to it, so the processes of a pool can hand them back. See _initialize_worker.
+        self.found_images = None
+        self.reel_partitions = None
+
+        if isinstance(df, ReelPartitions):
+            self.reel_partitions = df
+            self.map_coordinates_to_images = {}
+        elif partition_by_reel:
+            if not isinstance(df, pd.DataFrame):
+                raise CustomException(
+                    f"partition_by_reel needs a DataFrame with a reel_name column or ReelPartitions, eg: an index directory written with partition_by_reel=True. You provided: {type(df).__name__}"
+                )
+
+            self.reel_partitions = DataFrameReelPartitions(df, compact_index)
+            self.map_coordinates_to_images = {}
+        elif isinstance(df, Mapping):
+            self.map_coordinates_to_images = df
+        elif compact_index:
+            self.map_coordinates_to_images = converter.convert_df_to_index(df)
+        else:
+            self.map_coordinates_to_images = converter.convert_df_to_map(df)
+
+    @classmethod
+    def from_index_file(cls, index_path: str, **kwargs):
         """
+        This function initializes a SnippetGenerator from an index file written by CoordinateIndex.save. The file is memory mapped rather than read,
+        so startup doesn't depend on the size of the index and every process that opens the same file shares one copy of it in the page cache.
 
-        self.map_coordinates_to_images = (
-            DataFrame_to_Dictionary_converter().convert_df_to_map(df)
+        Args:
+            index_path: The path to the index file, or to a directory of index files written with partition_by_reel=True.
+            kwargs: Passed on to SnippetGenerator.__init__.
+        """
+        if os.path.isdir(index_path):
+            return cls(IndexDirectoryReelPartitions(index_path), **kwargs)
+
+        return cls(CoordinateIndex.load(index_path), **kwargs)
+
+    @classmethod
+    def from_annotation_file(
+        cls,
+        annotation_path: str,
+        input_tarfiles: list = None,
+        chunksize: int = 1000000,
+        compact_index: bool = False,
+        **kwargs,
+    ):
+        """
+        This function initializes a SnippetGenerator from a .tsv, .csv or .parquet annotation file without loading the whole file into memory.
+        The file is read chunksize rows at a time, and only the coordinates of the images in input_tarfiles are kept when it is given,
+        so memory depends on the images being processed rather than on the size of the annotation file.
+
+        Args:
+            annotation_path: The path to the annotation file. It should contain at least the following columns: image_name, snip_name, x1, y1, ... x4, y4.
+            input_tarfiles: The paths to the tarfiles that will be snipped. If given, rows for images that aren't in these tarfiles are dropped while reading.
+            chunksize: The number of rows read from the annotation file at a time.
+            compact_index: If True, the coordinates are stored in a CoordinateIndex. See SnippetGenerator.__init__.
+            kwargs: Passed on to SnippetGenerator.__init__.
+        """
+        image_names = None
+        if input_tarfiles is not None:
+            image_names = get_image_names_in_tarfiles(input_tarfiles)
+
+        return cls(
+            DataFrame_to_Dictionary_converter().convert_file_to_map(
+                annotation_path, chunksize, image_names, compact_index
+            ),
+            **kwargs,
         )
 
+    @classmethod
+    def compile_index_file(
+        cls, df: pd.DataFrame, index_path: str, partition_by_reel: bool = False
+    ):
+        """
+        This function converts a dataframe to a CoordinateIndex once and writes it to index_path, so later runs can start from it with from_index_file.
+
+        Args:
+            df: A DataFrame object that should contain at least the following information: image_name, snip_name, x1, y1, ... x4, y4.
+            index_path: The path of the index file to write.
+            partition_by_reel: If True, index_path is a directory and every reel in the reel_name column gets its own <reel_name>.index file in it.
+        """
+        converter = DataFrame_to_Dictionary_converter()
+
+        if not partition_by_reel:
+            converter.convert_df_to_index(df).save(index_path)
+            return
+
+        os.makedirs(index_path, exist_ok=True)
+
+        for reel_name, reel_df in DataFrameReelPartitions.group_by_reel(df):
+            converter.convert_df_to_index(reel_df).save(
+                os.path.join(index_path, f"{reel_name}.index")
+            )
+
     def save_snippets_to_directory_from_tarfiles(
-        self, input_tarfiles: list, output_directory: str, batch_size: int = 10000
+        self,
+        input_tarfiles: list,
+        output_directory: str,
+        batch_size: int = 10000,
+        workers: int = 1,
+        pipeline_threads: int = 0,
+        journal_path: str = None,
+        write_threads: int = 0,
     ):
         """
         This function will generate snippets for the user and save them out a directory. The directory structure will be output_directory -> reel_name -> image_name -> snippet.
@@ -50,118 +228,476 @@ class SnippetGenerator:
             input_tarfiles: The paths to the tarfiles that contains images to be snipped.
             output_directory: This is the path to a directory where many directories will be created, and where snippets will be saved to.
             batch_size: This function saves out images in batches to optimize IO performance. batch_size is given a default value.
+                The byte ranges that workers snip are always snipped an image at a time, so it doesn't apply to them.
+            workers: The number of processes the input tarfiles are spread across. Each process snips whole tarfiles, or byte ranges of them.
+                See split_tarfiles_by_byte_range. The default of 1 does all the work in this process.
+            pipeline_threads: If greater than 0, each tarfile or byte range is snipped with yield_encoded_snippets_from_tarfile using this many
+                decode, crop and encode threads.
+            journal_path: If given, every image and reel whose snippets are all written is recorded in a RunJournal at this path. When the run is
+                started again with the same journal, eg: after a crash, finished reels are skipped, the finished images of other reels aren't read,
+                and the images that were being written are snipped again.
+            write_threads: If greater than 0, the snippets are written by this many threads behind the thread that snips them, instead of
+                the snipping waiting for every file to be written. See DirectorySnippetWriter.
         """
-        for (
-            tarfile_name_no_ext,
-            image_names_no_ext,
-            fields,
-            snippets,
-        ) in self.get_batches_of_snippets_from_tarfiles(input_tarfiles, batch_size):
-            for image_name_no_ext, field, snippet in zip(
-                image_names_no_ext, fields, snippets
-            ):
-                snippet_directory = os.path.join(
-                    output_directory, tarfile_name_no_ext, image_name_no_ext
-                )
-                snippet_filename = f"{image_name_no_ext}_{field}.png"
-                path_to_snippet = os.path.join(snippet_directory, snippet_filename)
+        self.open_run_journal(journal_path)
 
-                if not os.path.exists(snippet_directory):
-                    os.makedirs(snippet_directory)
+        try:
+            if workers > 1:
+                pieces = self.split_tarfiles_by_byte_range(
+                    self.get_unfinished_tarfiles(input_tarfiles), workers
+                )
+                unfinished_pieces = collections.Counter(
+                    input_tarfile for input_tarfile, _ in pieces
+                )
 
-                snippet.save(path_to_snippet)
+                found_images = collections.defaultdict(set)
+
+                with self.get_worker_pool(workers) as pool:
+                    for (input_tarfile, _), worker_results in pool.imap_unordered(
+                        partial(
+                            _save_snippets_to_directory_in_worker,
+                            output_directory=output_directory,
+                            batch_size=batch_size,
+                            pipeline_threads=pipeline_threads,
+                            write_threads=write_threads,
+                        ),
+                        pieces,
+                    ):
+                        found_images[input_tarfile] |= self.merge_worker_results(
+                            worker_results
+                        )
+                        unfinished_pieces[input_tarfile] -= 1
+                        if unfinished_pieces[input_tarfile] == 0:
+                            self.record_missing_images(
+                                input_tarfile, found_images.pop(input_tarfile)
+                            )
+                            self.mark_reel_complete(input_tarfile)
+                self.reload_snippet_cache()
+
+                # Tarfiles whose index shows they hold no annotated images weren't split into any pieces
+                for input_tarfile in self.get_unfinished_tarfiles(input_tarfiles):
+                    if input_tarfile not in unfinished_pieces:
+                        self.record_missing_images(input_tarfile, set())
+                        self.mark_reel_complete(input_tarfile)
+                return
+
+            for input_tarfile in self.get_unfinished_tarfiles(input_tarfiles):
+                self.write_snippets_to_directory(
+                    output_directory,
+                    self.yield_encoded_snippets_from_tarfiles(
+                        [input_tarfile], batch_size, pipeline_threads
+                    ),
+                    write_threads,
+                )
+                self.mark_reel_complete(input_tarfile)
+        finally:
+            self.close_run_journal()
 
-    def save_snippets_as_tar_from_tarfiles(
+    def save_changed_snippets_to_directory_from_tarfiles(
         self,
+        previous_df,
         input_tarfiles: list,
         output_directory: str,
-        outfile: str,
         batch_size: int = 10000,
+        workers: int = 1,
+        pipeline_threads: int = 0,
+        write_threads: int = 0,
     ):
         """
-        This function will generate snippets for the user and save them out a tar file. The directory structure within the tarfile will be reel_name -> image_name -> snippet.
+        This function brings the snippets that save_snippets_to_directory_from_tarfiles saved from the annotations in previous_df up to date with
+        the annotations this SnippetGenerator was initialized with. The two are compared by (image_name, snip_name): the snippets that were
+        removed or changed are deleted from output_directory, and only the snippets that were added or changed are cut, so images without changes
+        aren't decoded. With partition_by_reel, the reels are compared one at a time and a tarfile whose reel has no changes isn't opened.
+        Otherwise the changes can be in any tarfile, so the tarfiles are read for the changed images, unless use_tar_index is True.
+        It returns the AnnotationDiff of each reel, by reel name. Without partition_by_reel every reel has the same one.
 
         Args:
+            previous_df: The annotations the snippets in output_directory were saved from, in any form SnippetGenerator is initialized with:
+                a DataFrame, a coordinate map, eg: a CoordinateIndex, ReelPartitions, or the path to an index file or directory written by compile_index_file.
             input_tarfiles: The paths to the tarfiles that contains images to be snipped.
-            output_directory: This is the path to a directory where many directories will be created, and where snippets will be saved to.
-            outfile: The name of the output file to save the snippets to. This should be a .tar or .tar.gz file.
-            batch_size: This function saves out images in batches to optimize IO performance. batch_size is given a default value.
+            output_directory: The directory the snippets were saved in.
+            batch_size: The number of snippets held in memory at a time.
+            workers: The number of processes to use. See save_snippets_to_directory_from_tarfiles.
+            pipeline_threads: The number of decode, crop and encode threads each process uses.
+            write_threads: The number of threads that write snippets. See DirectorySnippetWriter.
         """
-        if not (outfile.endswith(".tar") or outfile.endswith(".tar.gz")):
-            raise CustomException(
-                f"Output tarfile in the save_snippets_as_tar function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: {os.path.splitext(outfile)[-1]}"
+        previous_coordinates = self.get_previous_coordinates(previous_df)
+        changed_snippet_generator = copy.copy(self)
+        diffs, changed_tarfiles = {}, []
+
+        if self.reel_partitions is None:
+            diff = AnnotationDiff(previous_coordinates, self.map_coordinates_to_images)
+            changed_snippet_generator.map_coordinates_to_images = (
+                diff.changed_coordinates
             )
 
-        if not os.path.exists(output_directory):
-            os.makedirs(output_directory)
+        for input_tarfile in input_tarfiles:
+            reel_name = self.get_tarfile_name_no_ext(input_tarfile)
 
-        outfile_path = os.path.join(output_directory, outfile)
+            if self.reel_partitions is not None:
+                diff = AnnotationDiff(
+                    previous_coordinates.get_partition(reel_name),
+                    self.reel_partitions.get_partition(reel_name),
+                )
 
-        write_param = "w"
-        outfile_name_no_ext = os.path.splitext(outfile)[0]
+            diffs[reel_name] = diff
+            self.delete_snippets_from_directory(
+                output_directory, reel_name, diff.get_outdated_snippets()
+            )
 
-        if outfile.endswith("gz"):
-            write_param = "w:gz"
-            outfile_name_no_ext = os.path.splitext(outfile_name_no_ext)[0]
+            if diff.changed_coordinates:
+                changed_tarfiles.append(input_tarfile)
+
+        if self.reel_partitions is not None:
+            changed_snippet_generator.reel_partitions = MappingReelPartitions(
+                {
+                    reel_name: diff.changed_coordinates
+                    for reel_name, diff in diffs.items()
+                }
+            )
+
+        if changed_tarfiles:
+            changed_snippet_generator.save_snippets_to_directory_from_tarfiles(
+                changed_tarfiles,
+                output_directory,
+                batch_size,
+                workers,
+                pipeline_threads,
+                write_threads=write_threads,
+            )
+
+        return diffs
+
+    def get_previous_coordinates(self, previous_df):
+        """
+        This function returns the coordinates of an earlier version of the annotations in the same form as the coordinates of this SnippetGenerator:
+        ReelPartitions if they are partitioned by reel, and a coordinate map otherwise.
+
+        Args:
+            previous_df: The earlier annotations. See save_changed_snippets_to_directory_from_tarfiles.
+        """
+        if isinstance(previous_df, str):
+            previous_df = (
+                IndexDirectoryReelPartitions(previous_df)
+                if os.path.isdir(previous_df)
+                else CoordinateIndex.load(previous_df)
+            )
+
+        if self.reel_partitions is not None:
+            if isinstance(previous_df, pd.DataFrame):
+                return DataFrameReelPartitions(previous_df)
+            if isinstance(previous_df, ReelPartitions):
+                return previous_df
+        else:
+            if isinstance(previous_df, pd.DataFrame):
+                return DataFrame_to_Dictionary_converter().convert_df_to_map(
+                    previous_df
+                )
+            if isinstance(previous_df, Mapping):
+                return previous_df
+
+        raise CustomException(
+            f"The previous annotations must be partitioned by reel if and only if the annotations of the SnippetGenerator are. You provided: {type(previous_df).__name__}"
+        )
+
+    def delete_snippets_from_directory(
+        self, output_directory: str, reel_name: str, snippets: list
+    ):
+        """
+        This function deletes saved snippets from output_directory/reel_name/image_name/, and the directories of images that are left empty.
+        Snippets that aren't there are skipped.
+
+        Args:
+            output_directory: The directory the snippets were saved in.
+            reel_name: The name of the reel's tarfile without its extension.
+            snippets: The (image_name, snip_name) of the snippets.
+        """
+        image_directories = set()
+
+        for image_name, field in snippets:
+            image_directory = os.path.join(output_directory, reel_name, str(image_name))
+            image_directories.add(image_directory)
+
+            try:
+                os.remove(
+                    os.path.join(
+                        image_directory, self.get_snippet_filename(image_name, field)
+                    )
+                )
+            except FileNotFoundError:
+                pass
+
+        for image_directory in image_directories:
+            try:
+                os.rmdir(image_directory)
+            except OSError:
+                # The directory still holds snippets or doesn't exist
+                pass
+
+    def open_run_journal(self, journal_path: str):
+        """
+        This function makes the RunJournal at journal_path the journal of the run, if journal_path is given. The journal is kept in run_journal,
+        so the processes of a worker pool, which are started with a copy of the SnippetGenerator, journal their work in it too.
+
+        Args:
+            journal_path: The path to the journal, or None.
+        """
+        if journal_path is not None:
+            self.run_journal = RunJournal(journal_path)
+
+    def close_run_journal(self):
+        """
+        This function closes the journal opened by open_run_journal.
+        """
+        if self.run_journal is not None:
+            self.run_journal.close()
+            self.run_journal = None
+
+    def get_unfinished_tarfiles(self, input_tarfiles: list):
+        """
+        This function returns the input tarfiles whose reels aren't in the run journal. Without a journal, every tarfile is returned.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+        """
+        if self.run_journal is None:
+            return list(input_tarfiles)
+
+        return [
+            input_tarfile
+            for input_tarfile in input_tarfiles
+            if not self.run_journal.is_complete(
+                "reel", self.get_tarfile_name_no_ext(input_tarfile)
+            )
+        ]
+
+    def record_missing_images(self, input_tarfile: str, found_image_names: set):
+        """
+        This function lists the annotated images of a reel that weren't found in its tarfile in missing_images, when the SnippetGenerator is
+        partitioned by reel. It is used for reels that were snipped by the processes of a pool, which hand back the images they found.
+        A reel that was split into byte ranges is only complete once every range is snipped, so the images found in each are put together first.
+
+        Args:
+            input_tarfile: The path to the tarfile of the reel.
+            found_image_names: The names of the annotated images that were found in the tarfile.
+        """
+        if self.reel_partitions is None:
+            return
+
+        reel_name = self.get_tarfile_name_no_ext(input_tarfile)
+        self.load_coordinates_of_reel(reel_name)
+        image_names = self.map_coordinates_to_images
+
+        # Images that an earlier run finished aren't read, the same as in yield_raw_image_and_name_from_tarfile
+        if self.run_journal is not None:
+            image_names = self.run_journal.get_unfinished_image_names(
+                reel_name, image_names
+            )
+
+        self.missing_images[reel_name] = sorted(
+            image_name
+            for image_name in self.map_coordinates_to_images
+            if image_name in image_names and image_name not in found_image_names
+        )
+        self.unload_coordinates_of_reel()
+
+    def mark_reel_complete(self, input_tarfile: str, **details):
+        """
+        This function records in the run journal, if there is one, that every snippet of a reel was written.
+
+        Args:
+            input_tarfile: The path to the tarfile of the reel.
+            details: Anything else to record about the reel, eg: the shards it was written to.
+        """
+        if self.run_journal is not None:
+            self.run_journal.mark_complete(
+                "reel", self.get_tarfile_name_no_ext(input_tarfile), **details
+            )
+
+    def write_snippets_to_directory(
+        self, output_directory: str, encoded_snippets, write_threads: int = 0
+    ):
+        """
+        This function writes encoded snippets to output_directory/tarfile_name_no_ext/image_name_no_ext/ with a DirectorySnippetWriter.
+        The snippets of an image come one after the other, so they are handed to the writer together, and once they are all written the image
+        is recorded in the run journal, if there is one. Snippets that are duplicates of another snippet of their image are written as hard links.
+
+        Args:
+            output_directory: The directory the snippets are saved in.
+            encoded_snippets: An iterator of (tarfile_name_no_ext, image_name_no_ext, field, snippet_bytes), eg: from yield_encoded_snippets_from_tarfiles.
+            write_threads: The number of threads that write snippets behind the thread that snips them. See DirectorySnippetWriter.
+        """
+        on_image_written = None
+        if self.run_journal is not None:
+            on_image_written = partial(self.run_journal.mark_complete, "image")
 
-        with tarfile.open(outfile_path, write_param) as tar_out:
+        with DirectorySnippetWriter(
+            output_directory, write_threads, on_image_written=on_image_written
+        ) as writer:
             for (
                 tarfile_name_no_ext,
-                image_names_no_ext,
-                fields,
-                snippets,
-            ) in self.get_batches_of_snippets_from_tarfiles(input_tarfiles, batch_size):
-                for image_name_no_ext, field, snippet in zip(
-                    image_names_no_ext, fields, snippets
-                ):
-                    try:
-                        snippet_byte_arr = io.BytesIO()
-                        snippet.save(snippet_byte_arr, format="PNG")
-                        snippet_byte_arr.seek(0)
+                image_name_no_ext,
+            ), snippets_of_image in itertools.groupby(
+                self.yield_encoded_snippets_with_duplicates(encoded_snippets),
+                key=lambda snippet: snippet[:2],
+            ):
+                journal_image_name = None
+                if self.run_journal is not None:
+                    journal_image_name = self.run_journal.get_image_name(
+                        tarfile_name_no_ext, image_name_no_ext
+                    )
+
+                snippets, links = self.get_snippet_files_of_image(
+                    image_name_no_ext, snippets_of_image
+                )
 
-                        snippet_filename = f"{image_name_no_ext}_{field}.png"
-                        tar_path = os.path.join(
-                            outfile_name_no_ext,
-                            tarfile_name_no_ext,
-                            image_name_no_ext,
-                            snippet_filename,
-                        )
+                writer.add_image(
+                    os.path.join(tarfile_name_no_ext, image_name_no_ext),
+                    snippets,
+                    journal_image_name,
+                    links,
+                )
 
-                        snippet_info = tarfile.TarInfo(name=tar_path)
-                        snippet_info.size = len(snippet_byte_arr.getvalue())
+    def get_snippet_files_of_image(self, image_name_no_ext: str, snippets_of_image):
+        """
+        This function returns the files the snippets of an image are saved to in a directory as (snippets, links), where snippets are
+        (snippet_filename, snippet_bytes) and links are (snippet_filename, target_filename) for the snippets that are duplicates of another one.
+        See DirectorySnippetWriter.add_image.
 
-                        tar_out.addfile(snippet_info, snippet_byte_arr)
-                    except Exception as e:
-                        print(snippet_filename)
-                        print(e)
+        Args:
+            image_name_no_ext: The name of the image.
+            snippets_of_image: The snippets of the image as yielded by yield_encoded_snippets_with_duplicates.
+        """
+        snippets, links = [], []
+        for _, _, field, snippet_bytes, duplicate_of in snippets_of_image:
+            snippet_filename = self.get_snippet_filename(image_name_no_ext, field)
 
-    def save_snippets_to_directory_from_image_paths(
-        self, image_paths: list, output_directory: str, batch_size: int = 10000
-    ):
-        for (
-            image_names_no_ext,
-            fields,
-            snippets,
-        ) in self.get_batches_of_snippets_from_image_paths(image_paths, batch_size):
-            for image_name_no_ext, field, snippet in zip(
-                image_names_no_ext, fields, snippets
+            if duplicate_of is None:
+                snippets.append((snippet_filename, snippet_bytes))
+            else:
+                links.append(
+                    (
+                        snippet_filename,
+                        self.get_snippet_filename(image_name_no_ext, duplicate_of),
+                    )
+                )
+
+        return snippets, links
+
+    def split_tarfiles_by_byte_range(self, input_tarfiles: list, parts: int):
+        """
+        This function returns the (input_tarfile, byte_range) pieces that the input tarfiles are spread across workers in.
+        A .tar file with a TarIndex, or a .zip file, is split into up to parts byte ranges of about the same size. Other tarfiles and directories
+        are a single piece with a byte_range of None. Tarfiles whose index shows they hold no annotated images are left out.
+        A .tar.gz file is snipped whole, so its index is only used here if it is cached already. Building it would decompress the whole reel
+        in this process before a worker decompresses it again, so an index that isn't cached is built by the worker that reads the reel.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            parts: The most byte ranges to split each tarfile into.
+        """
+        pieces = []
+
+        for input_tarfile in input_tarfiles:
+            tarfile_name_no_ext = self.get_tarfile_name_no_ext(input_tarfile)
+
+            if input_tarfile.endswith("gz") and (
+                self.load_cached_tar_index(input_tarfile) is None
             ):
-                snippet_directory = os.path.join(output_directory, image_name_no_ext)
-                snippet_filename = f"{image_name_no_ext}_{field}.png"
-                path_to_snippet = os.path.join(snippet_directory, snippet_filename)
+                pieces.append((input_tarfile, None))
+                continue
 
-                if not os.path.exists(snippet_directory):
-                    os.makedirs(snippet_directory)
+            tar_index = self.get_input_source(input_tarfile).get_index()
 
-                snippet.save(path_to_snippet)
+            if tar_index is None:
+                pieces.append((input_tarfile, None))
+                continue
 
-    def save_snippets_as_tar_from_image_paths(
+            self.load_coordinates_of_reel(tarfile_name_no_ext)
+            byte_ranges = tar_index.split_by_byte_range(
+                self.map_coordinates_to_images, parts
+            )
+            self.unload_coordinates_of_reel()
+
+            if input_tarfile.endswith("gz"):
+                # A .tar.gz file can't be seeked into, so it is snipped whole
+                pieces.extend((input_tarfile, None) for _ in byte_ranges[:1])
+            else:
+                pieces.extend((input_tarfile, byte_range) for byte_range in byte_ranges)
+
+        return pieces
+
+    def save_snippets_of_byte_range_to_directory(
         self,
-        image_paths: list,
+        input_tarfile: str,
+        byte_range: tuple,
+        output_directory: str,
+        write_threads: int = 0,
+        pipeline_threads: int = 0,
+    ):
+        """
+        This function saves the snippets of the images in a byte range of a .tar or .zip file, as split by split_tarfiles_by_byte_range,
+        the same way as save_snippets_to_directory_from_tarfiles. Each image is written as soon as it is snipped.
+
+        Args:
+            input_tarfile: The path to the .tar or .zip file.
+            byte_range: The (start, end) of the images to snip. See TarIndex.get_members_of_images.
+            output_directory: The directory the snippets are saved in.
+            write_threads: The number of threads that write snippets. See DirectorySnippetWriter.
+            pipeline_threads: If greater than 0, the byte range is snipped with yield_encoded_snippets_from_tarfile using this many threads.
+        """
+        tarfile_name_no_ext = self.get_tarfile_name_no_ext(input_tarfile)
+        self.load_coordinates_of_reel(tarfile_name_no_ext)
+
+        if pipeline_threads > 0:
+            encoded_images = self.yield_encoded_snippets_from_tarfile(
+                input_tarfile, pipeline_threads, byte_range=byte_range
+            )
+        else:
+            encoded_images = (
+                self.encode_snippets_of_image(image_name, image_bytes)
+                for image_name, image_bytes in self.yield_raw_image_and_name_from_tarfile(
+                    input_tarfile, byte_range
+                )
+            )
+
+        self.write_snippets_to_directory(
+            output_directory,
+            (
+                (tarfile_name_no_ext, image_name, field, snippet_bytes)
+                for image_name, encoded_snippets in encoded_images
+                for field, snippet_bytes in encoded_snippets
+            ),
+            write_threads,
+        )
+
+        self.unload_coordinates_of_reel()
+
+    def save_snippets_as_tar_from_tarfiles(
+        self,
+        input_tarfiles: list,
         output_directory: str,
         outfile: str,
         batch_size: int = 10000,
+        workers: int = 1,
+        pipeline_threads: int = 0,
+        compress_level: int = 9,
+        compression_threads: int = 0,
     ):
+        """
+        This function will generate snippets for the user and save them out a tar file. The directory structure within the tarfile will be reel_name -> image_name -> snippet.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            output_directory: This is the path to a directory where many directories will be created, and where snippets will be saved to.
+            outfile: The name of the output file to save the snippets to. This should be a .tar or .tar.gz file.
+            batch_size: This function saves out images in batches to optimize IO performance. batch_size is given a default value.
+            workers: The number of processes the input tarfiles are spread across. Each process writes the snippets of a tarfile to a temporary
+                part file, and the parts are copied into outfile in the order of input_tarfiles so the result matches a run with a single process.
+            pipeline_threads: If greater than 0, each tarfile is snipped with yield_encoded_snippets_from_tarfile using this many decode, crop and encode threads.
+            compress_level: The gzip compression level of a .tar.gz outfile. 0 stores PNG snippets, which barely compress again, without compressing them.
+            compression_threads: If greater than 0, a .tar.gz outfile is compressed by this many threads. See open_tar_for_writing.
+        """
         if not (outfile.endswith(".tar") or outfile.endswith(".tar.gz")):
             raise CustomException(
                 f"Output tarfile in the save_snippets_as_tar function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: {os.path.splitext(outfile)[-1]}"
@@ -172,99 +708,1199 @@ class SnippetGenerator:
 
         outfile_path = os.path.join(output_directory, outfile)
 
-        write_param = "w"
         outfile_name_no_ext = os.path.splitext(outfile)[0]
 
         if outfile.endswith("gz"):
-            write_param = "w:gz"
             outfile_name_no_ext = os.path.splitext(outfile_name_no_ext)[0]
 
-        with tarfile.open(outfile_path, write_param) as tar_out:
-            for (
-                image_names_no_ext,
-                fields,
-                snippets,
-            ) in self.get_batches_of_snippets_from_image_paths(image_paths, batch_size):
-                for image_name_no_ext, field, snippet in zip(
-                    image_names_no_ext, fields, snippets
-                ):
-                    try:
-                        snippet_byte_arr = io.BytesIO()
-                        snippet.save(snippet_byte_arr, format="PNG")
-                        snippet_byte_arr.seek(0)
-
-                        snippet_filename = f"{image_name_no_ext}_{field}.png"
-                        tar_path = os.path.join(
-                            outfile_name_no_ext,
-                            image_name_no_ext,
-                            snippet_filename,
-                        )
-
-                        snippet_info = tarfile.TarInfo(name=tar_path)
-                        snippet_info.size = len(snippet_byte_arr.getvalue())
-
-                        tar_out.addfile(snippet_info, snippet_byte_arr)
-                    except Exception as e:
-                        print(snippet_filename)
-                        print(e)
+        with open_tar_for_writing(
+            outfile_path, compress_level, compression_threads
+        ) as tar_out:
+            if workers > 1:
+                self.add_snippets_to_tar_with_workers(
+                    tar_out,
+                    input_tarfiles,
+                    output_directory,
+                    outfile_name_no_ext,
+                    batch_size,
+                    workers,
+                    pipeline_threads,
+                )
+            else:
+                self.add_snippets_to_tar(
+                    tar_out,
+                    outfile_name_no_ext,
+                    self.yield_encoded_snippets_from_tarfiles(
+                        input_tarfiles, batch_size, pipeline_threads
+                    ),
+                )
 
-    def get_batches_of_snippets_from_tarfiles(
-        self, input_tarfiles: list, batch_size: int
+    def save_snippets_as_sharded_tar_from_tarfiles(
+        self,
+        input_tarfiles: list,
+        output_directory: str,
+        outfile: str,
+        max_snippets_per_shard: int = None,
+        max_bytes_per_shard: int = None,
+        shard_per_reel: bool = False,
+        batch_size: int = 10000,
+        workers: int = 1,
+        pipeline_threads: int = 0,
+        compress_level: int = 9,
+        compression_threads: int = 0,
+        journal_path: str = None,
     ):
         """
-        This function yields a batch of snippets from one or more images.
+        This function saves the snippets in a numbered set of tarfiles instead of one, eg: snippets-000000.tar, snippets-000001.tar, ...
+        and writes a manifest of the shards to outfile_name_no_ext.manifest.json. The members of the shards have the same paths as in
+        save_snippets_as_tar_from_tarfiles, so extracting every shard gives the same directories as extracting a single outfile.
 
         Args:
             input_tarfiles: The paths to the tarfiles that contains images to be snipped.
-            batch_size: The number of snippets we want this function to yield at a given time.
+            output_directory: The directory the shards and the manifest are written to.
+            outfile: The name the shards are numbered after. This should be a .tar or .tar.gz file.
+            max_snippets_per_shard: The most snippets in a shard. See ShardedTarWriter.
+            max_bytes_per_shard: The most bytes in a shard before compression. See ShardedTarWriter.
+            shard_per_reel: If True, every input tarfile gets its own set of shards, named outfile_name_no_ext-reel_name-000000.tar, ...
+            batch_size: The number of snippets held in memory at a time when pipeline_threads is 0.
+            workers: The number of processes the input tarfiles are spread across. Each process writes the shards of its own reels, so
+                shard_per_reel must be True.
+            pipeline_threads: If greater than 0, each tarfile is snipped with yield_encoded_snippets_from_tarfile using this many threads.
+            compress_level: The gzip compression level of .tar.gz shards.
+            compression_threads: If greater than 0, .tar.gz shards are compressed by this many threads. See open_tar_for_writing.
+            journal_path: If given, the shards are recorded in a RunJournal at this path as they are finished, and a run that is started again
+                with the same journal, eg: after a crash, continues after them. With shard_per_reel, every reel whose shards were all written is
+                recorded and skipped. Otherwise every shard is recorded when it is closed, with how far into its reel the input had been read, and
+                the run continues with the next shard. Only the snippets of that reel that were already written are snipped again.
         """
+        if not (outfile.endswith(".tar") or outfile.endswith(".tar.gz")):
+            raise CustomException(
+                f"Output tarfile in the save_snippets_as_tar function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: {os.path.splitext(outfile)[-1]}"
+            )
 
-        for input_tarfile in input_tarfiles:
-            tarfile_name = os.path.basename(input_tarfile)
+        if workers > 1 and not shard_per_reel:
+            raise CustomException(
+                "Sharded tar output can only be written with workers when shard_per_reel is True, since each process writes the shards of its own reels."
+            )
 
-            if not (tarfile_name.endswith(".tar") or tarfile_name.endswith(".tar.gz")):
-                raise CustomException(
-                    f"Input tarfile in the get_batches_of_snippets_from_tarfiles function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: {os.path.splitext(tarfile_name)[-1]} for file: {input_tarfile}"
-                )
-            if not os.path.exists(input_tarfile):
-                raise CustomException(
-                    f"The path to this tarfile doesn't exist. {input_tarfile}"
+        extension = ".tar.gz" if outfile.endswith(".tar.gz") else ".tar"
+        outfile_name_no_ext = outfile[: -len(extension)]
+        save_shards = partial(
+            self.save_snippets_as_shards,
+            output_directory=output_directory,
+            outfile_name_no_ext=outfile_name_no_ext,
+            extension=extension,
+            max_snippets_per_shard=max_snippets_per_shard,
+            max_bytes_per_shard=max_bytes_per_shard,
+            shard_per_reel=shard_per_reel,
+            batch_size=batch_size,
+            pipeline_threads=pipeline_threads,
+            compress_level=compress_level,
+            compression_threads=compression_threads,
+        )
+
+        self.open_run_journal(journal_path)
+
+        try:
+            if shard_per_reel:
+                shards = self.save_snippets_as_shards_per_reel(
+                    input_tarfiles, save_shards, workers
+                )
+            else:
+                shards = save_shards(input_tarfiles)
+        finally:
+            self.close_run_journal()
+
+        write_shard_manifest(
+            os.path.join(output_directory, f"{outfile_name_no_ext}.manifest.json"),
+            shards,
+        )
+
+    def save_snippets_as_shards_per_reel(
+        self, input_tarfiles: list, save_shards, workers: int
+    ):
+        """
+        This function writes a set of shards for each input tarfile, spread across workers processes when workers is greater than 1, and returns
+        every shard in the order of input_tarfiles. Reels in the run journal aren't written again, and their shards are taken from the journal.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            save_shards: save_snippets_as_shards with every argument but input_tarfiles given.
+            workers: The number of processes.
+        """
+        unfinished_tarfiles = self.get_unfinished_tarfiles(input_tarfiles)
+        shards_of_reels = {}
+
+        if workers > 1:
+            with self.get_worker_pool(workers) as pool:
+                for input_tarfile, (shards_of_reel, worker_results) in zip(
+                    unfinished_tarfiles,
+                    pool.imap(
+                        partial(
+                            _save_snippets_as_shards_in_worker, save_shards.keywords
+                        ),
+                        unfinished_tarfiles,
+                    ),
+                ):
+                    self.record_missing_images(
+                        input_tarfile, self.merge_worker_results(worker_results)
+                    )
+                    self.mark_reel_complete(input_tarfile, shards=shards_of_reel)
+                    shards_of_reels[input_tarfile] = shards_of_reel
+            self.reload_snippet_cache()
+        else:
+            for input_tarfile in unfinished_tarfiles:
+                shards_of_reels[input_tarfile] = save_shards([input_tarfile])
+                self.mark_reel_complete(
+                    input_tarfile, shards=shards_of_reels[input_tarfile]
+                )
+
+        shards = []
+        for input_tarfile in input_tarfiles:
+            if input_tarfile not in shards_of_reels:
+                shards_of_reels[input_tarfile] = self.run_journal.records[
+                    ("reel", self.get_tarfile_name_no_ext(input_tarfile))
+                ]["shards"]
+
+            shards.extend(shards_of_reels[input_tarfile])
+
+        return shards
+
+    def save_snippets_as_shards(
+        self,
+        input_tarfiles: list,
+        output_directory: str,
+        outfile_name_no_ext: str,
+        extension: str,
+        max_snippets_per_shard: int,
+        max_bytes_per_shard: int,
+        shard_per_reel: bool,
+        batch_size: int,
+        pipeline_threads: int,
+        compress_level: int = 9,
+        compression_threads: int = 0,
+    ):
+        """
+        This function writes the snippets of input_tarfiles to one set of shards and returns the shards, as returned by ShardedTarWriter.close.
+        When shard_per_reel is True, input_tarfiles must hold a single tarfile, whose reel name is added to the names of the shards and to the manifest.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            output_directory: The directory the shards are written to.
+            outfile_name_no_ext: The name the shards are numbered after, and the top level directory inside them.
+            extension: .tar or .tar.gz.
+            max_snippets_per_shard: The most snippets in a shard.
+            max_bytes_per_shard: The most bytes in a shard before compression.
+            shard_per_reel: If True, the shards belong to the reel of the single tarfile in input_tarfiles.
+            batch_size: The number of snippets held in memory at a time when pipeline_threads is 0.
+            pipeline_threads: If greater than 0, each tarfile is snipped with yield_encoded_snippets_from_tarfile using this many threads.
+            compress_level: The gzip compression level of .tar.gz shards.
+            compression_threads: The number of threads that compress .tar.gz shards.
+        """
+        shard_prefix = outfile_name_no_ext
+        if shard_per_reel:
+            reel_name = self.get_tarfile_name_no_ext(input_tarfiles[0])
+            shard_prefix = f"{outfile_name_no_ext}-{reel_name}"
+
+        encoded_snippets = self.yield_encoded_snippets_from_tarfiles(
+            input_tarfiles, batch_size, pipeline_threads
+        )
+        finished_shards, position, journal_shard = [], None, None
+
+        if self.run_journal is not None and not shard_per_reel:
+            # position is where the input had been read to when the last shard was written: the reel and the number of its snippets
+            shard_records = self.run_journal.get_records("shard")
+            finished_shards = [record["shard"] for record in shard_records]
+            if shard_records:
+                position = dict(shard_records[-1]["position"])
+                encoded_snippets = self.yield_encoded_snippets_after_position(
+                    input_tarfiles, batch_size, pipeline_threads, position
+                )
+
+            def journal_shard(shard):
+                self.run_journal.mark_complete(
+                    "shard", shard["shard"], shard=shard, position=dict(position)
+                )
+
+        with ShardedTarWriter(
+            output_directory,
+            shard_prefix,
+            extension,
+            max_snippets_per_shard,
+            max_bytes_per_shard,
+            compress_level,
+            compression_threads,
+            finished_shards,
+            journal_shard,
+        ) as writer:
+            # The shard each snippet of the current image was added to, so its duplicates can link to it
+            image, shards_of_fields = None, {}
+
+            for (
+                tarfile_name_no_ext,
+                image_name_no_ext,
+                field,
+                snippet_bytes,
+                duplicate_of,
+            ) in self.yield_encoded_snippets_with_duplicates(encoded_snippets):
+                if (tarfile_name_no_ext, image_name_no_ext) != image:
+                    image = (tarfile_name_no_ext, image_name_no_ext)
+                    shards_of_fields = {}
+
+                image_path = os.path.join(
+                    outfile_name_no_ext, tarfile_name_no_ext, image_name_no_ext
+                )
+                tar_path = os.path.join(
+                    image_path, self.get_snippet_filename(image_name_no_ext, field)
+                )
+
+                if duplicate_of is None:
+                    shards_of_fields[field] = writer.add_snippet(
+                        tar_path, snippet_bytes
+                    )
+                else:
+                    shards_of_fields[field] = writer.add_link(
+                        tar_path,
+                        os.path.join(
+                            image_path,
+                            self.get_snippet_filename(image_name_no_ext, duplicate_of),
+                        ),
+                        shards_of_fields[duplicate_of],
+                        snippet_bytes,
+                    )
+
+                if journal_shard is not None:
+                    if position is None or position["reel_name"] != tarfile_name_no_ext:
+                        position = {"reel_name": tarfile_name_no_ext, "snippets": 0}
+                    position["snippets"] += 1
+
+        if shard_per_reel:
+            for shard in writer.shards:
+                shard["reel_name"] = reel_name
+
+        return writer.shards
+
+    def yield_encoded_snippets_after_position(
+        self,
+        input_tarfiles: list,
+        batch_size: int,
+        pipeline_threads: int,
+        position: dict,
+    ):
+        """
+        This function yields the encoded snippets of input_tarfiles like yield_encoded_snippets_from_tarfiles, starting after a position that was
+        recorded in the run journal. The tarfiles before the reel of the position aren't read, and the snippets of that reel up to the position are skipped.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            batch_size: The number of snippets held in memory at a time when pipeline_threads is 0.
+            pipeline_threads: The number of decode, crop and encode threads. See yield_encoded_snippets_from_tarfiles.
+            position: The reel_name and the number of its snippets that were written.
+        """
+        reel_names = [
+            self.get_tarfile_name_no_ext(input_tarfile)
+            for input_tarfile in input_tarfiles
+        ]
+
+        if position["reel_name"] not in reel_names:
+            raise CustomException(
+                f"The run journal was written for other input tarfiles. It continues after reel {position['reel_name']}, which isn't one of them."
+            )
+
+        yield from itertools.islice(
+            self.yield_encoded_snippets_from_tarfiles(
+                input_tarfiles[reel_names.index(position["reel_name"]) :],
+                batch_size,
+                pipeline_threads,
+            ),
+            position["snippets"],
+            None,
+        )
+
+    def add_snippets_to_tar(
+        self, tar_out: tarfile.TarFile, outfile_name_no_ext: str, encoded_snippets
+    ):
+        """
+        This function adds the snippets yielded by yield_encoded_snippets_from_tarfiles to an open tarfile. Snippets that are duplicates of
+        another snippet of their image are added as hard links to it.
+
+        Args:
+            tar_out: The tarfile, opened for writing, that the snippets are added to.
+            outfile_name_no_ext: The name of the output tarfile without its extension. It is the top level directory inside the tarfile.
+            encoded_snippets: An iterable of snippets as yielded by yield_encoded_snippets_from_tarfiles.
+        """
+        for (
+            tarfile_name_no_ext,
+            image_name_no_ext,
+            field,
+            snippet_bytes,
+            duplicate_of,
+        ) in self.yield_encoded_snippets_with_duplicates(encoded_snippets):
+            image_path = os.path.join(
+                outfile_name_no_ext, tarfile_name_no_ext, image_name_no_ext
+            )
+            tar_path = os.path.join(
+                image_path, self.get_snippet_filename(image_name_no_ext, field)
+            )
+
+            if duplicate_of is None:
+                self.add_encoded_snippet_to_tar(tar_out, tar_path, snippet_bytes)
+            else:
+                write_tar_link(
+                    tar_out,
+                    tar_path,
+                    os.path.join(
+                        image_path,
+                        self.get_snippet_filename(image_name_no_ext, duplicate_of),
+                    ),
+                )
+
+    def yield_encoded_snippets_with_duplicates(self, encoded_snippets):
+        """
+        This function yields encoded snippets as (tarfile_name_no_ext, image_name_no_ext, field, snippet_bytes, duplicate_of), where duplicate_of
+        is the field of an earlier snippet of the same image that has the same box, or None. When deduplicate_boxes is True, the snippets of an image
+        with the same box share one bytes object, which is how they are told apart from snippets that only happen to encode the same.
+
+        Args:
+            encoded_snippets: An iterable of snippets as yielded by yield_encoded_snippets_from_tarfiles.
+        """
+        image, first_fields = None, {}
+
+        for (
+            tarfile_name_no_ext,
+            image_name_no_ext,
+            field,
+            snippet_bytes,
+        ) in encoded_snippets:
+            duplicate_of = None
+
+            if self.deduplicate_boxes:
+                if (tarfile_name_no_ext, image_name_no_ext) != image:
+                    image = (tarfile_name_no_ext, image_name_no_ext)
+                    first_fields = {}
+
+                # The bytes are held along with the field, so their id isn't reused while the image is being read
+                _, first_field = first_fields.setdefault(
+                    id(snippet_bytes), (snippet_bytes, field)
+                )
+                if first_field != field:
+                    duplicate_of = first_field
+
+            yield (
+                tarfile_name_no_ext,
+                image_name_no_ext,
+                field,
+                snippet_bytes,
+                duplicate_of,
+            )
+
+    def add_encoded_snippet_to_tar(
+        self, tar_out: tarfile.TarFile, tar_path: str, snippet_bytes: bytes
+    ):
+        """
+        This function adds one encoded snippet to an open tarfile.
+
+        Args:
+            tar_out: The tarfile, opened for writing, that the snippet is added to.
+            tar_path: The path of the snippet inside the tarfile.
+            snippet_bytes: The encoded snippet.
+        """
+        write_tar_member(tar_out, tar_path, snippet_bytes)
+
+    def add_snippets_to_tar_with_workers(
+        self,
+        tar_out: tarfile.TarFile,
+        input_tarfiles: list,
+        output_directory: str,
+        outfile_name_no_ext: str,
+        batch_size: int,
+        workers: int,
+        pipeline_threads: int = 0,
+    ):
+        """
+        This function snips the input tarfiles in a pool of processes. Every process writes the snippets of one input tarfile to an
+        uncompressed part file in a temporary directory, and this process copies the members of each part into tar_out in the order of input_tarfiles.
+        The blocks of the members are copied as they are, so no TarInfo is kept for them. See write_tar_part.
+
+        Args:
+            tar_out: The tarfile, opened for writing, that the snippets are added to.
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            output_directory: The directory that the temporary part files are written to.
+            outfile_name_no_ext: The name of the output tarfile without its extension. It is the top level directory inside the tarfile.
+            batch_size: The number of snippets each process holds in memory at a time.
+            workers: The number of processes to use.
+            pipeline_threads: The number of decode, crop and encode threads each process uses. See yield_encoded_snippets_from_tarfile.
+        """
+        parts_directory = tempfile.mkdtemp(dir=output_directory)
+
+        try:
+            part_paths = [
+                os.path.join(parts_directory, f"{part_number:06d}.tar")
+                for part_number in range(len(input_tarfiles))
+            ]
+
+            with self.get_worker_pool(workers) as pool:
+                for input_tarfile, (part_path, part_size, worker_results) in zip(
+                    input_tarfiles,
+                    pool.imap(
+                        partial(
+                            _save_snippets_as_tar_part_in_worker,
+                            outfile_name_no_ext=outfile_name_no_ext,
+                            batch_size=batch_size,
+                            pipeline_threads=pipeline_threads,
+                        ),
+                        zip(input_tarfiles, part_paths),
+                    ),
+                ):
+                    self.record_missing_images(
+                        input_tarfile, self.merge_worker_results(worker_results)
+                    )
+
+                    write_tar_part(tar_out, part_path, part_size)
+                    os.remove(part_path)
+            self.reload_snippet_cache()
+        finally:
+            shutil.rmtree(parts_directory, ignore_errors=True)
+
+    def merge_worker_results(self, worker_results: tuple):
+        """
+        This function adds the stats of the snippet cache that a process of a pool counted to the snippet_cache, if there is one, and returns
+        the names of the annotated images that the process found. See record_missing_images.
+
+        Args:
+            worker_results: The (found_image_names, cache_counts) that the process handed back.
+        """
+        found_image_names, cache_counts = worker_results
+
+        if cache_counts is not None:
+            self.snippet_cache.merge_counts(cache_counts)
+
+        return found_image_names
+
+    def reload_snippet_cache(self):
+        """
+        This function reloads the snippet_cache, if there is one, once the processes of a pool are done with it, so it lists the snippets
+        they added and is back within its max_bytes. See SnippetCache.reload.
+        """
+        if self.snippet_cache is not None:
+            self.snippet_cache.reload()
+
+    def get_worker_pool(self, workers: int):
+        """
+        This function returns a process pool in which every process holds its own copy of this SnippetGenerator. The copy is handed to
+        each process once when it starts, so the coordinate map is not pickled again for every tarfile.
+
+        Args:
+            workers: The number of processes in the pool.
+        """
+        return multiprocessing.Pool(
+            workers, initializer=_initialize_worker, initargs=(self,)
+        )
+
+    def save_snippets_to_directory_from_image_paths(
+        self,
+        image_paths: list,
+        output_directory: str,
+        batch_size: int = 10000,
+        write_threads: int = 0,
+    ):
+        """
+        This function saves the snippets of images on disk to output_directory/image_name/. Snippets that are duplicates of another snippet of their
+        image are written as hard links.
+
+        Args:
+            image_paths: The paths to images to be snipped.
+            output_directory: The directory the snippets are saved in.
+            batch_size: The number of snippets held in memory at a time.
+            write_threads: The number of threads that write snippets. See DirectorySnippetWriter.
+        """
+        with DirectorySnippetWriter(output_directory, write_threads) as writer:
+            for image_name_no_ext, snippets_of_image in itertools.groupby(
+                (
+                    (image_name_no_ext, field, snippet)
+                    for image_names_no_ext, fields, snippets in (
+                        self.get_batches_of_snippets_from_image_paths(
+                            image_paths, batch_size
+                        )
+                    )
+                    for image_name_no_ext, field, snippet in zip(
+                        image_names_no_ext, fields, snippets
+                    )
+                ),
+                key=lambda snippet: snippet[0],
+            ):
+                encoded_snippets_of_image = {}
+                snippets, links = self.get_snippet_files_of_image(
+                    image_name_no_ext,
+                    self.yield_encoded_snippets_with_duplicates(
+                        (
+                            None,
+                            image_name_no_ext,
+                            field,
+                            self.encode_snippet_once(
+                                snippet, encoded_snippets_of_image
+                            ),
+                        )
+                        for _, field, snippet in snippets_of_image
+                    ),
                 )
 
-            tarfile_name_no_ext = os.path.splitext(tarfile_name)[0]
+                writer.add_image(image_name_no_ext, snippets, links=links)
+
+    def save_snippets_as_tar_from_image_paths(
+        self,
+        image_paths: list,
+        output_directory: str,
+        outfile: str,
+        batch_size: int = 10000,
+        compress_level: int = 9,
+        compression_threads: int = 0,
+    ):
+        if not (outfile.endswith(".tar") or outfile.endswith(".tar.gz")):
+            raise CustomException(
+                f"Output tarfile in the save_snippets_as_tar function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: {os.path.splitext(outfile)[-1]}"
+            )
+
+        if not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+
+        outfile_path = os.path.join(output_directory, outfile)
+
+        outfile_name_no_ext = os.path.splitext(outfile)[0]
+
+        if outfile.endswith("gz"):
+            outfile_name_no_ext = os.path.splitext(outfile_name_no_ext)[0]
+
+        with open_tar_for_writing(
+            outfile_path, compress_level, compression_threads
+        ) as tar_out:
+            for (
+                image_names_no_ext,
+                fields,
+                snippets,
+            ) in self.get_batches_of_snippets_from_image_paths(image_paths, batch_size):
+                for image_name_no_ext, field, snippet in zip(
+                    image_names_no_ext, fields, snippets
+                ):
+                    try:
+                        snippet_filename = self.get_snippet_filename(
+                            image_name_no_ext, field
+                        )
+                        tar_path = os.path.join(
+                            outfile_name_no_ext,
+                            image_name_no_ext,
+                            snippet_filename,
+                        )
+
+                        self.add_encoded_snippet_to_tar(
+                            tar_out, tar_path, self.encode_snippet(snippet)
+                        )
+                    except Exception as e:
+                        print(snippet_filename)
+                        print(e)
 
-            if tarfile_name.endswith(".tar.gz"):
-                tarfile_name_no_ext = os.path.splitext(tarfile_name_no_ext)[0]
+    def get_batches_of_snippets_from_tarfiles(
+        self, input_tarfiles: list, batch_size: int, as_arrays: bool = False
+    ):
+        """
+        This function yields a batch of snippets from one or more images.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            batch_size: The number of snippets we want this function to yield at a given time.
+            as_arrays: If True, the snippets are NumPy arrays instead of PIL.Images. See yield_snippet_array_and_field.
+        """
+        yield_snippets = (
+            self.yield_snippet_array_and_field
+            if as_arrays
+            else self.yield_snippet_and_field
+        )
+
+        for input_tarfile in input_tarfiles:
+            tarfile_name_no_ext = self.get_tarfile_name_no_ext(input_tarfile)
+            self.load_coordinates_of_reel(tarfile_name_no_ext)
+
+            snippets, fields, image_names = [], [], []
+            for image_name, image in self.yield_image_and_name_from_tarfile(
+                input_tarfile
+            ):
+                for field, snippet in yield_snippets(
+                    image_name, image, decode_in_place=True
+                ):
+                    snippets.append(snippet)
+                    fields.append(field)
+                    image_names.append(image_name)
+
+                    if len(snippets) == batch_size:
+                        yield (
+                            tarfile_name_no_ext,
+                            image_names,
+                            fields,
+                            snippets,
+                        )
+                        snippets, fields, image_names = [], [], []
+
+            if snippets and fields:
+                yield (
+                    tarfile_name_no_ext,
+                    image_names,
+                    fields,
+                    snippets,
+                )
+
+            self.unload_coordinates_of_reel()
+
+    def get_batches_of_snippet_arrays_from_tarfiles(
+        self,
+        input_tarfiles: list,
+        batch_size: int,
+        packed: bool = False,
+        padded: bool = True,
+        pad_value: int = 0,
+    ):
+        """
+        This function yields batches of snippets as NumPy arrays, for consumers like a classifier that would otherwise convert every PIL.Image itself.
+        It yields (tarfile_name_no_ext, image_names, fields, snippets), where snippets is a list of arrays, or a SnippetArrayBatch if packed is True.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            batch_size: The number of snippets we want this function to yield at a given time.
+            packed: If True, every batch is copied into one contiguous buffer with a table of the shapes and offsets of its snippets. See SnippetArrayBatch.
+            padded: If True, packed batches are (N, H, W[, C]) arrays padded to the largest snippet. Otherwise the snippets follow each other in a flat buffer.
+            pad_value: The value the padding of packed batches is filled with.
+        """
+        for (
+            tarfile_name_no_ext,
+            image_names,
+            fields,
+            snippets,
+        ) in self.get_batches_of_snippets_from_tarfiles(
+            input_tarfiles, batch_size, as_arrays=True
+        ):
+            if packed:
+                snippets = SnippetArrayBatch.from_arrays(snippets, padded, pad_value)
+
+            yield tarfile_name_no_ext, image_names, fields, snippets
+
+    def load_coordinates_of_reel(self, tarfile_name_no_ext: str):
+        """
+        This function makes the coordinates of one reel the coordinate map when the SnippetGenerator is partitioned by reel. Otherwise it does nothing.
+
+        Args:
+            tarfile_name_no_ext: The name of the reel's tarfile without its extension.
+        """
+        if self.reel_partitions is not None:
+            self.map_coordinates_to_images = self.reel_partitions.get_partition(
+                tarfile_name_no_ext
+            )
+
+    def unload_coordinates_of_reel(self):
+        """
+        This function drops the coordinates loaded by load_coordinates_of_reel, so they can be freed before the next reel is loaded.
+        """
+        if self.reel_partitions is not None:
+            self.map_coordinates_to_images = {}
+
+    def get_tarfile_name_no_ext(self, input_tarfile: str):
+        """
+        This function checks that an input tarfile exists and has the right extension, and returns its name without the extension.
+        A .zip file or a directory of images is accepted in place of a tarfile, and its name is the reel name. Ie: iowa.zip and iowa/ give iowa
+
+        Args:
+            input_tarfile: The path to the tarfile that contains images to be snipped.
+        """
+        tarfile_name = os.path.basename(input_tarfile)
+
+        if not (
+            os.path.isdir(input_tarfile)
+            or tarfile_name.endswith(".tar")
+            or tarfile_name.endswith(".tar.gz")
+            or tarfile_name.endswith(".zip")
+        ):
+            raise CustomException(
+                f"Input tarfile in the get_batches_of_snippets_from_tarfiles function must have the correct file extension. Ie: .tar, .tar.gz or .zip, or be a directory. You provided extension: {os.path.splitext(tarfile_name)[-1]} for file: {input_tarfile}"
+            )
+        if not os.path.exists(input_tarfile):
+            raise CustomException(
+                f"The path to this tarfile doesn't exist. {input_tarfile}"
+            )
+
+        return get_input_source_name(input_tarfile)
+
+    def yield_encoded_snippets_from_tarfiles(
+        self, input_tarfiles: list, batch_size: int, pipeline_threads: int = 0
+    ):
+        """
+        This function yields the encoded snippets of one or more tarfiles one at a time, as (reel_name, image_name, field, snippet_bytes).
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            batch_size: The number of snippets held in memory at a time when pipeline_threads is 0. With a snippet_cache, the snippets are
+                produced one image at a time instead.
+            pipeline_threads: If greater than 0, each tarfile is snipped with yield_encoded_snippets_from_tarfile using this many threads.
+        """
+        if pipeline_threads > 0 or self.snippet_cache is not None:
+            for input_tarfile in input_tarfiles:
+                tarfile_name_no_ext = self.get_tarfile_name_no_ext(input_tarfile)
+                self.load_coordinates_of_reel(tarfile_name_no_ext)
+
+                if pipeline_threads > 0:
+                    encoded_images = self.yield_encoded_snippets_from_tarfile(
+                        input_tarfile, pipeline_threads
+                    )
+                else:
+                    # Cached snippets are looked up by the bytes of their image, so the images are read undecoded
+                    encoded_images = (
+                        self.encode_snippets_of_image(image_name, image_bytes)
+                        for image_name, image_bytes in (
+                            self.yield_raw_image_and_name_from_tarfile(input_tarfile)
+                        )
+                    )
+
+                for image_name_no_ext, encoded_snippets in encoded_images:
+                    for field, snippet_bytes in encoded_snippets:
+                        yield (
+                            tarfile_name_no_ext,
+                            image_name_no_ext,
+                            field,
+                            snippet_bytes,
+                        )
+
+                self.unload_coordinates_of_reel()
+            return
+
+        image, encoded_snippets_of_image = None, {}
+
+        for (
+            tarfile_name_no_ext,
+            image_names_no_ext,
+            fields,
+            snippets,
+        ) in self.get_batches_of_snippets_from_tarfiles(input_tarfiles, batch_size):
+            for image_name_no_ext, field, snippet in zip(
+                image_names_no_ext, fields, snippets
+            ):
+                if (tarfile_name_no_ext, image_name_no_ext) != image:
+                    image = (tarfile_name_no_ext, image_name_no_ext)
+                    encoded_snippets_of_image = {}
+
+                try:
+                    snippet_bytes = self.encode_snippet_once(
+                        snippet, encoded_snippets_of_image
+                    )
+                except Exception as e:
+                    print(self.get_snippet_filename(image_name_no_ext, field))
+                    print(e)
+                    continue
+
+                yield tarfile_name_no_ext, image_name_no_ext, field, snippet_bytes
+
+    def yield_encoded_snippets_from_tarfile(
+        self,
+        input_tarfile: str,
+        threads: int,
+        queue_size: int = None,
+        byte_range: tuple = None,
+    ):
+        """
+        This function snips a single tarfile with a pipeline of three stages, and yields (image_name, [(field, snippet_bytes), ...]) for each
+        image in the order the images appear in the tarfile.
+        1. A reader thread streams the raw bytes of the annotated images out of the tarfile into a bounded queue.
+        2. A pool of threads decodes each image, crops its snippets and encodes them. Pillow releases the GIL while it decodes and encodes.
+        3. The caller consumes the encoded snippets, eg: to write them to disk.
+        At most queue_size images wait to be decoded and at most queue_size images are being decoded or waiting to be consumed, so memory stays bounded.
+
+        Args:
+            input_tarfile: The path to the tarfile that contains images to be snipped.
+            threads: The number of decode, crop and encode threads.
+            queue_size: The bound on both queues. Defaults to twice the number of threads.
+            byte_range: If given, only the images in this byte range are snipped. See yield_raw_image_and_name_from_tarfile.
+        """
+        if queue_size is None:
+            queue_size = 2 * threads
+
+        raw_images = queue.Queue(maxsize=queue_size)
+        stop_reading = threading.Event()
+        reader = threading.Thread(
+            target=self.read_raw_images_into_queue,
+            args=(input_tarfile, raw_images, stop_reading, byte_range),
+            daemon=True,
+        )
+        reader.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                encoded_images = collections.deque()
+
+                while True:
+                    raw_image = raw_images.get()
+
+                    if raw_image is _END_OF_QUEUE:
+                        break
+                    if isinstance(raw_image, BaseException):
+                        raise raw_image
+
+                    encoded_images.append(
+                        executor.submit(self.encode_snippets_of_image, *raw_image)
+                    )
+
+                    if len(encoded_images) >= queue_size:
+                        yield encoded_images.popleft().result()
+
+                while encoded_images:
+                    yield encoded_images.popleft().result()
+        finally:
+            stop_reading.set()
+            reader.join()
+
+    def read_raw_images_into_queue(
+        self,
+        input_tarfile: str,
+        raw_images: queue.Queue,
+        stop_reading: threading.Event,
+        byte_range: tuple = None,
+    ):
+        """
+        This function is the reader stage of yield_encoded_snippets_from_tarfile. It puts (image_name, image_bytes) for each annotated image
+        on raw_images, followed by _END_OF_QUEUE, or by the exception that stopped it.
+
+        Args:
+            input_tarfile: The path to the tarfile that contains images to be snipped.
+            raw_images: The bounded queue that feeds the decode threads.
+            stop_reading: Set by the consumer when it stops early, so this thread doesn't block on a full queue forever.
+            byte_range: If given, only the images in this byte range are read.
+        """
+
+        self.put_items_into_queue(
+            self.yield_raw_image_and_name_from_tarfile(input_tarfile, byte_range),
+            raw_images,
+            stop_reading,
+        )
+
+    def put_items_into_queue(
+        self, items, bounded_queue: queue.Queue, stop_putting: threading.Event
+    ):
+        """
+        This function runs in a producer thread. It puts every item of an iterator on a bounded queue, followed by _END_OF_QUEUE, or by the
+        exception that stopped it. It blocks while the queue is full, so the producer never gets more than the size of the queue ahead of the consumer.
+
+        Args:
+            items: The iterator, eg: a generator, that produces the items.
+            bounded_queue: The queue the consumer gets the items from.
+            stop_putting: Set by the consumer when it stops early, so this thread doesn't block on a full queue forever.
+        """
+
+        def put(item):
+            while not stop_putting.is_set():
+                try:
+                    bounded_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_END_OF_QUEUE)
+        except Exception as e:
+            put(e)
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    def stream_snippets(
+        self,
+        input_tarfiles: list = None,
+        image_paths: list = None,
+        output: str = "image",
+        prefetch: int = 0,
+    ):
+        """
+        This function yields the snippets of tarfiles and images one at a time as (reel_name, image_name, field, snippet) records, so they can be fed
+        to a consumer in the same process, eg: a model server, without being written to disk. reel_name is None for the snippets of image_paths.
+        The records are produced as they are consumed, so at most one image, the snippets of it not yet consumed, and prefetch records are in memory.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            image_paths: The paths to images to be snipped. They are snipped after the tarfiles.
+            output: The type of snippet in each record. One of image (a PIL.Image), array (a NumPy array, see yield_snippet_array_and_field)
+                or bytes (encoded with the snippet_encoder).
+            prefetch: If greater than 0, a background thread produces records while the consumer works on the previous ones, until prefetch records
+                are waiting to be consumed.
+        """
+        if output not in ("image", "array", "bytes"):
+            raise CustomException(
+                f"The output of stream_snippets must be image, array or bytes. You provided: {output}"
+            )
+
+        records = self.yield_snippet_records(
+            input_tarfiles or [], image_paths or [], output
+        )
+
+        if prefetch <= 0:
+            yield from records
+            return
+
+        prefetched_records = queue.Queue(maxsize=prefetch)
+        stop_prefetching = threading.Event()
+        producer = threading.Thread(
+            target=self.put_items_into_queue,
+            args=(records, prefetched_records, stop_prefetching),
+            daemon=True,
+        )
+        producer.start()
+
+        try:
+            while True:
+                record = prefetched_records.get()
+
+                if record is _END_OF_QUEUE:
+                    break
+                if isinstance(record, BaseException):
+                    raise record
+
+                yield record
+        finally:
+            stop_prefetching.set()
+            producer.join()
+
+    def yield_snippet_records(
+        self, input_tarfiles: list, image_paths: list, output: str
+    ):
+        """
+        This function produces the records of stream_snippets. The snippets are taken from batches of one, so memory doesn't grow with a batch size.
+
+        Args:
+            input_tarfiles: The paths to the tarfiles that contains images to be snipped.
+            image_paths: The paths to images to be snipped.
+            output: One of image, array or bytes. See stream_snippets.
+        """
+        as_arrays = output == "array"
+        batches = itertools.chain(
+            self.get_batches_of_snippets_from_tarfiles(
+                input_tarfiles, 1, as_arrays=as_arrays
+            ),
+            (
+                (None, image_names_no_ext, fields, snippets)
+                for image_names_no_ext, fields, snippets in (
+                    self.get_batches_of_snippets_from_image_paths(
+                        image_paths, 1, as_arrays=as_arrays
+                    )
+                    if image_paths
+                    else []
+                )
+            ),
+        )
+
+        image, encoded_snippets_of_image = None, {}
+
+        for reel_name, image_names_no_ext, fields, snippets in batches:
+            for image_name_no_ext, field, snippet in zip(
+                image_names_no_ext, fields, snippets
+            ):
+                if output == "bytes":
+                    if (reel_name, image_name_no_ext) != image:
+                        image = (reel_name, image_name_no_ext)
+                        encoded_snippets_of_image = {}
+
+                    try:
+                        snippet = self.encode_snippet_once(
+                            snippet, encoded_snippets_of_image
+                        )
+                    except Exception as e:
+                        print(self.get_snippet_filename(image_name_no_ext, field))
+                        print(e)
+                        continue
+
+                yield reel_name, image_name_no_ext, field, snippet
+
+    def encode_snippets_of_image(self, image_name: str, image_bytes: bytes):
+        """
+        This function decodes an image, crops its snippets and encodes them. It returns (image_name, [(field, snippet_bytes), ...]).
+        With a snippet_cache, the snippets are taken from the cache instead where they can be. See encode_snippets_of_image_with_cache.
+
+        Args:
+            image_name: The name of the image without its extension.
+            image_bytes: The encoded image as read from the tarfile.
+        """
+        if self.snippet_cache is not None:
+            return self.encode_snippets_of_image_with_cache(image_name, image_bytes)
+
+        encoded_snippets, encoded_snippets_of_image = [], {}
+
+        try:
+            image = self.open_raw_image(image_bytes)
+
+            for field, snippet in self.yield_snippet_and_field(
+                image_name, image, decode_in_place=True
+            ):
+                encoded_snippets.append(
+                    (
+                        field,
+                        self.encode_snippet_once(snippet, encoded_snippets_of_image),
+                    )
+                )
+        except Exception as e:
+            print("An error occured: ", e)
+
+        return image_name, encoded_snippets
+
+    def encode_snippets_of_image_with_cache(self, image_name: str, image_bytes: bytes):
+        """
+        This function returns (image_name, [(field, snippet_bytes), ...]) like encode_snippets_of_image, taking the snippets that are in the
+        snippet_cache from it. The image is only decoded if some of its snippets aren't in the cache, and then only those snippets are cropped,
+        encoded and added to the cache. Boxes that are the same have the same key, so they are looked up once and share one bytes object.
+
+        Args:
+            image_name: The name of the image without its extension.
+            image_bytes: The encoded image as read from the tarfile.
+        """
+        fields_and_coordinates = self.map_coordinates_to_images[image_name]
+        image_digest = self.snippet_cache.get_image_digest(image_bytes)
+        snippet_options = self.get_snippet_options()
+        snippet_keys = [
+            self.snippet_cache.get_snippet_key(
+                image_digest, box_coordinates, snippet_options
+            )
+            for _, box_coordinates in fields_and_coordinates
+        ]
+
+        # The snippets that aren't cached are cut with the position of their key as their field name
+        snippets_of_keys, boxes_to_cut = {}, []
+        for position, (snippet_key, (_, box_coordinates)) in enumerate(
+            zip(snippet_keys, fields_and_coordinates)
+        ):
+            if snippet_key in snippets_of_keys:
+                continue
+
+            try:
+                self.validate_box_coordinates(box_coordinates)
+            except Exception as e:
+                print("Error occured: ", e)
+                snippets_of_keys[snippet_key] = None
+                continue
+
+            snippets_of_keys[snippet_key] = self.snippet_cache.get(snippet_key)
+            if snippets_of_keys[snippet_key] is None:
+                boxes_to_cut.append((position, box_coordinates))
+
+        if boxes_to_cut:
+            try:
+                image = self.open_raw_image(image_bytes)
+
+                for position, snippet in self.yield_snippet_and_field(
+                    image_name, image, boxes_to_cut, decode_in_place=True
+                ):
+                    snippet_bytes = self.encode_snippet(snippet)
+                    self.snippet_cache.put(snippet_keys[position], snippet_bytes)
+                    snippets_of_keys[snippet_keys[position]] = snippet_bytes
+            except Exception as e:
+                print("An error occured: ", e)
+
+        return image_name, [
+            (field, snippets_of_keys[snippet_key])
+            for (field, _), snippet_key in zip(fields_and_coordinates, snippet_keys)
+            if snippets_of_keys[snippet_key] is not None
+        ]
+
+    def get_snippet_options(self):
+        """
+        This function returns the options that change how snippets are cut and encoded, as a JSON string. They are part of the key of every
+        snippet in the snippet_cache, so snippets made with other options aren't taken from it.
+        """
+        return json.dumps(
+            {
+                "decode_scale": self.decode_scale,
+                "snippet_transform": (
+                    vars(self.snippet_transform)
+                    if self.snippet_transform is not None
+                    else None
+                ),
+                "snippet_encoder": vars(self.snippet_encoder),
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+    def open_raw_image(self, image_bytes):
+        """
+        This function opens an image that was read out of a tarfile. Images read from a mapped tarfile are memoryviews, which are opened
+        through a MemoryViewFile so they aren't copied.
+
+        Args:
+            image_bytes: The encoded image, as bytes or a memoryview.
+        """
+        if isinstance(image_bytes, memoryview):
+            return Image.open(MemoryViewFile(image_bytes))
+
+        return Image.open(io.BytesIO(image_bytes))
+
+    def encode_snippet(self, snippet: Image.Image):
+        """
+        This function encodes a snippet with the snippet_encoder and returns the bytes.
+
+        Args:
+            snippet: The PIL.Image to encode.
+        """
+        return self.snippet_encoder.encode(snippet)
+
+    def encode_snippet_once(
+        self, snippet: Image.Image, encoded_snippets_of_image: dict
+    ):
+        """
+        This function encodes a snippet like encode_snippet, unless deduplicate_boxes is True and the same snippet of the image was encoded already,
+        in which case the bytes it was encoded to are returned again. yield_snippet_and_field yields one snippet for every box of an image that
+        is the same, so every duplicate gets the same bytes object.
+
+        Args:
+            snippet: The PIL.Image to encode.
+            encoded_snippets_of_image: The snippets of the image encoded so far, by id. It starts empty for every image.
+        """
+        if not self.deduplicate_boxes:
+            return self.encode_snippet(snippet)
+
+        # The snippet is held along with its bytes, so its id isn't reused by another snippet of the image
+        if id(snippet) not in encoded_snippets_of_image:
+            encoded_snippets_of_image[id(snippet)] = (
+                snippet,
+                self.encode_snippet(snippet),
+            )
 
-            snippets, fields, image_names = [], [], []
-            for image_name, image in self.yield_image_and_name_from_tarfile(
-                input_tarfile
-            ):
-                for field, snippet in self.yield_snippet_and_field(image_name, image):
-                    snippets.append(snippet)
-                    fields.append(field)
-                    image_names.append(image_name)
+        return encoded_snippets_of_image[id(snippet)][1]
 
-                    if len(snippets) == batch_size:
-                        yield (
-                            tarfile_name_no_ext,
-                            image_names,
-                            fields,
-                            snippets,
-                        )
-                        snippets, fields, image_names = [], [], []
+    def get_snippet_filename(self, image_name_no_ext: str, field: str):
+        """
+        This function returns the filename a snippet is saved under. Ie: 987_PR_NAME.png
 
-            if snippets and fields:
-                yield (
-                    tarfile_name_no_ext,
-                    image_names,
-                    fields,
-                    snippets,
-                )
+        Args:
+            image_name_no_ext: The name of the image the snippet was cropped out of, without its extension.
+            field: The name of the snippet.
+        """
+        return f"{image_name_no_ext}_{field}{self.snippet_encoder.extension}"
 
     def get_batches_of_snippets_from_image_paths(
-        self, image_paths: list, batch_size: int
+        self, image_paths: list, batch_size: int, as_arrays: bool = False
     ):
+        """
+        This function yields batches of snippets from images on disk, as (image_names, fields, snippets).
+
+        Args:
+            image_paths: The paths to images to be snipped.
+            batch_size: The number of snippets we want this function to yield at a given time.
+            as_arrays: If True, the snippets are NumPy arrays instead of PIL.Images. See yield_snippet_array_and_field.
+        """
+        if self.reel_partitions is not None:
+            raise CustomException(
+                "Coordinates partitioned by reel can only be used to snip tarfiles, since image paths don't belong to a reel."
+            )
+
+        yield_snippets = (
+            self.yield_snippet_array_and_field
+            if as_arrays
+            else self.yield_snippet_and_field
+        )
         image_names_no_ext, fields, snippets = [], [], []
 
         for image_path in image_paths:
@@ -275,7 +1911,9 @@ class SnippetGenerator:
 
             try:
                 image = Image.open(image_path)
-                for field, snippet in self.yield_snippet_and_field(image_name, image):
+                for field, snippet in yield_snippets(
+                    image_name, image, decode_in_place=True
+                ):
                     image_names_no_ext.append(image_name)
                     fields.append(field)
                     snippets.append(snippet)
@@ -301,32 +1939,130 @@ class SnippetGenerator:
         Args:
             input_tarfile: The path to the tarfile that contains images to be snipped.
         """
+        for image_name, image_bytes in self.yield_raw_image_and_name_from_tarfile(
+            input_tarfile
+        ):
+            try:
+                yield image_name, self.open_raw_image(image_bytes)
+            except Exception as e:
+                print("An error occured: ", e)
+
+    def yield_raw_image_and_name_from_tarfile(
+        self, input_tarfile: str, byte_range: tuple = None
+    ):
+        """
+        This function iterates through the tar file and returns the name and the still encoded bytes of each image that has coordinates in the map.
+        input_tarfile can also be a .zip file or a directory of images. See get_input_source.
 
-        read_param = "r"
-        input_reel_name = os.path.splitext(os.path.basename(input_tarfile))[0]
+        Args:
+            input_tarfile: The path to the tarfile that contains images to be snipped.
+            byte_range: If given, only the images whose data starts in [start, end) of a .tar file are read. It needs use_tar_index.
+                The images of a .zip file can be read by byte range without it.
+        """
+        input_source = self.get_input_source(input_tarfile)
+        image_names = self.map_coordinates_to_images
 
-        if input_tarfile.endswith("gz"):
-            read_param = "r:gz"
-            input_reel_name = os.path.splitext(input_reel_name)[0]
+        if self.run_journal is not None:
+            image_names = self.run_journal.get_unfinished_image_names(
+                input_source.name, image_names
+            )
 
-        with tarfile.open(input_tarfile, read_param) as tar_in:
-            for encoded_image in tar_in:
-                if encoded_image.isfile():
-                    try:
-                        image_name = encoded_image.name
-                        image_name = os.path.splitext(os.path.basename(image_name))[0]
-                        if image_name not in self.map_coordinates_to_images:
-                            continue
-                        else:
-                            img_data = Image.open(
-                                io.BytesIO(tar_in.extractfile(encoded_image).read())
-                            )
-                            yield image_name, img_data
+        # Only the coordinate map of a reel partition is known to hold the images of this reel and no others
+        if self.reel_partitions is None:
+            yield from input_source.yield_raw_images(image_names, byte_range)
+            return
 
-                    except Exception as e:
-                        print("An error occured: ", e)
+        found_image_names = set()
+        if self.found_images is not None:
+            found_image_names = self.found_images.setdefault(input_source.name, set())
+
+        # The other byte ranges of the reel may hold the images this one doesn't, so only the process that started the pool knows which are missing
+        if byte_range is not None:
+            for image_name, image_bytes in input_source.yield_raw_images(
+                image_names, byte_range
+            ):
+                found_image_names.add(image_name)
+                yield image_name, image_bytes
+            return
+
+        missing_image_names = {
+            image_name
+            for image_name in self.map_coordinates_to_images
+            if image_name in image_names
+        }
+
+        # The reel is read until every annotated image has been found, so the rest of a .tar.gz file isn't decompressed,
+        # and a reel without annotated images isn't opened at all
+        if missing_image_names:
+            for image_name, image_bytes in input_source.yield_raw_images(image_names):
+                found_image_names.add(image_name)
+                yield image_name, image_bytes
+
+                missing_image_names.discard(image_name)
+                if not missing_image_names:
+                    break
+
+        self.missing_images[input_source.name] = sorted(missing_image_names)
+
+    def get_input_source(self, input_tarfile: str):
+        """
+        This function returns the InputSource that the images of a reel are read from: a TarSource for a .tar or .tar.gz file, with its TarIndex
+        if use_tar_index is True, a ZipSource for a .zip file, or a DirectorySource for a directory.
+
+        Args:
+            input_tarfile: The path to the tarfile, zip file or directory.
+        """
+        if os.path.isdir(input_tarfile) or input_tarfile.endswith(".zip"):
+            return open_input_source(input_tarfile)
+
+        return open_input_source(
+            input_tarfile, self.get_tar_index(input_tarfile), self.map_tarfiles
+        )
+
+    def get_tar_index(self, input_tarfile: str):
+        """
+        This function returns the TarIndex of a tarfile if use_tar_index is True, and None otherwise. Each index is loaded, or built, once.
+
+        Args:
+            input_tarfile: The path to the tarfile.
+        """
+        if not self.use_tar_index:
+            return None
+
+        if input_tarfile not in self.tar_indexes:
+            self.tar_indexes[input_tarfile] = TarIndex.load_or_build(
+                input_tarfile, self.tar_index_directory
+            )
+
+        return self.tar_indexes[input_tarfile]
 
-    def yield_snippet_and_field(self, image_name: str, image: Image.Image):
+    def load_cached_tar_index(self, input_tarfile: str):
+        """
+        This function returns the TarIndex of a tarfile like get_tar_index, but only if it was loaded already or is cached, and None otherwise.
+        The tarfile isn't indexed.
+
+        Args:
+            input_tarfile: The path to the tarfile.
+        """
+        if not self.use_tar_index:
+            return None
+
+        if input_tarfile not in self.tar_indexes:
+            tar_index = TarIndex.load_cached(input_tarfile, self.tar_index_directory)
+            if tar_index is None:
+                return None
+
+            self.tar_indexes[input_tarfile] = tar_index
+
+        return self.tar_indexes[input_tarfile]
+
+    def yield_snippet_and_field(
+        self,
+        image_name: str,
+        image: Image.Image,
+        fields_and_coordinates: list = None,
+        decode_in_place: bool = False,
+    ):
         """
         This function returns the snippets for an image and the future filename of the newly created snippet.
 
@@ -334,19 +2070,175 @@ class SnippetGenerator:
             tarfile_name: This is the name of the input_tarfile with the file extension.
             image_file_name: This is the name of the image file with the file extension.
             image: This is the PIL.Image that we will snip the snippets from.
+            fields_and_coordinates: The (field, box_coordinates) of the snippets to cut. If it isn't given, every snippet of the image in the
+                coordinate map is cut.
+            decode_in_place: If True, the image was opened by the SnippetGenerator and isn't used after its snippets are cut, so only the region
+                and resolution the snippets need are decoded, which leaves the rest of the image black. See decode_region_of_interest.
+                An image passed in by a caller is left as it is.
         """
-        for field_name, box_coordinates in self.map_coordinates_to_images[image_name]:
+        if fields_and_coordinates is None:
+            fields_and_coordinates = self.map_coordinates_to_images[image_name]
+
+        x_scale, y_scale = 1, 1
+        if decode_in_place:
+            x_scale, y_scale = self.decode_region_of_interest(
+                image, fields_and_coordinates
+            )
+        snippets_of_boxes = {}
+
+        for field_name, box_coordinates in fields_and_coordinates:
             try:
+                if (
+                    self.deduplicate_boxes
+                    and tuple(box_coordinates) in snippets_of_boxes
+                ):
+                    yield field_name, snippets_of_boxes[tuple(box_coordinates)]
+                    continue
+
                 self.validate_box_coordinates(box_coordinates)
 
-                yield (
-                    field_name,
-                    image.crop(box_coordinates),
+                snippet = image.crop(
+                    (
+                        box_coordinates[0] / x_scale,
+                        box_coordinates[1] / y_scale,
+                        box_coordinates[2] / x_scale,
+                        box_coordinates[3] / y_scale,
+                    )
                 )
+
+                if self.decode_scale > 1 and x_scale == y_scale == 1:
+                    snippet = snippet.reduce(self.decode_scale)
+
+                if self.snippet_transform is not None:
+                    snippet = self.snippet_transform.apply(snippet)
+
+                if self.deduplicate_boxes:
+                    snippets_of_boxes[tuple(box_coordinates)] = snippet
+
+                yield field_name, snippet
+            except Exception as e:
+                print("Error occured: ", e)
+                continue
+
+    def yield_snippet_array_and_field(
+        self, image_name: str, image: Image.Image, decode_in_place: bool = False
+    ):
+        """
+        This function yields the snippets of an image as NumPy arrays, along with their field names.
+        When snippets are cut at full resolution without a snippet_transform, the image is decoded into an array once and every snippet that lies
+        inside the image is a read only view of it, so no snippet is copied. The views keep the whole image in memory for as long as they are referenced.
+        Otherwise the snippets are cropped by yield_snippet_and_field and converted to arrays.
+
+        Args:
+            image_name: The name of the image without its extension.
+            image: This is the PIL.Image that we will snip the snippets from.
+            decode_in_place: If True, only the region of the image the snippets need is decoded. See yield_snippet_and_field.
+        """
+        if self.snippet_transform is not None or self.decode_scale > 1:
+            for field_name, snippet in self.yield_snippet_and_field(
+                image_name, image, decode_in_place=decode_in_place
+            ):
+                yield field_name, np.asarray(snippet)
+            return
+
+        fields_and_coordinates = self.map_coordinates_to_images[image_name]
+        if decode_in_place:
+            self.decode_region_of_interest(image, fields_and_coordinates)
+        image_array = np.asarray(image)
+        height, width = image_array.shape[:2]
+
+        for field_name, box_coordinates in fields_and_coordinates:
+            try:
+                self.validate_box_coordinates(box_coordinates)
+
+                # Rounded the same way as PIL.Image.crop
+                left, upper, right, lower = map(int, map(round, box_coordinates))
+
+                if left >= 0 and upper >= 0 and right <= width and lower <= height:
+                    yield field_name, image_array[upper:lower, left:right]
+                else:
+                    # Boxes that go past the edges are padded with black by PIL.Image.crop
+                    yield field_name, np.asarray(image.crop(box_coordinates))
             except Exception as e:
                 print("Error occured: ", e)
                 continue
 
+    def decode_region_of_interest(
+        self, image: Image.Image, fields_and_coordinates: list
+    ):
+        """
+        This function prepares an image that hasn't been decoded yet so that only what its snippets need is decoded. The image is changed, so it
+        is only called for images the SnippetGenerator opened itself.
+        1. If decode_scale is greater than 1 and the image is a JPEG, Pillow's draft mode makes libjpeg decode the image at 1/decode_scale of its size.
+        2. If the image is stored in several tiles or strips, eg: a tiled TIFF, the tiles that don't overlap the union of the snippet boxes are not decoded.
+        It returns the x and y factors the image was scaled down by, which the box coordinates must be divided by.
+        Images that were already decoded, or that can't be decoded in part, are left as they are and (1, 1) is returned.
+
+        Args:
+            image: This is the PIL.Image that we will snip the snippets from.
+            fields_and_coordinates: The (snip_name, box_coordinates) pairs of the image.
+        """
+        valid_boxes = [
+            box_coordinates
+            for _, box_coordinates in fields_and_coordinates
+            if box_coordinates[2] > box_coordinates[0]
+            and box_coordinates[3] > box_coordinates[1]
+        ]
+
+        if not valid_boxes or not getattr(image, "tile", None):
+            return 1, 1
+
+        width, height = image.size
+        draft_scale = self.get_draft_scale(valid_boxes)
+
+        if draft_scale > 1:
+            image.draft(
+                image.mode,
+                (max(width // draft_scale, 1), max(height // draft_scale, 1)),
+            )
+
+        x_scale, y_scale = width / image.size[0], height / image.size[1]
+
+        if len(image.tile) > 1:
+            left = min(box[0] for box in valid_boxes) / x_scale
+            upper = min(box[1] for box in valid_boxes) / y_scale
+            right = max(box[2] for box in valid_boxes) / x_scale
+            lower = max(box[3] for box in valid_boxes) / y_scale
+
+            image.tile = [
+                tile
+                for tile in image.tile
+                if tile[1][0] < right
+                and tile[1][2] > left
+                and tile[1][1] < lower
+                and tile[1][3] > upper
+            ]
+
+        return x_scale, y_scale
+
+    def get_draft_scale(self, valid_boxes: list):
+        """
+        This function returns the factor a JPEG image can be decoded smaller by. It is decode_scale, or more when a snippet_transform makes every
+        snippet of the image at least that many times smaller anyway, so the snippets lose no detail they would have kept.
+
+        Args:
+            valid_boxes: The valid box coordinates of the snippets of the image.
+        """
+        if self.snippet_transform is None:
+            return self.decode_scale
+
+        downscale_factor = min(
+            self.snippet_transform.get_downscale_factor(box) / self.decode_scale
+            for box in valid_boxes
+        )
+
+        draft_scale = self.decode_scale
+        while draft_scale < 8 and downscale_factor >= 2:
+            draft_scale *= 2
+            downscale_factor /= 2
+
+        return draft_scale
+
     def validate_box_coordinates(self, box_coordinates: tuple):
         if (box_coordinates[2] - box_coordinates[0]) <= 0:
             raise CustomException(
@@ -358,6 +2250,167 @@ class SnippetGenerator:
             )
 
 
+def get_image_names_in_tarfiles(input_tarfiles: list):
+    """
+    This function returns the set of names, without directories or extensions, of the files in one or more tarfiles, zip files or directories.
+    Only the tar headers are read, but a .tar.gz file still has to be decompressed from start to end.
+
+    Args:
+        input_tarfiles: The paths to the tarfiles.
+    """
+    image_names = set()
+
+    for input_tarfile in input_tarfiles:
+        image_names |= open_input_source(input_tarfile).get_image_names()
+
+    return image_names
+
+
+# Marks the end of the queue of raw images in SnippetGenerator.yield_encoded_snippets_from_tarfile.
+_END_OF_QUEUE = object()
+
+# The columns of an annotation file that hold names, which are read as strings. See DataFrame_to_Dictionary_converter.read_annotation_file_in_chunks.
+_NAME_COLUMNS = ["reel_name", "image_name", "snip_name"]
+
+# The SnippetGenerator each pool process works with, set once by _initialize_worker when the process starts.
+_worker_snippet_generator = None
+
+
+def _initialize_worker(snippet_generator: SnippetGenerator):
+    global _worker_snippet_generator
+    _worker_snippet_generator = snippet_generator
+    _worker_snippet_generator.found_images = {}
+
+
+def _pop_worker_results():
+    # The annotated images found by this process, which the SnippetGenerator that started the pool lists the missing ones from,
+    # and the stats of its snippet cache are handed back to it. See SnippetGenerator.merge_worker_results
+    found_image_names = set().union(*_worker_snippet_generator.found_images.values())
+    _worker_snippet_generator.found_images.clear()
+    _worker_snippet_generator.missing_images.clear()
+
+    cache_counts = None
+    if _worker_snippet_generator.snippet_cache is not None:
+        cache_counts = _worker_snippet_generator.snippet_cache.pop_counts()
+
+    return found_image_names, cache_counts
+
+
+def _save_snippets_to_directory_in_worker(
+    input_tarfile_and_byte_range: tuple,
+    output_directory: str,
+    batch_size: int,
+    pipeline_threads: int,
+    write_threads: int,
+):
+    input_tarfile, byte_range = input_tarfile_and_byte_range
+
+    if byte_range is not None:
+        _worker_snippet_generator.save_snippets_of_byte_range_to_directory(
+            input_tarfile, byte_range, output_directory, write_threads, pipeline_threads
+        )
+    else:
+        _worker_snippet_generator.write_snippets_to_directory(
+            output_directory,
+            _worker_snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [input_tarfile], batch_size, pipeline_threads
+            ),
+            write_threads,
+        )
+
+    return input_tarfile_and_byte_range, _pop_worker_results()
+
+
+def _save_snippets_as_tar_part_in_worker(
+    input_tarfile_and_part_path: tuple,
+    outfile_name_no_ext: str,
+    batch_size: int,
+    pipeline_threads: int,
+):
+    input_tarfile, part_path = input_tarfile_and_part_path
+
+    with tarfile.open(part_path, "w") as tar_part:
+        _worker_snippet_generator.add_snippets_to_tar(
+            tar_part,
+            outfile_name_no_ext,
+            _worker_snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [input_tarfile], batch_size, pipeline_threads
+            ),
+        )
+        # The members end where the end of archive blocks that closing the part writes begin
+        part_size = tar_part.offset
+
+    return part_path, part_size, _pop_worker_results()
+
+
+def _save_snippets_as_shards_in_worker(save_shards_arguments: dict, input_tarfile: str):
+    shards = _worker_snippet_generator.save_snippets_as_shards(
+        [input_tarfile], **save_shards_arguments
+    )
+
+    return shards, _pop_worker_results()
+
+
+class DataFrameReelPartitions(ReelPartitions):
+    """
+    This class partitions a dataframe by its reel_name column. Only the row numbers of each reel are kept up front,
+    and the coordinate map of a reel is converted from its rows when the reel is loaded.
+    """
+
+    def __init__(self, df: pd.DataFrame, compact_index: bool = False):
+        """
+        Initializes the DataFrameReelPartitions class.
+
+        Args:
+            df: A DataFrame object that should contain at least the following information: reel_name, image_name, snip_name, x1, y1, ... x4, y4.
+            compact_index: If True, each partition is a CoordinateIndex instead of a dictionary.
+        """
+        if "reel_name" not in df.columns:
+            raise CustomException(
+                "Dataframe needs a reel_name column to be partitioned by reel."
+            )
+
+        self.df = df
+        self.compact_index = compact_index
+        self.rows_of_reels = df.groupby(
+            df["reel_name"].map(self.get_reel_name_no_ext), sort=False
+        ).indices
+
+    @classmethod
+    def group_by_reel(cls, df: pd.DataFrame):
+        """
+        This function yields (reel_name, DataFrame) for each reel in the reel_name column of the dataframe.
+
+        Args:
+            df: A DataFrame object that should contain at least the following information: reel_name, image_name, snip_name, x1, y1, ... x4, y4.
+        """
+        reel_partitions = cls(df)
+
+        for reel_name in reel_partitions.rows_of_reels:
+            yield reel_name, reel_partitions.get_rows_of_reel(reel_name)
+
+    def get_rows_of_reel(self, reel_name: str):
+        """
+        This function returns the rows of the dataframe that belong to a reel.
+
+        Args:
+            reel_name: The name of the reel's tarfile without its extension.
+        """
+        return self.df.iloc[self.rows_of_reels[reel_name]]
+
+    def get_partition(self, reel_name: str):
+        if reel_name not in self.rows_of_reels:
+            return {}
+
+        converter = DataFrame_to_Dictionary_converter()
+        reel_df = self.get_rows_of_reel(reel_name)
+
+        if self.compact_index:
+            return converter.convert_df_to_index(reel_df)
+
+        return converter.convert_df_to_map(reel_df)
+
+
 class DataFrame_to_Dictionary_converter:
     def convert_df_to_map(self, df: pd.DataFrame):
         """
@@ -374,25 +2427,213 @@ class DataFrame_to_Dictionary_converter:
                 "Dataframe doesn't have the necessary columns to work with Snippet Generator."
             )
 
+        image_names, snip_names, box_coordinates = self.get_info_from_dataframe(df)
+
+        dict_of_image_to_field_to_coordinates = {}
+
+        for image_name, snip_name, box in zip(image_names, snip_names, box_coordinates):
+            fields_and_coordinates = dict_of_image_to_field_to_coordinates.get(
+                image_name
+            )
+
+            if fields_and_coordinates is None:
+                fields_and_coordinates = []
+                dict_of_image_to_field_to_coordinates[image_name] = (
+                    fields_and_coordinates
+                )
+
+            fields_and_coordinates.append((snip_name, box))
+
+        return dict_of_image_to_field_to_coordinates
+
+    def convert_file_to_map(
+        self,
+        annotation_path: str,
+        chunksize: int,
+        image_names: set = None,
+        compact_index: bool = False,
+    ):
+        """
+        This function is the streaming counterpart of convert_df_to_map and convert_df_to_index. It reads an annotation file one chunk at a time
+        and only holds on to the coordinates of the rows it keeps.
+
+        Args:
+            annotation_path: The path to a .tsv, .csv or .parquet annotation file.
+            chunksize: The number of rows read at a time.
+            image_names: If given, only rows whose image_name is in this set are kept.
+            compact_index: If True, a CoordinateIndex is returned instead of a dictionary.
+        """
         dict_of_image_to_field_to_coordinates = {}
+        chunks_of_image_names, chunks_of_snip_names, chunks_of_boxes = [], [], []
+
+        for df in self.read_annotation_file_in_chunks(annotation_path, chunksize):
+            if not self.check_dataframe_has_valid_columns(df):
+                raise CustomException(
+                    "Dataframe doesn't have the necessary columns to work with Snippet Generator."
+                )
+
+            if image_names is not None:
+                df = df[df["image_name"].isin(image_names)]
+
+            if compact_index:
+                df = self.drop_rows_with_errors(df)
+                chunks_of_image_names.append(df["image_name"].to_numpy())
+                chunks_of_snip_names.append(df["snip_name"].to_numpy())
+                chunks_of_boxes.append(
+                    np.column_stack(self.get_box_coordinates_of_dataframe(df))
+                )
+            else:
+                for image_name, fields_and_coordinates in self.convert_df_to_map(
+                    df
+                ).items():
+                    dict_of_image_to_field_to_coordinates.setdefault(
+                        image_name, []
+                    ).extend(fields_and_coordinates)
+
+        if not compact_index:
+            return dict_of_image_to_field_to_coordinates
+
+        if not chunks_of_boxes:
+            return CoordinateIndex.from_arrays([], [], np.zeros((0, 4)))
+
+        return CoordinateIndex.from_arrays(
+            np.concatenate(chunks_of_image_names),
+            np.concatenate(chunks_of_snip_names),
+            np.concatenate(chunks_of_boxes),
+        )
+
+    def read_annotation_file_in_chunks(self, annotation_path: str, chunksize: int):
+        """
+        This function yields an annotation file as DataFrames of at most chunksize rows. The format is chosen from the file extension:
+        .tsv and .csv files (optionally compressed, eg: .tsv.gz) are read with pandas, and .parquet files are read with pyarrow.
+        The reel_name, image_name and snip_name columns are always read as strings, since they are matched against the names of the files in
+        the tarfiles. Otherwise numeric names, eg: 12345, would be read as numbers, and could be read as different types in different chunks.
+
+        Args:
+            annotation_path: The path to the annotation file.
+            chunksize: The number of rows per DataFrame.
+        """
+        file_name = os.path.basename(annotation_path).lower()
+        for compression_ext in (".gz", ".bz2", ".zip", ".xz", ".zst"):
+            if file_name.endswith(compression_ext):
+                file_name = file_name[: -len(compression_ext)]
 
-        for row in df.itertuples():
+        if file_name.endswith(".parquet"):
             try:
-                image_name, snip_name, box_coordinates = (
-                    self.get_info_from_dataframe_row(row)
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise CustomException(
+                    "Reading .parquet annotation files requires pyarrow to be installed."
                 )
 
-                self.build_dict(
-                    dict_of_image_to_field_to_coordinates,
-                    image_name,
-                    snip_name,
-                    box_coordinates,
+            for batch in pq.ParquetFile(annotation_path).iter_batches(
+                batch_size=chunksize
+            ):
+                df = batch.to_pandas()
+
+                for column in _NAME_COLUMNS:
+                    if column in df.columns:
+                        df[column] = df[column].map(str, na_action="ignore")
+
+                yield df
+        elif file_name.endswith((".tsv", ".csv")):
+            separator = "\t" if file_name.endswith(".tsv") else ","
+
+            with pd.read_csv(
+                annotation_path,
+                sep=separator,
+                chunksize=chunksize,
+                dtype={column: str for column in _NAME_COLUMNS},
+            ) as chunks:
+                yield from chunks
+        else:
+            raise CustomException(
+                f"Annotation files must be .tsv, .csv or .parquet files. You provided: {annotation_path}"
+            )
+
+    def convert_df_to_index(self, df: pd.DataFrame):
+        """
+        This function is the compact counterpart of convert_df_to_map. It returns a CoordinateIndex with the same contents as the dictionary convert_df_to_map would build.
+
+        Args:
+            df: A DataFrame object that contains at least the following information: image_name, snip_name, x1, y1, ... x4, y4.
+        """
+
+        if not self.check_dataframe_has_valid_columns(df):
+            raise CustomException(
+                "Dataframe doesn't have the necessary columns to work with Snippet Generator."
+            )
+
+        df = self.drop_rows_with_errors(df)
+
+        return CoordinateIndex.from_arrays(
+            df["image_name"].to_numpy(),
+            df["snip_name"].to_numpy(),
+            np.column_stack(self.get_box_coordinates_of_dataframe(df)),
+        )
+
+    def get_info_from_dataframe(self, df: pd.DataFrame):
+        """
+        This function does the work of get_info_from_dataframe_row for every row of the dataframe at once. Rows with None or Nan values are reported
+        and skipped, and the box coordinates of the remaining rows are computed column by column with NumPy.
+        It returns three lists of equal length: the image names, the snip names and the (left, upper, right, lower) box coordinates.
+
+        Args:
+            df: A DataFrame object that contains at least the following information: image_name, snip_name, x1, y1, ... x4, y4.
+        """
+        df = self.drop_rows_with_errors(df)
+
+        left, upper, right, lower = self.get_box_coordinates_of_dataframe(df)
+        box_coordinates = zip(
+            left.tolist(), upper.tolist(), right.tolist(), lower.tolist()
+        )
+
+        return (
+            df["image_name"].tolist(),
+            df["snip_name"].tolist(),
+            list(box_coordinates),
+        )
+
+    def drop_rows_with_errors(self, df: pd.DataFrame):
+        """
+        This function reports every row of the dataframe that has a None or Nan value, the way convert_df_to_map always has, and returns the dataframe without those rows.
+
+        Args:
+            df: A DataFrame object that contains at least the following information: image_name, snip_name, x1, y1, ... x4, y4.
+        """
+        rows_with_errors = df.isna().to_numpy().any(axis=1)
+
+        if rows_with_errors.any():
+            for image_name, snip_name in zip(
+                df["image_name"].to_numpy()[rows_with_errors],
+                df["snip_name"].to_numpy()[rows_with_errors],
+            ):
+                print(
+                    "Found error: ",
+                    CustomException(
+                        f"None or Nan values found in dataframe at row: {image_name}, {snip_name}"
+                    ),
                 )
+            df = df[~rows_with_errors]
 
-            except CustomException as e:
-                print("Found error: ", e)
+        return df
 
-        return dict_of_image_to_field_to_coordinates
+    def get_box_coordinates_of_dataframe(self, df: pd.DataFrame):
+        """
+        This function is the column-wise version of get_box_coordinates. It returns NumPy arrays of the left, upper, right and lower box coordinates of every row.
+
+        Args:
+            df: A DataFrame object with the columns x1, y1, ... x4, y4 and no None or Nan values in them.
+        """
+        x_coordinates = [df[column].to_numpy() for column in ("x1", "x2", "x3", "x4")]
+        y_coordinates = [df[column].to_numpy() for column in ("y1", "y2", "y3", "y4")]
+
+        return (
+            np.minimum.reduce(x_coordinates),
+            np.minimum.reduce(y_coordinates),
+            np.maximum.reduce(x_coordinates),
+            np.maximum.reduce(y_coordinates),
+        )
 
     def check_dataframe_has_valid_columns(self, df: pd.DataFrame):
         """
@@ -0,0 +1,105 @@
+"""
+This file contains the SnippetTransform class which resizes and normalizes snippets right after they are cropped.
+"""
+
+from PIL import Image
+from CustomException import CustomException
+
+
+class SnippetTransform:
+    """
+    This class describes what is done to every snippet after it is cropped and before it is encoded, so that snippets are stored at the size
+    and in the format the classifier uses instead of at full resolution.
+    The steps are applied in this order: conversion to grayscale, resizing, binarization.
+    """
+
+    def __init__(
+        self,
+        height: int = None,
+        width: int = None,
+        grayscale: bool = False,
+        binarize_threshold: int = None,
+        resample: int = Image.Resampling.BILINEAR,
+    ):
+        """
+        Initializes the SnippetTransform class.
+
+        Args:
+            height: The height snippets are resized to. If width isn't given, the width is scaled to keep the aspect ratio.
+            width: The width snippets are resized to. If height isn't given, the height is scaled to keep the aspect ratio.
+            grayscale: If True, snippets are converted to 8-bit grayscale.
+            binarize_threshold: If given, snippets are converted to grayscale and then to black and white: pixels at or above the threshold are white.
+            resample: The Pillow resampling filter used to resize snippets.
+        """
+        for name, size in [("height", height), ("width", width)]:
+            if size is not None and size <= 0:
+                raise CustomException(
+                    f"The {name} of a SnippetTransform must be positive. You provided: {size}"
+                )
+
+        if binarize_threshold is not None and not 0 <= binarize_threshold <= 255:
+            raise CustomException(
+                f"The binarize_threshold of a SnippetTransform must be between 0 and 255. You provided: {binarize_threshold}"
+            )
+
+        self.height = height
+        self.width = width
+        self.grayscale = grayscale
+        self.binarize_threshold = binarize_threshold
+        self.resample = resample
+
+    def apply(self, snippet: Image.Image):
+        """
+        This function returns the transformed snippet.
+
+        Args:
+            snippet: The PIL.Image cropped out of a scan.
+        """
+        if (
+            self.grayscale or self.binarize_threshold is not None
+        ) and snippet.mode != "L":
+            snippet = snippet.convert("L")
+
+        size = self.get_size(snippet.size)
+        if size != snippet.size:
+            snippet = snippet.resize(size, resample=self.resample)
+
+        if self.binarize_threshold is not None:
+            threshold = self.binarize_threshold
+            snippet = snippet.point(
+                lambda value: 255 if value >= threshold else 0, mode="1"
+            )
+
+        return snippet
+
+    def get_size(self, size: tuple):
+        """
+        This function returns the (width, height) a snippet of the given size is resized to.
+
+        Args:
+            size: The (width, height) of the cropped snippet.
+        """
+        width, height = size
+
+        if self.height is not None and self.width is not None:
+            return self.width, self.height
+        if self.height is not None:
+            return max(round(width * self.height / height), 1), self.height
+        if self.width is not None:
+            return self.width, max(round(height * self.width / width), 1)
+
+        return width, height
+
+    def get_downscale_factor(self, box_coordinates: tuple):
+        """
+        This function returns how many times smaller than its box a snippet ends up, in the dimension that is reduced the least.
+        A factor of 1 or less means that the snippet is not made smaller.
+
+        Args:
+            box_coordinates: The (left, upper, right, lower) box of the snippet in the full resolution image.
+        """
+        box_width = box_coordinates[2] - box_coordinates[0]
+        box_height = box_coordinates[3] - box_coordinates[1]
+        width, height = self.get_size((box_width, box_height))
+
+        return min(box_width / width, box_height / height)
@@ -0,0 +1,590 @@
+"""
+This file contains the writers that save encoded snippets to disk.
+"""
+
+import collections
+import gzip
+import json
+import os
+import shutil
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from CustomException import CustomException
+
+
+class ShardedTarWriter:
+    """
+    This class writes snippets into a numbered set of tarfiles, eg: snippets-000000.tar, snippets-000001.tar, ..., so that no single tarfile grows
+    without bound and the shards can be read, eg: by a training loader, or written, eg: one set per reel, concurrently.
+    A new shard is started when the current one has max_snippets_per_shard snippets, or when the next snippet would take it past max_bytes_per_shard.
+    """
+
+    def __init__(
+        self,
+        output_directory: str,
+        shard_prefix: str,
+        extension: str = ".tar",
+        max_snippets_per_shard: int = None,
+        max_bytes_per_shard: int = None,
+        compress_level: int = 9,
+        compression_threads: int = 0,
+        shards: list = None,
+        on_close_shard=None,
+    ):
+        """
+        Initializes the ShardedTarWriter class.
+
+        Args:
+            output_directory: The directory the shards are written to.
+            shard_prefix: The name of the shards before their number. Ie: snippets gives snippets-000000.tar
+            extension: .tar or .tar.gz.
+            max_snippets_per_shard: The most snippets in a shard. If it isn't given, the number of snippets isn't limited.
+            max_bytes_per_shard: The most bytes of tar members in a shard, headers and padding included, before compression and without the
+                end of archive blocks. A snippet larger than this is written to a shard of its own. If it isn't given, the size isn't limited.
+            compress_level: The gzip compression level of .tar.gz shards. See open_tar_for_writing.
+            compression_threads: The number of threads that compress .tar.gz shards. See open_tar_for_writing.
+            shards: The shards an earlier run already wrote, as returned by close. The numbering of the new shards continues after them,
+                and they are returned by close along with the new ones.
+            on_close_shard: If given, a function that is called with each shard after it is closed, eg: to journal it.
+        """
+        if extension not in (".tar", ".tar.gz"):
+            raise CustomException(
+                f"The shards of a ShardedTarWriter must be .tar or .tar.gz files. You provided extension: {extension}"
+            )
+
+        for name, limit in [
+            ("max_snippets_per_shard", max_snippets_per_shard),
+            ("max_bytes_per_shard", max_bytes_per_shard),
+        ]:
+            if limit is not None and limit <= 0:
+                raise CustomException(
+                    f"The {name} of a ShardedTarWriter must be positive. You provided: {limit}"
+                )
+
+        self.output_directory = output_directory
+        self.shard_prefix = shard_prefix
+        self.extension = extension
+        self.max_snippets_per_shard = max_snippets_per_shard
+        self.max_bytes_per_shard = max_bytes_per_shard
+        self.compress_level = compress_level
+        self.compression_threads = compression_threads
+
+        self.shards = list(shards or [])
+        self.on_close_shard = on_close_shard
+        self.tar_out = None
+
+        os.makedirs(output_directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # A shard that was cut short by an error isn't reported as finished
+            self.on_close_shard = None
+
+        self.close()
+
+    def add_snippet(self, tar_path: str, snippet_bytes: bytes):
+        """
+        This function adds one encoded snippet to the current shard, starting a new shard first if the current one is full.
+
+        Args:
+            tar_path: The path of the snippet inside the shard.
+            snippet_bytes: The encoded snippet.
+
+        Returns:
+            The number of the shard the snippet was added to, starting from 0.
+        """
+        if self.tar_out is None or self.is_full(len(snippet_bytes)):
+            self.open_next_shard()
+
+        write_tar_member(self.tar_out, tar_path, snippet_bytes)
+        self.count_member(tar_path)
+
+        return len(self.shards) - 1
+
+    def add_link(
+        self, tar_path: str, target_path: str, target_shard: int, snippet_bytes: bytes
+    ):
+        """
+        This function adds a snippet that is the same as one already added, as a hard link to it, which holds no data. A shard can only link to
+        its own members, so if the snippet it is the same as is in an earlier shard, or the link doesn't fit in the current shard, the snippet
+        is added in full instead.
+
+        Args:
+            tar_path: The path of the snippet inside the shard.
+            target_path: The path of the snippet it is the same as.
+            target_shard: The number of the shard target_path was added to, as returned by add_snippet.
+            snippet_bytes: The encoded snippet, which is added if it can't be linked.
+
+        Returns:
+            The number of the shard the snippet was added to.
+        """
+        if target_shard != len(self.shards) - 1 or self.is_full(0):
+            return self.add_snippet(tar_path, snippet_bytes)
+
+        write_tar_link(self.tar_out, tar_path, target_path)
+        self.count_member(tar_path)
+
+        return target_shard
+
+    def count_member(self, tar_path: str):
+        """
+        This function records a member that was added to the current shard.
+
+        Args:
+            tar_path: The path of the member inside the shard.
+        """
+        shard = self.shards[-1]
+        shard["snippets"] += 1
+        shard["first_member"] = shard["first_member"] or tar_path
+        shard["last_member"] = tar_path
+
+    def is_full(self, snippet_size: int):
+        """
+        This function returns True if a snippet of the given size doesn't fit in the current shard. An empty shard always takes the snippet.
+
+        Args:
+            snippet_size: The number of bytes of the encoded snippet.
+        """
+        snippets = self.shards[-1]["snippets"]
+
+        if snippets == 0:
+            return False
+        if self.max_snippets_per_shard is not None:
+            if snippets >= self.max_snippets_per_shard:
+                return True
+        if self.max_bytes_per_shard is not None:
+            # A member is a 512 byte header followed by the data padded to a multiple of 512 bytes
+            padded_size = -(-snippet_size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            member_size = tarfile.BLOCKSIZE + padded_size
+            if self.tar_out.offset + member_size > self.max_bytes_per_shard:
+                return True
+
+        return False
+
+    def open_next_shard(self):
+        """
+        This function closes the current shard, if there is one, and opens the next.
+        """
+        self.close_shard()
+
+        shard_name = f"{self.shard_prefix}-{len(self.shards):06d}{self.extension}"
+
+        self.tar_out = open_tar_for_writing(
+            os.path.join(self.output_directory, shard_name),
+            self.compress_level,
+            self.compression_threads,
+        )
+        self.shards.append(
+            {
+                "shard": shard_name,
+                "snippets": 0,
+                "bytes": 0,
+                "first_member": None,
+                "last_member": None,
+            }
+        )
+
+    def close_shard(self):
+        """
+        This function closes the current shard and records its size on disk.
+        """
+        if self.tar_out is None:
+            return
+
+        self.tar_out.close()
+        self.tar_out = None
+
+        shard = self.shards[-1]
+        shard["bytes"] = os.path.getsize(
+            os.path.join(self.output_directory, shard["shard"])
+        )
+
+        if self.on_close_shard is not None:
+            self.on_close_shard(shard)
+
+    def close(self):
+        """
+        This function closes the last shard and returns the list of shards that were written. Each shard is a dictionary with the shard's filename,
+        its number of snippets, its size in bytes and the paths of its first and last members.
+        """
+        self.close_shard()
+
+        return self.shards
+
+
+class DirectorySnippetWriter:
+    """
+    This class writes the snippets of each image to a directory of its own, eg: output_directory/reel_name/image_name/, behind the thread that
+    snips them. The directory of an image is created once, by a single mkdir when its reel's directory already exists, instead of being checked
+    and created for every snippet. The snippets of an image are written together by a pool of threads, so the thread that decodes, crops and
+    encodes doesn't wait for metadata calls or file writes, which are slow on network file systems. Images are reported as written in the order
+    they were added, which is what a RunJournal needs.
+    """
+
+    def __init__(
+        self,
+        output_directory: str,
+        threads: int = 0,
+        max_pending_images: int = None,
+        on_image_written=None,
+    ):
+        """
+        Initializes the DirectorySnippetWriter class.
+
+        Args:
+            output_directory: The directory the snippets are saved in.
+            threads: The number of threads that write snippets. If it is 0, the snippets of each image are written as soon as they are added.
+            max_pending_images: The most images waiting to be written, which bounds the memory of the snippets held for them. When it is reached,
+                adding an image waits for the oldest one to be written. Defaults to four times the number of threads.
+            on_image_written: If given, a function that is called in the thread that adds images with the key of every image once all of
+                its snippets are written, in the order the images were added.
+        """
+        self.output_directory = output_directory
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 0 else None
+        self.max_pending_images = (
+            max_pending_images if max_pending_images is not None else 4 * threads
+        )
+        self.on_image_written = on_image_written
+        self.pending_images = collections.deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # Images that might not have been written aren't reported
+            self.on_image_written = None
+
+        self.close()
+
+    def add_image(
+        self, image_directory: str, snippets: list, key=None, links: list = None
+    ):
+        """
+        This function writes the snippets of one image, or hands them to the write threads.
+
+        Args:
+            image_directory: The directory of the image, relative to output_directory. Ie: reel_name/image_name
+            snippets: The (snippet_filename, snippet_bytes) of the image.
+            key: What on_image_written is called with once the snippets are written.
+            links: The (snippet_filename, target_filename) of snippets that are the same as one of the snippets of the image. Each is written
+                as a hard link to the file of the snippet it is the same as.
+        """
+        image_directory = os.path.join(self.output_directory, image_directory)
+
+        if self.executor is None:
+            self.write_image(image_directory, snippets, links)
+            self.report_image_written(key)
+            return
+
+        self.pending_images.append(
+            (
+                self.executor.submit(
+                    self.write_image, image_directory, snippets, links
+                ),
+                key,
+            )
+        )
+
+        while len(self.pending_images) > self.max_pending_images:
+            self.wait_for_oldest_image()
+
+    def write_image(self, image_directory: str, snippets: list, links: list = None):
+        """
+        This function creates the directory of an image and writes its snippets and links into it.
+
+        Args:
+            image_directory: The path of the directory of the image.
+            snippets: The (snippet_filename, snippet_bytes) of the image.
+            links: The (snippet_filename, target_filename) of the snippets that are written as hard links.
+        """
+        # os.makedirs checks that the parent exists before it creates a directory. mkdir alone is one call when the reel's directory is there.
+        try:
+            os.mkdir(image_directory)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            os.makedirs(image_directory, exist_ok=True)
+
+        for snippet_filename, snippet_bytes in snippets:
+            snippet_path = os.path.join(image_directory, snippet_filename)
+
+            # A snippet left by an earlier run may be a hard link to other snippets, which writing it in place would change too
+            try:
+                os.remove(snippet_path)
+            except FileNotFoundError:
+                pass
+
+            with open(snippet_path, "wb") as file:
+                file.write(snippet_bytes)
+
+        for snippet_filename, target_filename in links or []:
+            snippet_path = os.path.join(image_directory, snippet_filename)
+            target_path = os.path.join(image_directory, target_filename)
+
+            # A snippet left by an earlier run is replaced
+            if os.path.lexists(snippet_path):
+                os.remove(snippet_path)
+
+            try:
+                os.link(target_path, snippet_path)
+            except OSError:
+                # The file system doesn't support hard links
+                shutil.copyfile(target_path, snippet_path)
+
+    def wait_for_oldest_image(self):
+        """
+        This function waits for the oldest pending image to be written and reports it. An error raised while it was written is raised here.
+        """
+        written_image, key = self.pending_images.popleft()
+        written_image.result()
+        self.report_image_written(key)
+
+    def report_image_written(self, key):
+        if self.on_image_written is not None:
+            self.on_image_written(key)
+
+    def close(self):
+        """
+        This function waits for every pending image to be written and stops the write threads.
+        """
+        try:
+            while self.pending_images:
+                self.wait_for_oldest_image()
+        finally:
+            for written_image, _ in self.pending_images:
+                written_image.cancel()
+            self.pending_images.clear()
+
+            if self.executor is not None:
+                self.executor.shutdown()
+
+
+def write_tar_member(tar_out: tarfile.TarFile, tar_path: str, member_bytes: bytes):
+    """
+    This function appends a file that is already in memory to a tarfile opened for writing. It writes the same bytes as
+    tar_out.addfile(tarinfo, io.BytesIO(member_bytes)) with fewer copies: the header, the data and the padding are written straight to the
+    tarfile, instead of the data being read back out of a BytesIO in chunks. The TarInfo isn't kept in tar_out.members either, so memory
+    doesn't grow with the number of members written, and tar_out.getmembers() doesn't list them.
+
+    Args:
+        tar_out: The tarfile, opened for writing.
+        tar_path: The path of the file inside the tarfile.
+        member_bytes: The contents of the file. Any bytes-like object, eg: a memoryview, can be written without being copied.
+    """
+    member_info = tarfile.TarInfo(name=tar_path)
+    member_info.size = len(member_bytes)
+
+    header = member_info.tobuf(tar_out.format, tar_out.encoding, tar_out.errors)
+    padding = -member_info.size % tarfile.BLOCKSIZE
+
+    tar_out.fileobj.write(header)
+    tar_out.fileobj.write(member_bytes)
+    if padding:
+        tar_out.fileobj.write(tarfile.NUL * padding)
+
+    tar_out.offset += len(header) + member_info.size + padding
+
+
+def write_tar_link(tar_out: tarfile.TarFile, tar_path: str, target_path: str):
+    """
+    This function appends a hard link to a member that is already in a tarfile opened for writing. The link is a header without data,
+    and extracting it gives a file with the contents of target_path.
+
+    Args:
+        tar_out: The tarfile, opened for writing.
+        tar_path: The path of the link inside the tarfile.
+        target_path: The path of the member inside the tarfile that the link points to.
+    """
+    link_info = tarfile.TarInfo(name=tar_path)
+    link_info.type = tarfile.LNKTYPE
+    link_info.linkname = target_path
+
+    header = link_info.tobuf(tar_out.format, tar_out.encoding, tar_out.errors)
+
+    tar_out.fileobj.write(header)
+    tar_out.offset += len(header)
+
+
+def write_tar_part(
+    tar_out: tarfile.TarFile, part_path: str, part_size: int, chunk_size: int = 1 << 20
+):
+    """
+    This function appends the members of an uncompressed tarfile to a tarfile opened for writing by copying their blocks as they are, since
+    the headers, data and padding of tar members are the same wherever they are in a tarfile. Like write_tar_member, no TarInfo is kept in tar_out.members.
+
+    Args:
+        tar_out: The tarfile, opened for writing.
+        part_path: The path of the uncompressed tarfile whose members are copied.
+        part_size: The number of bytes the members of the part take up, ie: its offset before the end of archive blocks that closing it wrote.
+        chunk_size: The number of bytes copied at a time.
+    """
+    with open(part_path, "rb") as part_file:
+        remaining = part_size
+
+        while remaining:
+            chunk = part_file.read(min(remaining, chunk_size))
+            if not chunk:
+                raise CustomException(
+                    f"The tar part {part_path} is shorter than the {part_size} bytes of its members."
+                )
+
+            tar_out.fileobj.write(chunk)
+            remaining -= len(chunk)
+
+    tar_out.offset += part_size
+
+
+class ParallelGzipFile:
+    """
+    This class is a write only file that gzips what is written to it in a pool of threads, like pigz. The data is cut into blocks and every
+    block is compressed on its own into a gzip member. The members are written in order, and a file of several gzip members is a valid gzip file
+    that gzip, tar and Python's gzip and tarfile modules read as one stream. zlib releases the GIL while it compresses, so the threads run in parallel
+    with each other and with the thread that writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compress_level: int = 9,
+        threads: int = 1,
+        block_size: int = 1 << 20,
+    ):
+        """
+        Initializes the ParallelGzipFile class.
+
+        Args:
+            path: The path of the gzip file.
+            compress_level: The gzip compression level, from 0 (stored without compression) to 9.
+            threads: The number of compression threads.
+            block_size: The number of bytes compressed into each gzip member. Larger blocks compress slightly better.
+        """
+        self.file = open(path, "wb")
+        self.compress_level = compress_level
+        self.block_size = block_size
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.max_pending_blocks = 2 * threads
+
+        self.pending_blocks = collections.deque()
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: bytes):
+        """
+        This function adds data to the file and returns the number of bytes written. Full blocks are handed to the compression threads.
+
+        Args:
+            data: The bytes to write.
+        """
+        self.buffer += data
+        self.position += len(data)
+
+        if len(self.buffer) >= self.block_size:
+            self.compress_buffer()
+
+        return len(data)
+
+    def tell(self):
+        """
+        This function returns the number of uncompressed bytes written so far.
+        """
+        return self.position
+
+    def compress_buffer(self):
+        """
+        This function hands the buffered data to a compression thread, and writes the oldest compressed blocks while too many are pending.
+        """
+        block, self.buffer = self.buffer, bytearray()
+        self.pending_blocks.append(
+            self.executor.submit(gzip.compress, block, self.compress_level, mtime=0)
+        )
+
+        while len(self.pending_blocks) > self.max_pending_blocks:
+            self.file.write(self.pending_blocks.popleft().result())
+
+    def close(self):
+        """
+        This function compresses the rest of the data, writes every pending block and closes the file.
+        """
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            if self.buffer:
+                self.compress_buffer()
+
+            while self.pending_blocks:
+                self.file.write(self.pending_blocks.popleft().result())
+        finally:
+            self.executor.shutdown()
+            self.file.close()
+
+
+class ParallelGzipTarFile(tarfile.TarFile):
+    """
+    This class is a tarfile written through a ParallelGzipFile, which it closes when it is closed, or when the with block it is used in raises.
+    """
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            # tarfile doesn't close a file object it was given when the with block raises, which would leave the compression threads running
+            self.fileobj.close()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.fileobj.close()
+
+
+def open_tar_for_writing(
+    path: str, compress_level: int = 9, compression_threads: int = 0
+):
+    """
+    This function opens a .tar or .tar.gz file for writing and returns the tarfile.TarFile. .tar.gz files are compressed as follows:
+        If compression_threads is 0, they are compressed by tarfile in the thread that writes, as by tarfile.open(path, "w:gz").
+        Otherwise they are compressed by a ParallelGzipFile with that many threads.
+    A compress_level of 0 stores the data in gzip format without compressing it. Snippets that are already compressed, eg: PNGs, shrink
+    very little when they are gzipped again, so this gives a valid .tar.gz at about the cost of writing a .tar.
+
+    Args:
+        path: The path of the tarfile.
+        compress_level: The gzip compression level of .tar.gz files, from 0 to 9. tarfile's default is 9.
+        compression_threads: The number of threads that compress .tar.gz files.
+    """
+    if not path.endswith(".gz"):
+        return tarfile.open(path, "w")
+
+    if compression_threads > 0:
+        return ParallelGzipTarFile(
+            fileobj=ParallelGzipFile(path, compress_level, compression_threads),
+            mode="w",
+        )
+
+    return tarfile.open(path, "w:gz", compresslevel=compress_level)
+
+
+def write_shard_manifest(manifest_path: str, shards: list):
+    """
+    This function writes the shards of a sharded tar output to a JSON manifest, so a loader can list the shards and their sizes without opening them.
+
+    Args:
+        manifest_path: The path of the manifest.
+        shards: The shards, as returned by ShardedTarWriter.close.
+    """
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(
+            {
+                "shards": shards,
+                "snippets": sum(shard["snippets"] for shard in shards),
+            },
+            manifest_file,
+            indent=2,
+        )
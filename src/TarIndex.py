@@ -0,0 +1,289 @@
+"""
+This file contains the TarIndex class which records where each member of a tarfile is, so the members can be read without scanning the tarfile.
+"""
+
+import io
+import json
+import mmap
+import os
+import tarfile
+from CustomException import CustomException
+
+
+class TarIndex:
+    """
+    This class is an index of the files in a tarfile. Every member is recorded as (member_name, offset, size), where offset is the position of the
+    member's data in the uncompressed tarfile. The members of a .tar file can then be read by seeking straight to them. A .tar.gz file can't be
+    seeked into, but its index still tells which images it holds without decompressing it.
+    The index is saved as JSON, either next to the tarfile or in a cache directory, along with the size and modification time of the tarfile,
+    so an index that is out of date is rebuilt.
+    """
+
+    def __init__(self, members: list, tar_size: int = None, tar_mtime_ns: int = None):
+        """
+        Initializes the TarIndex class. Use build or load_or_build to index a tarfile.
+
+        Args:
+            members: The (member_name, offset, size) of every file in the tarfile, in the order they appear in it.
+            tar_size: The size in bytes of the tarfile that was indexed.
+            tar_mtime_ns: The modification time in nanoseconds of the tarfile that was indexed.
+        """
+        self.members = [tuple(member) for member in members]
+        self.tar_size = tar_size
+        self.tar_mtime_ns = tar_mtime_ns
+
+    @classmethod
+    def build(cls, tar_path: str):
+        """
+        This function reads the headers of a tarfile and returns its TarIndex.
+
+        Args:
+            tar_path: The path to the .tar or .tar.gz file.
+        """
+        read_param = "r:gz" if tar_path.endswith("gz") else "r"
+        tar_stat = os.stat(tar_path)
+
+        with tarfile.open(tar_path, read_param) as tar_in:
+            members = [
+                (member.name, member.offset_data, member.size)
+                for member in tar_in
+                if member.isfile()
+            ]
+
+        return cls(members, tar_stat.st_size, tar_stat.st_mtime_ns)
+
+    @classmethod
+    def load_or_build(cls, tar_path: str, index_directory: str = None):
+        """
+        This function returns the cached TarIndex of a tarfile. If there isn't one, or the tarfile changed since it was built, the tarfile is
+        indexed and the index is saved.
+
+        Args:
+            tar_path: The path to the .tar or .tar.gz file.
+            index_directory: The directory the index is cached in. If it isn't given, the index is saved next to the tarfile.
+        """
+        tar_index = cls.load_cached(tar_path, index_directory)
+
+        if tar_index is None:
+            tar_index = cls.build(tar_path)
+            tar_index.save(cls.get_index_path(tar_path, index_directory))
+
+        return tar_index
+
+    @classmethod
+    def load_cached(cls, tar_path: str, index_directory: str = None):
+        """
+        This function returns the cached TarIndex of a tarfile, or None if there isn't one or the tarfile changed since it was built.
+
+        Args:
+            tar_path: The path to the .tar or .tar.gz file.
+            index_directory: The directory the index is cached in. If it isn't given, the index is next to the tarfile.
+        """
+        index_path = cls.get_index_path(tar_path, index_directory)
+
+        if not os.path.exists(index_path):
+            return None
+
+        tar_index = cls.load(index_path)
+        tar_stat = os.stat(tar_path)
+
+        if (tar_index.tar_size, tar_index.tar_mtime_ns) != (
+            tar_stat.st_size,
+            tar_stat.st_mtime_ns,
+        ):
+            return None
+
+        return tar_index
+
+    @staticmethod
+    def get_index_path(tar_path: str, index_directory: str = None):
+        """
+        This function returns the path of the cached index of a tarfile. Ie: reel.tar gives reel.tar.index.json
+
+        Args:
+            tar_path: The path to the tarfile.
+            index_directory: The directory the index is cached in. If it isn't given, the index is next to the tarfile.
+        """
+        if index_directory is None:
+            index_directory = os.path.dirname(tar_path)
+
+        index_filename = f"{os.path.basename(tar_path)}.index.json"
+
+        return os.path.join(index_directory, index_filename)
+
+    def save(self, index_path: str):
+        """
+        This function writes the index to a JSON file. The file is written under a temporary name and renamed, so processes that index the same
+        tarfile at once never read a partly written index.
+
+        Args:
+            index_path: The path of the index.
+        """
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temporary_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as index_file:
+            json.dump(
+                {
+                    "tar_size": self.tar_size,
+                    "tar_mtime_ns": self.tar_mtime_ns,
+                    "members": self.members,
+                },
+                index_file,
+            )
+
+        os.replace(temporary_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: str):
+        """
+        This function reads an index written by save.
+
+        Args:
+            index_path: The path of the index.
+        """
+        try:
+            with open(index_path) as index_file:
+                index = json.load(index_file)
+
+            return cls(index["members"], index["tar_size"], index["tar_mtime_ns"])
+        except (ValueError, KeyError) as e:
+            raise CustomException(f"{index_path} is not a tar index. {e}")
+
+    def get_members_of_images(self, image_names, byte_range: tuple = None):
+        """
+        This function returns the (member_name, offset, size) of the members whose names, without directories or extensions, are in image_names.
+
+        Args:
+            image_names: The names of the images to keep, eg: a coordinate map.
+            byte_range: If given, only the members whose data starts in [start, end) are kept.
+        """
+        return [
+            (member_name, offset, size)
+            for member_name, offset, size in self.members
+            if get_image_name_of_member(member_name) in image_names
+            and (byte_range is None or byte_range[0] <= offset < byte_range[1])
+        ]
+
+    def split_by_byte_range(self, image_names, parts: int):
+        """
+        This function splits the members of the images in image_names into at most parts contiguous byte ranges that hold about the same number
+        of bytes, so a tarfile can be spread across processes. It returns a list of (start, end) ranges, which is empty if the tarfile holds none of the images.
+
+        Args:
+            image_names: The names of the images to read, eg: a coordinate map.
+            parts: The most ranges to split the tarfile into.
+        """
+        members = self.get_members_of_images(image_names)
+        if not members:
+            return []
+
+        total_size = sum(size for _, _, size in members)
+        ranges = []
+        start = members[0][1]
+        bytes_before_member = 0
+
+        # A new range starts at the first member whose middle is past the next multiple of total_size / parts.
+        for _, offset, size in members:
+            middle_of_member = bytes_before_member + size / 2
+            if (
+                offset > start
+                and middle_of_member >= total_size * (len(ranges) + 1) / parts
+            ):
+                ranges.append((start, offset))
+                start = offset
+
+            bytes_before_member += size
+
+        ranges.append((start, members[-1][1] + 1))
+
+        return ranges
+
+    def get_image_names(self):
+        """
+        This function returns the set of names, without directories or extensions, of the files in the tarfile.
+        """
+        return {
+            get_image_name_of_member(member_name) for member_name, _, _ in self.members
+        }
+
+
+def get_image_name_of_member(member_name: str):
+    """
+    This function returns the name of a tarfile member without its directories or extension, which is how images are named in the coordinate map.
+
+    Args:
+        member_name: The path of the member inside the tarfile.
+    """
+    return os.path.splitext(os.path.basename(member_name))[0]
+
+
+def map_tarfile(tar_path: str):
+    """
+    This function maps an uncompressed tarfile into memory read only and returns a memoryview of it. Slices of the memoryview are views of the
+    page cache, so reading a member doesn't copy it. The mapping stays open as long as the memoryview or a slice of it is referenced,
+    and is unmapped after that, so views can be handed to other threads without the mapping being closed under them.
+
+    Args:
+        tar_path: The path to the .tar file.
+    """
+    with open(tar_path, "rb") as tar_file:
+        return memoryview(mmap.mmap(tar_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class MemoryViewFile(io.RawIOBase):
+    """
+    This class is a read only, seekable file over a memoryview, eg: a member of a mapped tarfile, so the member can be opened with PIL.Image.open
+    without being copied into a bytes object first. Pillow reads the file in small blocks as it decodes.
+    """
+
+    def __init__(self, view: memoryview):
+        """
+        Initializes the MemoryViewFile class.
+
+        Args:
+            view: The bytes of the file.
+        """
+        self.view = view.cast("B")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        """
+        This function copies the next bytes of the file into buffer and returns how many were copied.
+
+        Args:
+            buffer: A writable bytes-like object.
+        """
+        data = self.view[self.position : self.position + len(buffer)]
+        buffer[: len(data)] = data
+        self.position += len(data)
+
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        """
+        This function moves the position of the file and returns the new position.
+
+        Args:
+            offset: The offset to move to, relative to whence.
+            whence: io.SEEK_SET, io.SEEK_CUR or io.SEEK_END.
+        """
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+
+        self.position = max(offset, 0)
+
+        return self.position
+
+    def tell(self):
+        return self.position
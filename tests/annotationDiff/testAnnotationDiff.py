@@ -0,0 +1,113 @@
+import unittest
+import os
+import sys
+import pandas as pd
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from AnnotationDiff import AnnotationDiff  # noqa: E402
+from CoordinateIndex import CoordinateIndex  # noqa: E402
+from SnippetGenerator import DataFrame_to_Dictionary_converter  # noqa: E402
+
+
+class AnnotationDiff_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the AnnotationDiff class.
+    """
+
+    def setUp(self):
+        self.previous_coordinates = {
+            "unchanged": [("name", (0, 0, 10, 10))],
+            "changed": [("name", (0, 0, 10, 10)), ("date", (10, 0, 20, 10))],
+            "removed": [("name", (0, 0, 10, 10))],
+        }
+        self.coordinates = {
+            "unchanged": [("name", (0, 0, 10, 10))],
+            "changed": [("name", (0, 0, 10, 12)), ("place", (20, 0, 30, 10))],
+            "added": [("name", (0, 0, 10, 10))],
+        }
+
+    def test_compare(self):
+        diff = AnnotationDiff(self.previous_coordinates, self.coordinates)
+
+        assert diff.added == [("changed", "place"), ("added", "name")]
+        assert diff.changed == [("changed", "name")]
+        assert diff.removed == [("changed", "date"), ("removed", "name")]
+        assert diff.changed_coordinates == {
+            "changed": [("name", (0, 0, 10, 12)), ("place", (20, 0, 30, 10))],
+            "added": [("name", (0, 0, 10, 10))],
+        }
+        assert diff.get_outdated_snippets() == [
+            ("changed", "name"),
+            ("changed", "date"),
+            ("removed", "name"),
+        ]
+        assert diff.get_stats() == {
+            "added": 2,
+            "changed": 1,
+            "removed": 2,
+            "images": 3,
+        }
+
+    def test_compare_coordinate_index(self):
+        # The same boxes read back from a compiled index aren't changes
+        coordinate_index = CoordinateIndex.from_arrays(
+            [
+                image_name
+                for image_name, fields_and_coordinates in self.coordinates.items()
+                for _ in fields_and_coordinates
+            ],
+            [
+                field
+                for fields_and_coordinates in self.coordinates.values()
+                for field, _ in fields_and_coordinates
+            ],
+            [
+                box_coordinates
+                for fields_and_coordinates in self.coordinates.values()
+                for _, box_coordinates in fields_and_coordinates
+            ],
+        )
+
+        diff = AnnotationDiff(self.coordinates, coordinate_index)
+
+        assert diff.get_stats()["images"] == 0
+        assert diff.changed_coordinates == {}
+
+    def test_compare_coordinate_index_with_dataframe(self):
+        # The boxes of the DataFrame are floats, which a compiled index rounds to whole pixels
+        df = pd.DataFrame(
+            {
+                "image_name": ["image", "image", "other_image"],
+                "snip_name": ["name", "date", "name"],
+                "x1": [10.4, 20.5, 0.0],
+                "y1": [5.6, 0.0, 0.0],
+                "x2": [30.2, 40.0, 9.5],
+                "y2": [5.6, 0.0, 0.0],
+                "x3": [30.2, 40.0, 9.5],
+                "y3": [15.5, 10.0, 10.0],
+                "x4": [10.4, 20.5, 0.0],
+                "y4": [15.5, 10.0, 10.0],
+            }
+        )
+        converter = DataFrame_to_Dictionary_converter()
+        coordinate_index = converter.convert_df_to_index(df)
+
+        diff = AnnotationDiff(coordinate_index, converter.convert_df_to_map(df))
+        assert diff.get_stats()["images"] == 0
+
+        # A box that moves by less than half a pixel crops the same snippet, one that moves by a pixel doesn't
+        df.loc[0, ["x1", "x4"]] = 10.2
+        df.loc[2, ["x2", "x3"]] = 10.6
+        diff = AnnotationDiff(coordinate_index, converter.convert_df_to_map(df))
+        assert diff.changed == [("other_image", "name")]
+        assert diff.changed_coordinates == {
+            "other_image": [("name", (0.0, 0.0, 10.6, 10.0))]
+        }
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+import os
+import asyncio
+import shutil
+import pandas as pd
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetGenerator import SnippetGenerator  # noqa: E402
+from AsyncSnippetGenerator import AsyncSnippetGenerator  # noqa: E402
+from CustomException import CustomException  # noqa: E402
+from RunJournal import RunJournal  # noqa: E402
+
+
+class AsyncSnippetGenerator_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the AsyncSnippetGenerator class against the SnippetGenerator functions they mirror.
+    """
+
+    def setUp(self):
+        self.image_tar_path = os.path.join("tests", "resources", "iowa_image.tar")
+        self.image_tar_path_compressed = os.path.join(
+            "tests", "resources", "iowa_image_gz.tar.gz"
+        )
+        self.image_path = os.path.join("tests", "resources", "iowa.jpg")
+        self.out_dir = os.path.join("tests", "output")
+        self.df = pd.read_csv(os.path.join("tests", "resources", "iowa.tsv"), sep="\t")
+        self.snippet_generator = SnippetGenerator(self.df)
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_yield_encoded_snippets(self):
+        input_tarfiles = [self.image_tar_path, self.image_tar_path_compressed]
+        expected_records = list(
+            self.snippet_generator.stream_snippets(
+                input_tarfiles, [self.image_path, self.image_path], output="bytes"
+            )
+        )
+
+        async def collect(async_snippet_generator):
+            return [
+                record
+                async for record in async_snippet_generator.yield_encoded_snippets(
+                    input_tarfiles, [self.image_path, self.image_path]
+                )
+            ]
+
+        for concurrency in [1, 3]:
+            with AsyncSnippetGenerator(
+                self.snippet_generator, concurrency
+            ) as async_snippet_generator:
+                records = asyncio.run(collect(async_snippet_generator))
+
+            assert len(records) == 444
+            assert records == expected_records
+
+        with self.assertRaises(CustomException):
+            AsyncSnippetGenerator(self.snippet_generator, 0)
+
+    def test_save_snippets_to_directory(self):
+        serial_dir = os.path.join(self.out_dir, "serial")
+        async_dir = os.path.join(self.out_dir, "async")
+
+        self.snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], serial_dir
+        )
+        self.snippet_generator.save_snippets_to_directory_from_image_paths(
+            [self.image_path], serial_dir
+        )
+
+        with AsyncSnippetGenerator(
+            self.snippet_generator, 4
+        ) as async_snippet_generator:
+            asyncio.run(
+                async_snippet_generator.save_snippets_to_directory_from_tarfiles(
+                    [self.image_tar_path], async_dir
+                )
+            )
+            asyncio.run(
+                async_snippet_generator.save_snippets_to_directory_from_image_paths(
+                    [self.image_path], async_dir
+                )
+            )
+
+        serial_files = self.read_files(serial_dir)
+
+        assert len(serial_files) == 222
+        assert self.read_files(async_dir) == serial_files
+
+    def test_save_snippets_to_directory_with_duplicates_and_journal(self):
+        serial_dir = os.path.join(self.out_dir, "serial")
+        async_dir = os.path.join(self.out_dir, "async")
+        journal_path = os.path.join(self.out_dir, "journal.jsonl")
+
+        # Every box of the image is annotated twice, under a second field name
+        df = pd.concat(
+            [self.df, self.df.assign(snip_name=self.df["snip_name"] + "_Copy")],
+            ignore_index=True,
+        )
+        snippet_generator = SnippetGenerator(df, deduplicate_boxes=True)
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], serial_dir
+        )
+
+        with AsyncSnippetGenerator(snippet_generator, 4) as async_snippet_generator:
+            asyncio.run(
+                async_snippet_generator.save_snippets_to_directory_from_tarfiles(
+                    [self.image_tar_path], async_dir, journal_path=journal_path
+                )
+            )
+
+            snippet_directory = os.path.join(async_dir, "iowa_image", "iowa")
+            assert self.read_files(async_dir) == self.read_files(serial_dir)
+            assert os.path.samefile(
+                os.path.join(snippet_directory, "iowa_Card_No.png"),
+                os.path.join(snippet_directory, "iowa_Card_No_Copy.png"),
+            )
+
+            run_journal = RunJournal(journal_path)
+            assert run_journal.is_complete("image", "iowa_image/iowa")
+            assert run_journal.is_complete("reel", "iowa_image")
+            assert snippet_generator.run_journal is None
+
+            # A finished reel isn't read again
+            shutil.rmtree(async_dir)
+            asyncio.run(
+                async_snippet_generator.save_snippets_to_directory_from_tarfiles(
+                    [self.image_tar_path], async_dir, journal_path=journal_path
+                )
+            )
+            assert not os.path.exists(async_dir)
+
+            # Neither is a finished image of a reel that wasn't finished
+            os.remove(journal_path)
+            run_journal = RunJournal(journal_path)
+            run_journal.mark_complete("image", "iowa_image/iowa")
+            run_journal.close()
+            asyncio.run(
+                async_snippet_generator.save_snippets_to_directory_from_tarfiles(
+                    [self.image_tar_path], async_dir, journal_path=journal_path
+                )
+            )
+            assert not os.path.exists(async_dir)
+            assert RunJournal(journal_path).is_complete("reel", "iowa_image")
+
+    def read_files(self, directory):
+        files = {}
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as file:
+                    files[os.path.relpath(path, directory)] = file.read()
+        return files
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import os
+import pandas as pd
+import numpy as np
+import pickle
+import shutil
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from CoordinateIndex import CoordinateIndex, MappedCoordinateIndex  # noqa: E402
+from SnippetGenerator import (  # noqa: E402
+    SnippetGenerator,  # noqa: E402
+    DataFrame_to_Dictionary_converter,  # noqa: E402
+    CustomException,  # noqa: E402
+)  # noqa: E402
+
+
+class CoordinateIndex_Tests(unittest.TestCase):
+    """
+    This class tests the CoordinateIndex class against the dictionary built by DataFrame_to_Dictionary_converter.convert_df_to_map.
+    """
+
+    def setUp(self):
+        self.iowa_tsv_path = os.path.join("tests", "resources", "iowa.tsv")
+        self.image_tar_path = os.path.join("tests", "resources", "iowa_image.tar")
+        self.df = pd.read_csv(self.iowa_tsv_path, sep="\t")
+        self.dataframe_converter = DataFrame_to_Dictionary_converter()
+        self.out_dir = os.path.join("tests", "output")
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.makedirs(self.out_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def test_from_arrays(self):
+        coordinate_index = CoordinateIndex.from_arrays(
+            np.array(["image_2", "image_1", "image_2", "image_3"]),
+            np.array(["name", "name", "age", "name"]),
+            np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12.6], [0, 0, 1, 1]]),
+        )
+
+        assert list(coordinate_index) == ["image_2", "image_1", "image_3"]
+        assert coordinate_index.snip_names == ["name", "age"]
+        assert coordinate_index.offsets.tolist() == [0, 2, 3, 4]
+        assert coordinate_index.boxes.dtype == np.int32
+        assert coordinate_index.number_of_snippets() == 4
+
+        assert coordinate_index["image_2"] == [
+            ("name", (1, 2, 3, 4)),
+            ("age", (9, 10, 11, 13)),
+        ]
+        assert coordinate_index["image_1"] == [("name", (5, 6, 7, 8))]
+        assert "image_3" in coordinate_index
+        assert "image_4" not in coordinate_index
+
+        with self.assertRaises(KeyError):
+            coordinate_index["image_4"]
+
+    def test_convert_df_to_index(self):
+        coordinate_index = self.dataframe_converter.convert_df_to_index(self.df)
+        map_coordinates_to_images = self.dataframe_converter.convert_df_to_map(self.df)
+
+        assert len(coordinate_index) == len(map_coordinates_to_images)
+        assert dict(coordinate_index) == map_coordinates_to_images
+
+    def test_snippet_generator_with_compact_index(self):
+        snippet_generator = SnippetGenerator(self.df)
+        compact_snippet_generator = SnippetGenerator(self.df, compact_index=True)
+
+        assert isinstance(
+            compact_snippet_generator.map_coordinates_to_images, CoordinateIndex
+        )
+        assert list(
+            snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path], 10
+            )
+        ) == list(
+            compact_snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path], 10
+            )
+        )
+
+    def test_save_and_load(self):
+        index_path = os.path.join(self.out_dir, "iowa.index")
+        SnippetGenerator.compile_index_file(self.df, index_path)
+
+        mapped_index = CoordinateIndex.load(index_path)
+
+        assert isinstance(mapped_index, MappedCoordinateIndex)
+        assert not mapped_index.boxes.flags.writeable
+        assert dict(mapped_index) == self.dataframe_converter.convert_df_to_map(self.df)
+        assert "iowa" in mapped_index
+        assert "iow" not in mapped_index and "iowa2" not in mapped_index
+        assert 3 not in mapped_index
+
+        # Only the path is pickled for worker processes
+        pickled_index = pickle.dumps(mapped_index)
+        assert len(pickled_index) < 200
+        assert dict(pickle.loads(pickled_index)) == dict(mapped_index)
+
+        # An empty index and names that need UTF-8 round trip too
+        unicode_index = CoordinateIndex.from_arrays(
+            np.array(["b_ü", "a", "c"]),
+            np.array(["Näme", "x", "y"]),
+            np.array([[1, 2, 3, 4], [5, 6, 7, 8], [0, 0, 1, 1]]),
+        )
+        empty_index = CoordinateIndex.from_arrays(
+            np.array([]), np.array([]), np.zeros((0, 4))
+        )
+        for coordinate_index in [unicode_index, empty_index]:
+            coordinate_index.save(index_path)
+            assert dict(CoordinateIndex.load(index_path)) == dict(coordinate_index)
+
+        with open(index_path, "wb") as index_file:
+            index_file.write(b"not an index")
+
+        with self.assertRaises(CustomException):
+            CoordinateIndex.load(index_path)
+
+    def test_from_index_file(self):
+        index_path = os.path.join(self.out_dir, "iowa.index")
+        SnippetGenerator.compile_index_file(self.df, index_path)
+
+        snippet_generator = SnippetGenerator(self.df)
+        mapped_snippet_generator = SnippetGenerator.from_index_file(index_path)
+
+        assert list(
+            snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path], 10
+            )
+        ) == list(
+            mapped_snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path], 10
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import os
+import io
+import shutil
+import tarfile
+import zipfile
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from InputSources import (  # noqa: E402
+    TarSource,
+    ZipSource,
+    DirectorySource,
+    get_input_source_name,
+    open_input_source,
+)
+from TarIndex import TarIndex  # noqa: E402
+from CustomException import CustomException  # noqa: E402
+
+
+class InputSources_Tests(unittest.TestCase):
+    """
+    This class tests the input sources that images are read from.
+    """
+
+    def setUp(self):
+        self.out_dir = os.path.join("tests", "output")
+        self.tar_path = os.path.join(self.out_dir, "reel.tar.gz")
+        self.zip_path = os.path.join(self.out_dir, "reel.zip")
+        self.directory_path = os.path.join(self.out_dir, "reel")
+        self.members = {
+            f"reel/image_{number}.jpg": bytes([number]) * (1000 + number)
+            for number in range(6)
+        }
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.makedirs(self.out_dir)
+
+        with (
+            tarfile.open(self.tar_path, "w:gz") as tar_out,
+            zipfile.ZipFile(self.zip_path, "w") as zip_out,
+        ):
+            zip_out.writestr("reel/", b"")
+            for name, member_bytes in self.members.items():
+                member_info = tarfile.TarInfo(name)
+                member_info.size = len(member_bytes)
+                tar_out.addfile(member_info, io.BytesIO(member_bytes))
+                zip_out.writestr(name, member_bytes)
+
+                os.makedirs(
+                    os.path.join(self.out_dir, os.path.dirname(name)), exist_ok=True
+                )
+                with open(os.path.join(self.out_dir, name), "wb") as image_file:
+                    image_file.write(member_bytes)
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_get_input_source_name(self):
+        assert get_input_source_name(self.tar_path) == "reel"
+        assert get_input_source_name(self.zip_path) == "reel"
+        assert get_input_source_name(self.directory_path + os.sep) == "reel"
+        assert get_input_source_name("reels/iowa.tar") == "iowa"
+
+    def test_open_input_source(self):
+        assert isinstance(open_input_source(self.tar_path), TarSource)
+        assert isinstance(open_input_source(self.zip_path), ZipSource)
+        assert isinstance(open_input_source(self.directory_path), DirectorySource)
+
+    def test_yield_raw_images(self):
+        image_names = {"image_1", "image_4", "image_9"}
+        expected_images = [
+            ("image_1", self.members["reel/image_1.jpg"]),
+            ("image_4", self.members["reel/image_4.jpg"]),
+        ]
+
+        for path in [self.tar_path, self.zip_path, self.directory_path]:
+            input_source = open_input_source(path)
+
+            assert list(input_source.yield_raw_images(image_names)) == expected_images
+            assert input_source.get_image_names() == {
+                f"image_{number}" for number in range(6)
+            }
+
+    def test_zip_source_byte_range(self):
+        zip_source = ZipSource(self.zip_path)
+        zip_index = zip_source.get_index()
+        image_names = {f"image_{number}" for number in range(6)}
+
+        assert isinstance(zip_index, TarIndex)
+        assert [member[0] for member in zip_index.members] == list(self.members)
+
+        byte_ranges = zip_index.split_by_byte_range(image_names, 3)
+        assert len(byte_ranges) == 3
+
+        images = []
+        for byte_range in byte_ranges:
+            images.extend(zip_source.yield_raw_images(image_names, byte_range))
+        assert [image_bytes for _, image_bytes in images] == list(self.members.values())
+
+        # A central directory that lists the members out of order doesn't change the order they are indexed and read in
+        shuffled_zip_path = os.path.join(self.out_dir, "shuffled.zip")
+        with zipfile.ZipFile(shuffled_zip_path, "w") as zip_out:
+            for name, member_bytes in self.members.items():
+                zip_out.writestr(name, member_bytes)
+            zip_out.filelist.reverse()
+
+        zip_source = ZipSource(shuffled_zip_path)
+        with zipfile.ZipFile(shuffled_zip_path) as zip_in:
+            assert zip_in.namelist() == list(reversed(self.members))
+        assert [member[0] for member in zip_source.get_index().members] == list(
+            self.members
+        )
+
+        images = []
+        for byte_range in zip_source.get_index().split_by_byte_range(image_names, 3):
+            images.extend(zip_source.yield_raw_images(image_names, byte_range))
+        assert [image_bytes for _, image_bytes in images] == list(self.members.values())
+
+    def test_byte_range_is_not_supported(self):
+        for input_source in [
+            TarSource(self.tar_path),
+            DirectorySource(self.directory_path),
+        ]:
+            with self.assertRaises(CustomException):
+                list(input_source.yield_raw_images({"image_1"}, (0, 10000)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import pickle
+import shutil
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from RunJournal import RunJournal  # noqa: E402
+
+
+class RunJournal_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the RunJournal class.
+    """
+
+    def setUp(self):
+        self.out_dir = os.path.join("tests", "output")
+        self.journal_path = os.path.join(self.out_dir, "run.journal")
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.makedirs(self.out_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_mark_complete(self):
+        run_journal = RunJournal(self.journal_path)
+        run_journal.mark_complete("image", "reel/a")
+        run_journal.mark_complete("reel", "reel", shards=["reel-000000.tar"])
+        run_journal.mark_complete("image", "reel/b")
+        run_journal.close()
+
+        run_journal = RunJournal(self.journal_path)
+
+        assert run_journal.is_complete("image", "reel/a")
+        assert run_journal.is_complete("reel", "reel")
+        assert not run_journal.is_complete("reel", "reel/a")
+        assert [record["name"] for record in run_journal.get_records("image")] == [
+            "reel/a",
+            "reel/b",
+        ]
+        assert run_journal.get_records("reel")[0]["shards"] == ["reel-000000.tar"]
+
+    def test_load_cut_off_journal(self):
+        run_journal = RunJournal(self.journal_path)
+        run_journal.mark_complete("image", "reel/a")
+        run_journal.close()
+
+        # A crash while the second record was being written
+        with open(self.journal_path, "a") as journal_file:
+            journal_file.write('{"kind": "image", "na')
+
+        run_journal = RunJournal(self.journal_path)
+        assert list(run_journal.records) == [("image", "reel/a")]
+
+        run_journal.mark_complete("image", "reel/b")
+        run_journal.close()
+
+        assert list(RunJournal(self.journal_path).records) == [
+            ("image", "reel/a"),
+            ("image", "reel/b"),
+        ]
+
+    def test_get_unfinished_image_names(self):
+        run_journal = RunJournal(self.journal_path)
+        run_journal.mark_complete("image", run_journal.get_image_name("reel", "a"))
+
+        unfinished_image_names = run_journal.get_unfinished_image_names(
+            "reel", {"a": [], "b": []}
+        )
+
+        assert "a" not in unfinished_image_names
+        assert "b" in unfinished_image_names
+        assert "c" not in unfinished_image_names
+        assert "a" in run_journal.get_unfinished_image_names("other_reel", {"a": []})
+
+        # The journal file isn't pickled, eg: for the processes of a worker pool
+        copied_journal = pickle.loads(pickle.dumps(run_journal))
+        copied_journal.mark_complete("image", "reel/b")
+        copied_journal.close()
+        run_journal.close()
+
+        assert RunJournal(self.journal_path).is_complete("image", "reel/b")
+
+
+if __name__ == "__main__":
+    unittest.main()
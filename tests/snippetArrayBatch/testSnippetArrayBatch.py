@@ -0,0 +1,60 @@
+import unittest
+import os
+import numpy as np
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetArrayBatch import SnippetArrayBatch  # noqa: E402
+from CustomException import CustomException  # noqa: E402
+
+
+class SnippetArrayBatch_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the SnippetArrayBatch class.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.arrays = [
+            rng.integers(0, 256, shape, dtype=np.uint8)
+            for shape in [(3, 5), (4, 2), (1, 1)]
+        ]
+
+    def test_from_arrays(self):
+        batch = SnippetArrayBatch.from_arrays(self.arrays, pad_value=7)
+
+        assert batch.data.shape == (3, 4, 5)
+        assert batch.shapes.tolist() == [[3, 5], [4, 2], [1, 1]]
+        assert batch.offsets.tolist() == [0, 20, 40, 60]
+        assert batch.data[1, 0, 2] == 7
+        assert all(
+            np.array_equal(snippet, array) for snippet, array in zip(batch, self.arrays)
+        )
+
+        batch = SnippetArrayBatch.from_arrays(self.arrays, padded=False)
+
+        assert batch.data.shape == (24,)
+        assert batch.offsets.tolist() == [0, 15, 23, 24]
+        assert len(batch) == 3
+        assert all(
+            np.array_equal(snippet, array) for snippet, array in zip(batch, self.arrays)
+        )
+
+        # Snippets are views of the buffer
+        assert np.shares_memory(batch[1], batch.data)
+
+        with self.assertRaises(CustomException):
+            SnippetArrayBatch.from_arrays([])
+
+        with self.assertRaises(CustomException):
+            SnippetArrayBatch.from_arrays(
+                [self.arrays[0], np.zeros((2, 2, 3), np.uint8)]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
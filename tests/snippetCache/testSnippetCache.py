@@ -0,0 +1,124 @@
+import unittest
+import os
+import pickle
+import shutil
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetCache import SnippetCache  # noqa: E402
+
+
+class SnippetCache_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the SnippetCache class.
+    """
+
+    def setUp(self):
+        self.out_dir = os.path.join("tests", "output")
+        self.cache_directory = os.path.join(self.out_dir, "cache")
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_get_snippet_key(self):
+        image_digest = SnippetCache.get_image_digest(b"image")
+
+        assert image_digest == SnippetCache.get_image_digest(memoryview(b"image"))
+        assert image_digest != SnippetCache.get_image_digest(b"other image")
+        snippet_key = SnippetCache.get_snippet_key(
+            image_digest, (70, 141, 305, 211), "png"
+        )
+        assert snippet_key == SnippetCache.get_snippet_key(
+            image_digest, (70.0, 141.0, 305.0, 211.0), "png"
+        )
+        assert snippet_key != SnippetCache.get_snippet_key(
+            image_digest, (70, 141, 305, 211), "webp"
+        )
+
+    def test_get_and_put(self):
+        snippet_cache = SnippetCache(self.cache_directory)
+
+        assert snippet_cache.get("a" * 40) is None
+        snippet_cache.put("a" * 40, b"snippet")
+        assert snippet_cache.get("a" * 40) == b"snippet"
+
+        # The snippets are found again by the next run, and every process counts its own stats
+        snippet_cache = pickle.loads(pickle.dumps(SnippetCache(self.cache_directory)))
+        assert snippet_cache.get("a" * 40) == b"snippet"
+        assert snippet_cache.get_stats() == {
+            "hits": 1,
+            "misses": 0,
+            "hit_rate": 1.0,
+            "evictions": 0,
+            "snippets": 1,
+            "bytes": 7,
+        }
+        assert snippet_cache.report() == (
+            "Snippet cache: 1 hits, 0 misses (100.0% hit rate), 0 evictions, "
+            "1 snippets, 7 bytes"
+        )
+
+    def test_evict_least_recently_used(self):
+        snippet_cache = SnippetCache(self.cache_directory, max_bytes=30)
+
+        for snippet_key in ["a" * 40, "b" * 40, "c" * 40]:
+            snippet_cache.put(snippet_key, b"x" * 10)
+        snippet_cache.get("a" * 40)
+        snippet_cache.put("d" * 40, b"x" * 10)
+
+        assert snippet_cache.get("b" * 40) is None
+        assert snippet_cache.get_stats()["evictions"] == 1
+        assert not os.path.exists(snippet_cache.get_snippet_path("b" * 40))
+
+        # The order the snippets were used in is read back from the cache directory
+        os.utime(snippet_cache.get_snippet_path("c" * 40), ns=(0, 0))
+        snippet_cache = SnippetCache(self.cache_directory, max_bytes=20)
+
+        assert snippet_cache.get_stats()["evictions"] == 1
+        assert snippet_cache.get("c" * 40) is None
+        assert snippet_cache.get("a" * 40) == b"x" * 10
+
+    def test_merge_counts_and_reload(self):
+        snippet_cache = SnippetCache(self.cache_directory, max_bytes=30)
+        snippet_cache.put("a" * 40, b"x" * 10)
+
+        # Another process with a copy of the cache fills it past max_bytes, since it only evicts against the snippets it knows of
+        worker_snippet_cache = pickle.loads(pickle.dumps(snippet_cache))
+        worker_snippet_cache.get("a" * 40)
+        worker_snippet_cache.get("b" * 40)
+        snippet_cache.put("b" * 40, b"x" * 10)
+        for snippet_key in ["c" * 40, "d" * 40]:
+            worker_snippet_cache.put(snippet_key, b"x" * 10)
+
+        snippet_cache.merge_counts(worker_snippet_cache.pop_counts())
+        assert worker_snippet_cache.pop_counts() == {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+        snippet_cache.reload()
+
+        assert snippet_cache.get_stats() == {
+            "hits": 1,
+            "misses": 1,
+            "hit_rate": 0.5,
+            "evictions": 1,
+            "snippets": 3,
+            "bytes": 30,
+        }
+        assert (
+            sum(len(filenames) for _, _, filenames in os.walk(self.cache_directory))
+            == 3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
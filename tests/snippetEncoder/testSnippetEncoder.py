@@ -0,0 +1,64 @@
+import unittest
+import os
+import io
+from PIL import Image
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetEncoder import SnippetEncoder  # noqa: E402
+from CustomException import CustomException  # noqa: E402
+
+
+class SnippetEncoder_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the SnippetEncoder class.
+    """
+
+    def setUp(self):
+        self.snippet = Image.open(
+            os.path.join("tests", "resources", "iowa_image_iowa_Card_No.png")
+        ).convert("RGB")
+
+    def test_encode(self):
+        for output_format, pillow_format, extension in [
+            ("png", "PNG", ".png"),
+            ("webp", "WEBP", ".webp"),
+            ("jpeg", "JPEG", ".jpg"),
+            ("tiff", "TIFF", ".tif"),
+        ]:
+            snippet_encoder = SnippetEncoder(output_format)
+            decoded = Image.open(io.BytesIO(snippet_encoder.encode(self.snippet)))
+
+            assert snippet_encoder.extension == extension
+            assert decoded.format == pillow_format
+            assert decoded.size == self.snippet.size
+
+            if output_format != "jpeg":
+                assert list(decoded.convert("RGB").getdata()) == list(
+                    self.snippet.getdata()
+                )
+
+        # The default encoder writes the same bytes as Pillow's default PNG
+        png_byte_arr = io.BytesIO()
+        self.snippet.save(png_byte_arr, format="PNG")
+        assert SnippetEncoder().encode(self.snippet) == png_byte_arr.getvalue()
+
+        assert len(SnippetEncoder(compress_level=0).encode(self.snippet)) > len(
+            SnippetEncoder(compress_level=9).encode(self.snippet)
+        )
+
+        # Black and white snippets can't be stored as JPEGs as they are
+        snippet = self.snippet.convert("1")
+        decoded = Image.open(io.BytesIO(SnippetEncoder("jpeg").encode(snippet)))
+        assert decoded.mode == "L"
+
+        with self.assertRaises(CustomException):
+            SnippetEncoder("bmp")
+
+
+if __name__ == "__main__":
+    unittest.main()
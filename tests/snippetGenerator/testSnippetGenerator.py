@@ -1,9 +1,14 @@
 import unittest
 import os
-from PIL import Image, ImageChops
+import io
+from PIL import Image, ImageChops, TiffImagePlugin
 import pandas as pd
+import numpy as np
 import math
 import shutil
+import json
+import tarfile
+import zipfile
 import subprocess
 import sys
 
@@ -17,6 +22,10 @@ from SnippetGenerator import (  # noqa: E402
     DataFrame_to_Dictionary_converter,  # noqa: E402
     CustomException,  # noqa: E402
 )  # noqa: E402
+from SnippetTransform import SnippetTransform  # noqa: E402
+from SnippetEncoder import SnippetEncoder  # noqa: E402
+from RunJournal import RunJournal  # noqa: E402
+from SnippetCache import SnippetCache  # noqa: E402
 
 
 class SnippetGenerator_Tests(unittest.TestCase):
@@ -42,7 +51,7 @@ class SnippetGenerator_Tests(unittest.TestCase):
         self.image_tar_path_compressed = os.path.join(
             "tests", "resources", "iowa_image_gz.tar.gz"
         )
-        self.image_zip_path = os.path.join("tests", "resources", "iowa_image.zip")
+        self.image_rar_path = os.path.join("tests", "resources", "iowa_image.rar")
         self.image_path = os.path.join("tests", "resources", "iowa.jpg")
         self.iowa_tsv_path = os.path.join("tests", "resources", "iowa.tsv")
         self.snippet_tar_path = os.path.join("tests", "resources", "snippet.tar")
@@ -202,6 +211,107 @@ class SnippetGenerator_Tests(unittest.TestCase):
                 == "CustomException: Dataframe doesn't have the necessary columns to work with Snippet Generator."
             )
 
+    def test_get_info_from_dataframe(self):
+        df = pd.DataFrame(
+            data=[
+                ["image_1", "person_name", 1, 1, 1, 2, 2, 1, 2, 2],
+                ["image_1", "birth_year", 9, 4, 2, 7, 3, 7, 1, 5],
+                ["image_2", None, 9, 4, 2, 7, 3, 7, 1, 5],
+                ["image_2", "age", 9, 4, 2, 7, 3, math.nan, 1, 5],
+                ["image_3", "age", 1.5, 1, 1, 2, 2, 1, 2, 2],
+            ],
+            columns=self.df_column_names,
+        )
+
+        image_names, snip_names, box_coordinates = (
+            self.dataframe_converter.get_info_from_dataframe(df)
+        )
+
+        assert image_names == ["image_1", "image_1", "image_3"]
+        assert snip_names == ["person_name", "birth_year", "age"]
+        assert box_coordinates == [(1, 1, 2, 2), (1, 4, 9, 7), (1, 1, 2, 2)]
+
+        expected_map = {}
+        for row in df.itertuples():
+            try:
+                self.dataframe_converter.build_dict(
+                    expected_map,
+                    *self.dataframe_converter.get_info_from_dataframe_row(row),
+                )
+            except CustomException:
+                pass
+
+        assert self.dataframe_converter.convert_df_to_map(df) == expected_map
+
+    def test_from_annotation_file(self):
+        out_dir = os.path.join("tests", "output")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(out_dir)
+
+        csv_path = os.path.join(out_dir, "iowa.csv")
+        parquet_path = os.path.join(out_dir, "iowa.parquet")
+        self.df.to_csv(csv_path, index=False)
+        self.df.to_parquet(parquet_path)
+        expected_map = self.snippet_generator.map_coordinates_to_images
+
+        for annotation_path in [self.iowa_tsv_path, csv_path, parquet_path]:
+            snippet_generator = SnippetGenerator.from_annotation_file(
+                annotation_path, chunksize=10
+            )
+            assert snippet_generator.map_coordinates_to_images == expected_map
+
+            snippet_generator = SnippetGenerator.from_annotation_file(
+                annotation_path, chunksize=10, compact_index=True
+            )
+            assert dict(snippet_generator.map_coordinates_to_images) == expected_map
+
+        # Only the images in the tarfiles are kept
+        df = pd.concat(
+            [self.df, self.df.assign(image_name="not_in_the_tarfile")],
+            ignore_index=True,
+        )
+        df.to_csv(csv_path, index=False)
+
+        snippet_generator = SnippetGenerator.from_annotation_file(
+            csv_path, input_tarfiles=[self.image_tar_path], chunksize=50
+        )
+        assert snippet_generator.map_coordinates_to_images == expected_map
+
+        # Numeric image names are read as the strings they are in the tarfile names, in every chunk
+        reel_path = os.path.join(out_dir, "reel.tar")
+        with tarfile.open(reel_path, "w") as tar_out:
+            for image_name in ["12345", "67890"]:
+                tar_out.add(self.image_path, f"reel/{image_name}.jpg")
+        df = pd.concat(
+            [
+                self.df.assign(image_name=image_name)
+                for image_name in [12345, 67890, 99999]
+            ],
+            ignore_index=True,
+        )
+        df.to_csv(csv_path, index=False)
+        df.to_parquet(parquet_path)
+
+        for annotation_path in [csv_path, parquet_path]:
+            snippet_generator = SnippetGenerator.from_annotation_file(
+                annotation_path, input_tarfiles=[reel_path], chunksize=50
+            )
+            assert sorted(snippet_generator.map_coordinates_to_images) == [
+                "12345",
+                "67890",
+            ]
+            assert (
+                snippet_generator.map_coordinates_to_images["12345"]
+                == (expected_map["iowa"])
+            )
+
+        with self.assertRaises(CustomException):
+            SnippetGenerator.from_annotation_file(os.path.join(out_dir, "iowa.json"))
+
+        shutil.rmtree(out_dir)
+
     def test_yield_image_and_name_from_tarfile(self):
         test_image = Image.open(os.path.join("tests", "resources", "iowa.jpg"))
 
@@ -275,6 +385,94 @@ class SnippetGenerator_Tests(unittest.TestCase):
 
         assert nothing_was_yielded
 
+    def test_decode_region_of_interest(self):
+        # A TIFF with 50 rows per strip is decoded strip by strip, so strips outside of the snippet boxes can be skipped
+        tiff_info = TiffImagePlugin.ImageFileDirectory_v2()
+        tiff_info[TiffImagePlugin.ROWSPERSTRIP] = 50
+        tiff_bytes = io.BytesIO()
+        Image.open(self.image_path).save(tiff_bytes, format="TIFF", tiffinfo=tiff_info)
+
+        self.snippet_generator.map_coordinates_to_images["iowa"] = [
+            ("Test_snip_1", (70, 141, 305, 206)),
+            ("Test_snip_2", (3, 3, 2, 5)),
+            ("Test_snip_3", (300, 120, 400, 180)),
+        ]
+
+        full_image = Image.open(tiff_bytes)
+        full_image.load()
+        image = Image.open(tiff_bytes)
+
+        assert len(image.tile) == 21
+
+        # An image passed in by a caller is decoded in full and left as it is
+        snippets = list(self.snippet_generator.yield_snippet_and_field("iowa", image))
+        assert ImageChops.difference(image, full_image).getbbox() is None
+
+        # Only the strips with rows 100 to 250 of an image the generator opened are decoded
+        image = Image.open(tiff_bytes)
+        snippets_in_place = list(
+            self.snippet_generator.yield_snippet_and_field(
+                "iowa", image, decode_in_place=True
+            )
+        )
+        assert len(image.tile) == 0
+
+        for snippets_of_image in [snippets, snippets_in_place]:
+            assert [field for field, _ in snippets_of_image] == [
+                "Test_snip_1",
+                "Test_snip_3",
+            ]
+            for (_, snippet), box in zip(
+                snippets_of_image, [(70, 141, 305, 206), (300, 120, 400, 180)]
+            ):
+                assert (
+                    ImageChops.difference(snippet, full_image.crop(box)).getbbox()
+                    is None
+                )
+
+        # Jpeg images are decoded at a reduced size
+        snippet_generator = SnippetGenerator(self.df, decode_scale=4)
+        for image_name, image in snippet_generator.yield_image_and_name_from_tarfile(
+            self.image_tar_path
+        ):
+            for field, snippet in snippet_generator.yield_snippet_and_field(
+                image_name, image, decode_in_place=True
+            ):
+                if field == "Card_No":
+                    assert image.size == (320, 251)
+                    assert abs(snippet.size[0] - 239 / 4) <= 1
+                    assert abs(snippet.size[1] - 70 / 4) <= 1
+
+        # Other images are cropped at full size and reduced
+        image = Image.open(tiff_bytes)
+        for field, snippet in snippet_generator.yield_snippet_and_field("iowa", image):
+            if field == "Card_No":
+                assert image.size == (1280, 1001)
+                assert snippet.size == (60, 18)
+
+        with self.assertRaises(CustomException):
+            SnippetGenerator(self.df, decode_scale=3)
+
+    def test_yield_snippet_and_field_with_snippet_transform(self):
+        snippet_generator = SnippetGenerator(
+            self.df, snippet_transform=SnippetTransform(height=8, grayscale=True)
+        )
+
+        for image_name, image in snippet_generator.yield_image_and_name_from_tarfile(
+            self.image_tar_path
+        ):
+            snippets = list(
+                snippet_generator.yield_snippet_and_field(
+                    image_name, image, decode_in_place=True
+                )
+            )
+
+            assert len(snippets) == 111
+            assert all(snippet.height == 8 for _, snippet in snippets)
+
+            # Every snippet shrinks by at least 2, so the jpeg is decoded at half size or smaller
+            assert image.size[0] <= 640
+
     def test_get_batches_of_snippets_from_image_paths(self):
         images_per_batch = [10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 1]
 
@@ -314,13 +512,13 @@ class SnippetGenerator_Tests(unittest.TestCase):
                 _,
                 _,
             ) in self.snippet_generator.get_batches_of_snippets_from_tarfiles(
-                [self.image_zip_path], 10
+                [self.image_rar_path], 10
             ):
                 pass
         except Exception as e:
             assert (
                 e.__str__()
-                == f"CustomException: Input tarfile in the get_batches_of_snippets_from_tarfiles function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: .zip for file: {self.image_zip_path}"
+                == f"CustomException: Input tarfile in the get_batches_of_snippets_from_tarfiles function must have the correct file extension. Ie: .tar, .tar.gz or .zip, or be a directory. You provided extension: .rar for file: {self.image_rar_path}"
             )
 
         try:
@@ -339,6 +537,98 @@ class SnippetGenerator_Tests(unittest.TestCase):
                 == "CustomException: The path to this tarfile doesn't exist. path/to/not_a_real_tarfile.tar"
             )
 
+    def test_get_batches_of_snippet_arrays_from_tarfiles(self):
+        pil_snippets = []
+        for (
+            _,
+            _,
+            _,
+            snippets,
+        ) in self.snippet_generator.get_batches_of_snippets_from_tarfiles(
+            [self.image_tar_path], 10
+        ):
+            pil_snippets.extend(np.asarray(snippet) for snippet in snippets)
+
+        array_snippets = []
+        for (
+            reel_name,
+            image_names,
+            fields,
+            snippets,
+        ) in self.snippet_generator.get_batches_of_snippet_arrays_from_tarfiles(
+            [self.image_tar_path], 10
+        ):
+            assert reel_name == "iowa_image" and len(image_names) == len(snippets)
+            array_snippets.extend(snippets)
+
+        assert len(array_snippets) == len(pil_snippets) == 111
+        assert all(
+            np.array_equal(array, pil)
+            for array, pil in zip(array_snippets, pil_snippets)
+        )
+
+        # Snippets inside the image are views of the decoded image
+        assert array_snippets[0].base is array_snippets[1].base
+
+        for padded in [True, False]:
+            packed_snippets = []
+            for (
+                _,
+                _,
+                _,
+                batch,
+            ) in self.snippet_generator.get_batches_of_snippet_arrays_from_tarfiles(
+                [self.image_tar_path], 50, packed=True, padded=padded
+            ):
+                assert len(batch) <= 50
+                packed_snippets.extend(batch)
+
+            assert all(
+                np.array_equal(packed, pil)
+                for packed, pil in zip(packed_snippets, pil_snippets)
+            )
+
+    def test_stream_snippets(self):
+        encoded_snippets = list(
+            self.snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path], 10
+            )
+        )
+
+        for prefetch in [0, 4]:
+            records = list(
+                self.snippet_generator.stream_snippets(
+                    [self.image_tar_path],
+                    [self.image_path],
+                    output="bytes",
+                    prefetch=prefetch,
+                )
+            )
+
+            assert len(records) == 222
+            assert records[:111] == encoded_snippets
+            assert all(record[0] is None for record in records[111:])
+            assert [record[1:] for record in records[111:]] == [
+                record[1:] for record in encoded_snippets
+            ]
+
+        reel_name, image_name, field, snippet = next(
+            self.snippet_generator.stream_snippets([self.image_tar_path])
+        )
+        assert (reel_name, image_name, field) == encoded_snippets[0][:3]
+        assert isinstance(snippet, Image.Image)
+
+        records = self.snippet_generator.stream_snippets(
+            image_paths=[self.image_path], output="array", prefetch=1
+        )
+        assert isinstance(next(records)[3], np.ndarray)
+
+        # Stopping early shuts the producer thread down
+        records.close()
+
+        with self.assertRaises(CustomException):
+            next(self.snippet_generator.stream_snippets(output="png"))
+
     def test_save_snippets_to_directory_from_image_paths(self):
         out_dir = os.path.join("tests", "output")
 
@@ -379,6 +669,26 @@ class SnippetGenerator_Tests(unittest.TestCase):
 
         assert snippet_paths_are_equal
 
+        # Snippets written behind the snipping by a pool of threads are the same
+        threaded_dir = os.path.join(out_dir, "threaded")
+        self.snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], threaded_dir, write_threads=4
+        )
+
+        threaded_paths = []
+        self.recursive_helper(threaded_dir, threaded_paths)
+        assert len(threaded_paths) == 111
+
+        for snippet_path in threaded_paths:
+            with (
+                open(snippet_path, "rb") as threaded_file,
+                open(
+                    os.path.join(out_dir, os.path.relpath(snippet_path, threaded_dir)),
+                    "rb",
+                ) as serial_file,
+            ):
+                assert threaded_file.read() == serial_file.read()
+
         shutil.rmtree(out_dir)
 
     def test_save_snippets_as_tar_from_tarfiles(self):
@@ -427,6 +737,38 @@ class SnippetGenerator_Tests(unittest.TestCase):
 
                 shutil.rmtree(out_dir)
 
+        # A tarfile compressed in parallel or stored without compression holds the same snippets
+        out_dir = os.path.join("tests", "output")
+        members_of_tarfiles = []
+
+        for outfile, compress_level, compression_threads in [
+            ("serial.tar.gz", 9, 0),
+            ("parallel.tar.gz", 6, 2),
+            ("stored.tar.gz", 0, 1),
+        ]:
+            self.snippet_generator.save_snippets_as_tar_from_tarfiles(
+                [self.image_tar_path],
+                out_dir,
+                outfile,
+                compress_level=compress_level,
+                compression_threads=compression_threads,
+            )
+
+            with tarfile.open(os.path.join(out_dir, outfile)) as tar_in:
+                members_of_tarfiles.append(
+                    {
+                        os.path.relpath(member.name, outfile.split(".")[0]): (
+                            tar_in.extractfile(member).read()
+                        )
+                        for member in tar_in
+                    }
+                )
+
+        assert len(members_of_tarfiles[0]) == 111
+        assert all(members == members_of_tarfiles[0] for members in members_of_tarfiles)
+
+        shutil.rmtree(out_dir)
+
         try:
             self.snippet_generator.save_snippets_as_tar_from_tarfiles(
                 [self.image_tar_path], None, "out.zip"
@@ -493,6 +835,1003 @@ class SnippetGenerator_Tests(unittest.TestCase):
                 == "CustomException: Output tarfile in the save_snippets_as_tar function must have the correct file extension. Ie: .tar or .tar.gz. You provided extension: .zip"
             )
 
+    def test_save_snippets_with_workers(self):
+        out_dir = os.path.join("tests", "output")
+        input_tarfiles = [self.image_tar_path, self.image_tar_path_compressed]
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        serial_dir = os.path.join(out_dir, "serial")
+        parallel_dir = os.path.join(out_dir, "parallel")
+
+        self.snippet_generator.save_snippets_to_directory_from_tarfiles(
+            input_tarfiles, serial_dir
+        )
+        self.snippet_generator.save_snippets_to_directory_from_tarfiles(
+            input_tarfiles, parallel_dir, workers=2
+        )
+
+        serial_paths, parallel_paths = [], []
+        self.recursive_helper(serial_dir, serial_paths)
+        self.recursive_helper(parallel_dir, parallel_paths)
+
+        assert len(serial_paths) == 222
+        assert sorted(os.path.relpath(path, serial_dir) for path in serial_paths) == (
+            sorted(os.path.relpath(path, parallel_dir) for path in parallel_paths)
+        )
+
+        self.snippet_generator.save_snippets_as_tar_from_tarfiles(
+            input_tarfiles, serial_dir, "snippets.tar"
+        )
+        self.snippet_generator.save_snippets_as_tar_from_tarfiles(
+            input_tarfiles, parallel_dir, "snippets.tar", workers=2
+        )
+
+        with open(os.path.join(serial_dir, "snippets.tar"), "rb") as serial_tar:
+            with open(os.path.join(parallel_dir, "snippets.tar"), "rb") as parallel_tar:
+                assert serial_tar.read() == parallel_tar.read()
+
+        # The temporary part files are cleaned up
+        assert sorted(os.listdir(parallel_dir)) == [
+            "iowa_image",
+            "iowa_image_gz",
+            "snippets.tar",
+        ]
+
+        shutil.rmtree(out_dir)
+
+    def test_yield_encoded_snippets_from_tarfile(self):
+        serial_snippets = list(
+            self.snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path_compressed], 10
+            )
+        )
+        pipelined_snippets = list(
+            self.snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path_compressed], 10, pipeline_threads=3
+            )
+        )
+
+        assert len(serial_snippets) == 111
+        assert serial_snippets == pipelined_snippets
+
+        # Stopping early shuts the reader thread down
+        for (
+            image_name,
+            encoded_snippets,
+        ) in self.snippet_generator.yield_encoded_snippets_from_tarfile(
+            self.image_tar_path, 2, queue_size=1
+        ):
+            assert image_name == "iowa" and len(encoded_snippets) == 111
+            break
+
+    def test_save_snippets_with_snippet_encoder(self):
+        out_dir = os.path.join("tests", "output")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        snippet_generator = SnippetGenerator(
+            self.df, snippet_encoder=SnippetEncoder("webp")
+        )
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], out_dir
+        )
+        snippet_generator.save_snippets_to_directory_from_image_paths(
+            [self.image_path], out_dir
+        )
+
+        snippet_paths = []
+        self.recursive_helper(out_dir, snippet_paths)
+
+        assert len(snippet_paths) == 222
+        assert all(path.endswith(".webp") for path in snippet_paths)
+
+        snippet = Image.open(os.path.join(out_dir, "iowa", "iowa_Card_No.webp"))
+        assert snippet.format == "WEBP"
+
+        shutil.rmtree(out_dir)
+
+    def test_save_snippets_as_sharded_tar_from_tarfiles(self):
+        out_dir = os.path.join("tests", "output")
+        input_tarfiles = [self.image_tar_path, self.image_tar_path_compressed]
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        self.snippet_generator.save_snippets_as_tar_from_tarfiles(
+            input_tarfiles, out_dir, "snippets.tar"
+        )
+        with tarfile.open(os.path.join(out_dir, "snippets.tar")) as tar_in:
+            expected_members = {
+                member.name: tar_in.extractfile(member).read() for member in tar_in
+            }
+
+        for shard_per_reel, workers in [(False, 1), (True, 1), (True, 2)]:
+            shard_dir = os.path.join(out_dir, f"shards_{shard_per_reel}_{workers}")
+            self.snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+                input_tarfiles,
+                shard_dir,
+                "snippets.tar",
+                max_snippets_per_shard=50,
+                shard_per_reel=shard_per_reel,
+                workers=workers,
+            )
+
+            with open(os.path.join(shard_dir, "snippets.manifest.json")) as manifest:
+                shards = json.load(manifest)["shards"]
+
+            members = {}
+            for shard in shards:
+                with tarfile.open(os.path.join(shard_dir, shard["shard"])) as tar_in:
+                    assert len(tar_in.getmembers()) == shard["snippets"] <= 50
+                    members.update(
+                        (member.name, tar_in.extractfile(member).read())
+                        for member in tar_in
+                    )
+
+            # Extracting every shard gives the same snippets as a single tarfile
+            assert members == expected_members
+
+            if shard_per_reel:
+                assert [shard["shard"] for shard in shards] == [
+                    "snippets-iowa_image-000000.tar",
+                    "snippets-iowa_image-000001.tar",
+                    "snippets-iowa_image-000002.tar",
+                    "snippets-iowa_image_gz-000000.tar",
+                    "snippets-iowa_image_gz-000001.tar",
+                    "snippets-iowa_image_gz-000002.tar",
+                ]
+                assert shards[3]["reel_name"] == "iowa_image_gz"
+            else:
+                assert [shard["snippets"] for shard in shards] == [50, 50, 50, 50, 22]
+
+        with self.assertRaises(CustomException):
+            self.snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+                input_tarfiles, out_dir, "snippets.tar", workers=2
+            )
+
+        shutil.rmtree(out_dir)
+
+    def test_input_sources(self):
+        out_dir = os.path.join("tests", "output")
+        reel_path = os.path.join(out_dir, "reel.tar")
+        zip_path = os.path.join(out_dir, "reel.zip")
+        directory_path = os.path.join(out_dir, "reel")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(os.path.join(directory_path, "scans"))
+
+        # The same reel of 4 copies of the image, of which 3 are annotated, as a tarfile, a zip file and a directory
+        with (
+            tarfile.open(reel_path, "w") as tar_out,
+            zipfile.ZipFile(zip_path, "w") as zip_out,
+        ):
+            for image_name in ["a", "b", "c", "d"]:
+                tar_out.add(self.image_path, f"reel/{image_name}.jpg")
+                zip_out.write(self.image_path, f"reel/{image_name}.jpg")
+                shutil.copy(
+                    self.image_path,
+                    os.path.join(directory_path, "scans", f"{image_name}.jpg"),
+                )
+        df = pd.concat(
+            [self.df.assign(image_name=image_name) for image_name in ["a", "b", "d"]]
+        )
+        snippet_generator = SnippetGenerator(df)
+
+        assert snippet_generator.get_tarfile_name_no_ext(zip_path) == "reel"
+        assert snippet_generator.get_tarfile_name_no_ext(directory_path + os.sep) == (
+            "reel"
+        )
+
+        expected_snippets = list(
+            snippet_generator.yield_encoded_snippets_from_tarfiles([reel_path], 10)
+        )
+        assert len(expected_snippets) == 333
+
+        for input_tarfile in [zip_path, directory_path]:
+            assert expected_snippets == list(
+                snippet_generator.yield_encoded_snippets_from_tarfiles(
+                    [input_tarfile], 10
+                )
+            )
+            assert expected_snippets == list(
+                snippet_generator.yield_encoded_snippets_from_tarfiles(
+                    [input_tarfile], 10, pipeline_threads=2
+                )
+            )
+
+        # A zip file is split in byte ranges through its central directory, without a TarIndex
+        pieces = snippet_generator.split_tarfiles_by_byte_range(
+            [zip_path, directory_path], 3
+        )
+        assert [input_tarfile for input_tarfile, _ in pieces] == [zip_path] * 3 + [
+            directory_path
+        ]
+        assert pieces[-1][1] is None
+
+        zip_snippets = []
+        for input_tarfile, byte_range in pieces[:3]:
+            zip_snippets.extend(
+                snippet_generator.yield_raw_image_and_name_from_tarfile(
+                    input_tarfile, byte_range
+                )
+            )
+        assert [image_name for image_name, _ in zip_snippets] == ["a", "b", "d"]
+
+        try:
+            list(
+                snippet_generator.yield_raw_image_and_name_from_tarfile(
+                    directory_path, pieces[0][1]
+                )
+            )
+            assert False
+        except CustomException:
+            pass
+
+        output_dir = os.path.join(out_dir, "snippets")
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [zip_path], output_dir, workers=2
+        )
+        snippet_paths = []
+        self.recursive_helper(output_dir, snippet_paths)
+        assert len(snippet_paths) == 333
+
+        shutil.rmtree(out_dir)
+
+    def test_resume_from_journal(self):
+        out_dir = os.path.join("tests", "output")
+        reel_paths = [os.path.join(out_dir, f"reel_{i}.tar") for i in range(3)]
+        journal_path = os.path.join(out_dir, "run.journal")
+        snippet_dir = os.path.join(out_dir, "snippets")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(out_dir)
+
+        # 3 reels of 2 annotated images each, with 111 snippets per image
+        for reel_path in reel_paths:
+            with tarfile.open(reel_path, "w") as tar_out:
+                for image_name in ["a", "b"]:
+                    tar_out.add(self.image_path, f"reel/{image_name}.jpg")
+        df = pd.concat(
+            [self.df.assign(image_name=image_name) for image_name in ["a", "b"]]
+        )
+
+        # Not an Exception, so it isn't caught and printed like the errors of a single snippet
+        class Crash(BaseException):
+            pass
+
+        def crash_after(snippet_generator, method_name, calls):
+            method = getattr(snippet_generator, method_name)
+            called = []
+
+            def crashing_method(*args):
+                called.append(args)
+                if len(called) > calls:
+                    raise Crash()
+                return method(*args)
+
+            setattr(snippet_generator, method_name, crashing_method)
+            return called
+
+        # The run crashes while the first image of the second reel is being snipped
+        snippet_generator = SnippetGenerator(df)
+        crash_after(snippet_generator, "encode_snippet", 222 + 50)
+        with self.assertRaises(Crash):
+            snippet_generator.save_snippets_to_directory_from_tarfiles(
+                reel_paths, snippet_dir, journal_path=journal_path
+            )
+
+        run_journal = RunJournal(journal_path)
+        assert list(run_journal.records) == [
+            ("image", "reel_0/a"),
+            ("image", "reel_0/b"),
+            ("reel", "reel_0"),
+        ]
+
+        snippet_generator = SnippetGenerator(df)
+        encoded = crash_after(snippet_generator, "encode_snippet", 10**6)
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            reel_paths, snippet_dir, journal_path=journal_path, write_threads=2
+        )
+
+        # Only the reels after the first were snipped again
+        assert len(encoded) == 4 * 111
+        snippet_paths = []
+        self.recursive_helper(snippet_dir, snippet_paths)
+        assert len(snippet_paths) == 6 * 111
+
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            reel_paths, snippet_dir, journal_path=journal_path
+        )
+        assert len(encoded) == 4 * 111
+
+        # Sharded output that crashes while the fifth shard is being written continues with the fifth shard
+        expected_dir = os.path.join(out_dir, "expected")
+        SnippetGenerator(df).save_snippets_as_sharded_tar_from_tarfiles(
+            reel_paths, expected_dir, "snippets.tar", max_snippets_per_shard=100
+        )
+
+        shard_dir = os.path.join(out_dir, "shards")
+        shard_journal_path = os.path.join(out_dir, "shards.journal")
+        snippet_generator = SnippetGenerator(df)
+        crash_after(snippet_generator, "encode_snippet", 450)
+        with self.assertRaises(Crash):
+            snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+                reel_paths,
+                shard_dir,
+                "snippets.tar",
+                max_snippets_per_shard=100,
+                journal_path=shard_journal_path,
+            )
+        assert len(RunJournal(shard_journal_path).get_records("shard")) == 4
+
+        snippet_generator = SnippetGenerator(df)
+        encoded = crash_after(snippet_generator, "encode_snippet", 10**6)
+        snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+            reel_paths,
+            shard_dir,
+            "snippets.tar",
+            max_snippets_per_shard=100,
+            journal_path=shard_journal_path,
+        )
+
+        # The reels before the fifth shard weren't read again
+        assert len(encoded) == 4 * 111
+
+        with open(os.path.join(expected_dir, "snippets.manifest.json")) as f:
+            expected_manifest = json.load(f)
+        with open(os.path.join(shard_dir, "snippets.manifest.json")) as f:
+            manifest = json.load(f)
+        assert [shard["snippets"] for shard in manifest["shards"]] == [
+            shard["snippets"] for shard in expected_manifest["shards"]
+        ]
+
+        for shard in expected_manifest["shards"]:
+            with (
+                tarfile.open(
+                    os.path.join(expected_dir, shard["shard"])
+                ) as expected_tar,
+                tarfile.open(os.path.join(shard_dir, shard["shard"])) as shard_tar,
+            ):
+                assert expected_tar.getnames() == shard_tar.getnames()
+
+        # Reels of shard_per_reel output are skipped once their shards are written
+        reel_shard_dir = os.path.join(out_dir, "reel_shards")
+        reel_journal_path = os.path.join(out_dir, "reel_shards.journal")
+        SnippetGenerator(df).save_snippets_as_sharded_tar_from_tarfiles(
+            reel_paths[:2],
+            reel_shard_dir,
+            "snippets.tar",
+            shard_per_reel=True,
+            journal_path=reel_journal_path,
+        )
+        snippet_generator = SnippetGenerator(df)
+        encoded = crash_after(snippet_generator, "encode_snippet", 10**6)
+        snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+            reel_paths,
+            reel_shard_dir,
+            "snippets.tar",
+            shard_per_reel=True,
+            journal_path=reel_journal_path,
+        )
+
+        assert len(encoded) == 222
+        with open(os.path.join(reel_shard_dir, "snippets.manifest.json")) as f:
+            manifest = json.load(f)
+        assert [shard["reel_name"] for shard in manifest["shards"]] == [
+            "reel_0",
+            "reel_1",
+            "reel_2",
+        ]
+
+        shutil.rmtree(out_dir)
+
+    def test_stop_reading_reel_when_images_are_found(self):
+        out_dir = os.path.join("tests", "output")
+        reel_path = os.path.join(out_dir, "reel.tar.gz")
+        other_reel_path = os.path.join(out_dir, "other_reel.tar")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(out_dir)
+
+        # The annotated images a and b come first, followed by many images that aren't annotated
+        with tarfile.open(reel_path, "w:gz") as tar_out:
+            for image_name in ["a", "b"] + [f"filler_{i}" for i in range(20)]:
+                tar_out.add(self.image_path, f"reel/{image_name}.jpg")
+        with tarfile.open(other_reel_path, "w") as tar_out:
+            tar_out.add(self.image_path, "other_reel/c.jpg")
+
+        # A crash while the reel was written cut off its end, which can only be read past by stopping early
+        with open(reel_path, "r+b") as reel_file:
+            reel_file.truncate(os.path.getsize(reel_path) // 2)
+
+        df = pd.concat(
+            [
+                self.df.assign(reel_name="reel", image_name="a"),
+                self.df.assign(reel_name="reel", image_name="b"),
+                self.df.assign(reel_name="other_reel", image_name="c"),
+                self.df.assign(reel_name="other_reel", image_name="d"),
+                self.df.assign(reel_name="empty_reel", image_name="e"),
+            ],
+            ignore_index=True,
+        )
+        snippet_generator = SnippetGenerator(df, partition_by_reel=True)
+
+        snippets = list(
+            snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [reel_path, other_reel_path], 10
+            )
+        )
+
+        assert len(snippets) == 3 * 111
+        assert snippet_generator.missing_images == {"reel": [], "other_reel": ["d"]}
+
+        # The workers of a pool hand their missing images back
+        snippet_generator = SnippetGenerator(df, partition_by_reel=True)
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [reel_path, other_reel_path], os.path.join(out_dir, "snippets"), workers=2
+        )
+        assert snippet_generator.missing_images == {"reel": [], "other_reel": ["d"]}
+
+        shutil.rmtree(out_dir)
+
+    def test_missing_images_with_workers(self):
+        out_dir = os.path.join("tests", "output")
+        index_directory = os.path.join(out_dir, "indexes")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(out_dir)
+
+        # x, d and e are annotated but aren't in their reels. empty_reel holds no annotated images at all
+        images_of_reels = {
+            "reel": ["a", "filler", "b"],
+            "other_reel": ["c"],
+            "empty_reel": ["filler"],
+        }
+        input_tarfiles = []
+        for reel_name, image_names in images_of_reels.items():
+            input_tarfiles.append(os.path.join(out_dir, f"{reel_name}.tar"))
+            with tarfile.open(input_tarfiles[-1], "w") as tar_out:
+                for image_name in image_names:
+                    tar_out.add(self.image_path, f"{reel_name}/{image_name}.jpg")
+
+        df = pd.concat(
+            [
+                self.df.iloc[:3].assign(reel_name=reel_name, image_name=image_name)
+                for reel_name, image_name in [
+                    ("reel", "a"),
+                    ("reel", "b"),
+                    ("reel", "x"),
+                    ("other_reel", "c"),
+                    ("other_reel", "d"),
+                    ("empty_reel", "e"),
+                ]
+            ],
+            ignore_index=True,
+        )
+        expected_missing_images = {
+            "reel": ["x"],
+            "other_reel": ["d"],
+            "empty_reel": ["e"],
+        }
+
+        snippet_generator = SnippetGenerator(df, partition_by_reel=True)
+        list(snippet_generator.yield_encoded_snippets_from_tarfiles(input_tarfiles, 10))
+        assert snippet_generator.missing_images == expected_missing_images
+
+        # The reel is split in two byte ranges that each hold one of its annotated images, and empty_reel isn't split at all
+        for use_tar_index in [False, True]:
+            snippet_generator = SnippetGenerator(
+                df,
+                partition_by_reel=True,
+                use_tar_index=use_tar_index,
+                tar_index_directory=index_directory,
+            )
+            if use_tar_index:
+                pieces = snippet_generator.split_tarfiles_by_byte_range(
+                    input_tarfiles, 2
+                )
+                assert [input_tarfile for input_tarfile, _ in pieces] == [
+                    input_tarfiles[0]
+                ] * 2 + [input_tarfiles[1]]
+
+            snippet_generator.save_snippets_to_directory_from_tarfiles(
+                input_tarfiles,
+                os.path.join(out_dir, f"snippets_{use_tar_index}"),
+                workers=2,
+            )
+            assert snippet_generator.missing_images == expected_missing_images
+
+        snippet_generator = SnippetGenerator(df, partition_by_reel=True)
+        snippet_generator.save_snippets_as_tar_from_tarfiles(
+            input_tarfiles, out_dir, "snippets.tar", workers=2
+        )
+        assert snippet_generator.missing_images == expected_missing_images
+
+        snippet_generator = SnippetGenerator(df, partition_by_reel=True)
+        snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+            input_tarfiles,
+            os.path.join(out_dir, "shards"),
+            "snippets.tar",
+            shard_per_reel=True,
+            workers=2,
+        )
+        assert snippet_generator.missing_images == expected_missing_images
+
+        shutil.rmtree(out_dir)
+
+    def test_deduplicate_boxes(self):
+        out_dir = os.path.join("tests", "output")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        # Every box of the image is annotated twice, under a second field name
+        df = pd.concat(
+            [self.df, self.df.assign(snip_name=self.df["snip_name"] + "_Copy")],
+            ignore_index=True,
+        )
+        encoded_snippets = []
+        snippet_generator = SnippetGenerator(df, deduplicate_boxes=True)
+        encode_snippet = snippet_generator.encode_snippet
+
+        def count_encoded_snippet(snippet):
+            encoded_snippets.append(snippet)
+            return encode_snippet(snippet)
+
+        snippet_generator.encode_snippet = count_encoded_snippet
+
+        for pipeline_threads in [0, 2]:
+            snippets = list(
+                snippet_generator.yield_encoded_snippets_from_tarfiles(
+                    [self.image_tar_path], 10, pipeline_threads
+                )
+            )
+            snippets_of_fields = {field: snippet for _, _, field, snippet in snippets}
+
+            assert len(snippets) == 222
+            assert snippets_of_fields["Card_No_Copy"] is snippets_of_fields["Card_No"]
+        assert len(encoded_snippets) == 2 * 111
+
+        snippet_directory = os.path.join(out_dir, "directory", "iowa_image", "iowa")
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], os.path.join(out_dir, "directory")
+        )
+        assert len(os.listdir(snippet_directory)) == 222
+        assert os.path.samefile(
+            os.path.join(snippet_directory, "iowa_Card_No.png"),
+            os.path.join(snippet_directory, "iowa_Card_No_Copy.png"),
+        )
+
+        # Running again without deduplicate_boxes and a widened copy doesn't write through the link to the snippet it was the same as
+        with open(os.path.join(snippet_directory, "iowa_Card_No.png"), "rb") as f:
+            card_no_bytes = f.read()
+        widened_df = df.copy()
+        widened_df.loc[widened_df["snip_name"] == "Card_No_Copy", ["x2", "x3"]] += 10
+        SnippetGenerator(widened_df).save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], os.path.join(out_dir, "directory")
+        )
+        with open(os.path.join(snippet_directory, "iowa_Card_No.png"), "rb") as f:
+            assert f.read() == card_no_bytes
+        assert not os.path.samefile(
+            os.path.join(snippet_directory, "iowa_Card_No.png"),
+            os.path.join(snippet_directory, "iowa_Card_No_Copy.png"),
+        )
+
+        snippet_directory = os.path.join(out_dir, "image_paths", "iowa")
+        snippet_generator.save_snippets_to_directory_from_image_paths(
+            [self.image_path], os.path.join(out_dir, "image_paths"), batch_size=10
+        )
+        assert len(os.listdir(snippet_directory)) == 222
+        assert os.path.samefile(
+            os.path.join(snippet_directory, "iowa_Card_No.png"),
+            os.path.join(snippet_directory, "iowa_Card_No_Copy.png"),
+        )
+
+        for workers in [1, 2]:
+            tar_path = os.path.join(out_dir, f"snippets_{workers}.tar")
+            snippet_generator.save_snippets_as_tar_from_tarfiles(
+                [self.image_tar_path],
+                out_dir,
+                f"snippets_{workers}.tar",
+                workers=workers,
+            )
+            with tarfile.open(tar_path) as tar_in:
+                link_info = tar_in.getmember(
+                    f"snippets_{workers}/iowa_image/iowa/iowa_Card_No_Copy.png"
+                )
+                assert link_info.islnk()
+                assert (
+                    tar_in.extractfile(link_info).read()
+                    == snippets_of_fields["Card_No"]
+                )
+                assert len([member for member in tar_in if member.islnk()]) == 111
+
+        # A copy whose snippet is in an earlier shard is written in full
+        shard_dir = os.path.join(out_dir, "shards")
+        snippet_generator.save_snippets_as_sharded_tar_from_tarfiles(
+            [self.image_tar_path], shard_dir, "snippets.tar", max_snippets_per_shard=150
+        )
+        with open(os.path.join(shard_dir, "snippets.manifest.json")) as manifest:
+            shards = json.load(manifest)["shards"]
+
+        assert [shard["snippets"] for shard in shards] == [150, 72]
+        with tarfile.open(os.path.join(shard_dir, shards[0]["shard"])) as tar_in:
+            assert len([member for member in tar_in if member.islnk()]) == 39
+        with tarfile.open(os.path.join(shard_dir, shards[1]["shard"])) as tar_in:
+            assert all(member.isfile() for member in tar_in)
+
+        shutil.rmtree(out_dir)
+
+    def test_snippet_cache(self):
+        out_dir = os.path.join("tests", "output")
+        cache_directory = os.path.join(out_dir, "cache")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        def save_snippets(df, run, workers=1, **kwargs):
+            opened_images = []
+            snippet_generator = SnippetGenerator(
+                df, snippet_cache=SnippetCache(cache_directory), **kwargs
+            )
+            open_raw_image = snippet_generator.open_raw_image
+
+            def count_opened_image(image_bytes):
+                opened_images.append(image_bytes)
+                return open_raw_image(image_bytes)
+
+            snippet_generator.open_raw_image = count_opened_image
+            snippet_generator.save_snippets_to_directory_from_tarfiles(
+                [self.image_tar_path], os.path.join(out_dir, run), workers=workers
+            )
+
+            return snippet_generator.snippet_cache.get_stats(), len(opened_images)
+
+        assert save_snippets(self.df, "first")[0]["misses"] == 111
+
+        # An unchanged run takes every snippet from the cache without decoding the image
+        stats, opened_images = save_snippets(self.df, "second")
+        assert (stats["hits"], stats["misses"], opened_images) == (111, 0, 0)
+
+        def read_snippets(run):
+            snippet_directory = os.path.join(out_dir, run, "iowa_image", "iowa")
+            snippets = {}
+
+            for snippet_filename in os.listdir(snippet_directory):
+                with open(os.path.join(snippet_directory, snippet_filename), "rb") as f:
+                    snippets[snippet_filename] = f.read()
+
+            return snippets
+
+        assert read_snippets("first") == read_snippets("second")
+
+        # The workers of a pool hand their stats back
+        stats, _ = save_snippets(self.df, "parallel", workers=2)
+        assert (stats["hits"], stats["misses"], stats["snippets"]) == (111, 0, 111)
+        assert read_snippets("first") == read_snippets("parallel")
+
+        # Only the snippet whose box moved is cut again
+        df = self.df.copy()
+        df.loc[0, ["x1", "x3"]] += 1
+        stats, opened_images = save_snippets(df, "moved_box")
+        assert (stats["hits"], stats["misses"], opened_images) == (110, 1, 1)
+
+        # Snippets encoded with other options aren't taken from the cache
+        stats, _ = save_snippets(
+            self.df, "webp", snippet_encoder=SnippetEncoder("webp")
+        )
+        assert stats["misses"] == 111
+
+        shutil.rmtree(out_dir)
+
+    def test_save_changed_snippets_to_directory_from_tarfiles(self):
+        out_dir = os.path.join("tests", "output")
+        snippet_directory = os.path.join(out_dir, "iowa_image", "iowa")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        self.snippet_generator.save_snippets_to_directory_from_tarfiles(
+            [self.image_tar_path], out_dir
+        )
+        unchanged_snippet_inode = os.stat(
+            os.path.join(snippet_directory, "iowa_Name.png")
+        ).st_ino
+
+        # The box of Card_No moves, Card_No_Field is removed and New is added
+        df = self.df[self.df["snip_name"] != "Card_No_Field"].copy()
+        df.loc[df["snip_name"] == "Card_No", ["x1", "x3"]] += 10
+        df = pd.concat(
+            [df, self.df.iloc[[2]].assign(snip_name="New")], ignore_index=True
+        )
+
+        diffs = SnippetGenerator(df).save_changed_snippets_to_directory_from_tarfiles(
+            self.df, [self.image_tar_path], out_dir
+        )
+
+        assert diffs["iowa_image"].get_stats() == {
+            "added": 1,
+            "changed": 1,
+            "removed": 1,
+            "images": 1,
+        }
+        assert not os.path.exists(
+            os.path.join(snippet_directory, "iowa_Card_No_Field.png")
+        )
+        assert len(os.listdir(snippet_directory)) == 111
+        assert (
+            os.stat(os.path.join(snippet_directory, "iowa_Name.png")).st_ino
+            == unchanged_snippet_inode
+        )
+
+        snippet = Image.open(os.path.join(snippet_directory, "iowa_Card_No.png"))
+        card_no = df[df["snip_name"] == "Card_No"].iloc[0]
+        assert snippet.width == max(card_no[["x2", "x4"]]) - min(card_no[["x1", "x3"]])
+
+        # Partitioned by reel, a reel without changes isn't opened, even if it can't be read
+        unreadable_reel_path = os.path.join(out_dir, "unreadable_reel.tar")
+        with open(unreadable_reel_path, "wb") as reel_file:
+            reel_file.write(b"not a tarfile")
+
+        previous_df = pd.concat(
+            [
+                df.assign(reel_name="iowa_image"),
+                self.df.assign(reel_name="unreadable_reel"),
+            ],
+            ignore_index=True,
+        )
+        new_df = pd.concat(
+            [
+                self.df.assign(reel_name="iowa_image"),
+                self.df.assign(reel_name="unreadable_reel"),
+            ],
+            ignore_index=True,
+        )
+
+        diffs = SnippetGenerator(
+            new_df, partition_by_reel=True
+        ).save_changed_snippets_to_directory_from_tarfiles(
+            previous_df, [self.image_tar_path, unreadable_reel_path], out_dir
+        )
+
+        assert diffs["iowa_image"].get_stats()["images"] == 1
+        assert diffs["unreadable_reel"].get_stats()["images"] == 0
+        assert len(os.listdir(snippet_directory)) == 111
+        assert os.path.exists(os.path.join(snippet_directory, "iowa_Card_No_Field.png"))
+
+        with self.assertRaises(CustomException):
+            SnippetGenerator(
+                new_df, partition_by_reel=True
+            ).save_changed_snippets_to_directory_from_tarfiles(
+                self.snippet_generator.map_coordinates_to_images,
+                [self.image_tar_path],
+                out_dir,
+            )
+
+        shutil.rmtree(out_dir)
+
+    def test_use_tar_index(self):
+        out_dir = os.path.join("tests", "output")
+        index_directory = os.path.join(out_dir, "indexes")
+        reel_path = os.path.join(out_dir, "reel.tar")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(out_dir)
+
+        # A reel of 4 copies of the image, of which 3 are annotated
+        with tarfile.open(reel_path, "w") as tar_out:
+            for image_name in ["a", "b", "c", "d"]:
+                tar_out.add(self.image_path, f"reel/{image_name}.jpg")
+        df = pd.concat(
+            [self.df.assign(image_name=image_name) for image_name in ["a", "b", "d"]]
+        )
+
+        snippet_generator = SnippetGenerator(df)
+        indexed_snippet_generator = SnippetGenerator(
+            df, use_tar_index=True, tar_index_directory=index_directory
+        )
+        input_tarfiles = [reel_path, self.image_tar_path_compressed]
+
+        expected_snippets = list(
+            snippet_generator.yield_encoded_snippets_from_tarfiles(input_tarfiles, 10)
+        )
+        assert len(expected_snippets) == 333
+        assert expected_snippets == list(
+            indexed_snippet_generator.yield_encoded_snippets_from_tarfiles(
+                input_tarfiles, 10
+            )
+        )
+        assert sorted(os.listdir(index_directory)) == [
+            "iowa_image_gz.tar.gz.index.json",
+            "reel.tar.index.json",
+        ]
+
+        # The reel is split in two byte ranges. The compressed tarfile holds no annotated images
+        pieces = indexed_snippet_generator.split_tarfiles_by_byte_range(
+            input_tarfiles, 2
+        )
+        assert [input_tarfile for input_tarfile, _ in pieces] == [reel_path] * 2
+
+        # A .tar.gz reel whose index isn't cached yet is snipped whole, and indexed by the worker that reads it instead of in this process
+        compressed_index_path = os.path.join(
+            index_directory, "iowa_image_gz.tar.gz.index.json"
+        )
+        os.remove(compressed_index_path)
+        unindexed_snippet_generator = SnippetGenerator(
+            df, use_tar_index=True, tar_index_directory=index_directory
+        )
+        assert unindexed_snippet_generator.split_tarfiles_by_byte_range(
+            input_tarfiles, 2
+        ) == pieces + [(self.image_tar_path_compressed, None)]
+        assert not os.path.exists(compressed_index_path)
+
+        unindexed_snippet_generator.save_snippets_to_directory_from_tarfiles(
+            input_tarfiles, os.path.join(out_dir, "unindexed"), workers=2
+        )
+        assert os.path.exists(compressed_index_path)
+        assert (
+            unindexed_snippet_generator.split_tarfiles_by_byte_range(input_tarfiles, 2)
+            == pieces
+        )
+
+        assert [
+            (image_name, encoded_snippets)
+            for _, byte_range in pieces
+            for image_name, encoded_snippets in (
+                indexed_snippet_generator.yield_encoded_snippets_from_tarfile(
+                    reel_path, 2, byte_range=byte_range
+                )
+            )
+        ] == list(
+            indexed_snippet_generator.yield_encoded_snippets_from_tarfile(reel_path, 2)
+        )
+
+        serial_dir = os.path.join(out_dir, "serial")
+        snippet_generator.save_snippets_to_directory_from_tarfiles(
+            input_tarfiles, serial_dir
+        )
+        serial_paths = []
+        self.recursive_helper(serial_dir, serial_paths)
+        assert len(serial_paths) == 333
+
+        for pipeline_threads in [0, 2]:
+            parallel_dir = os.path.join(out_dir, f"parallel_{pipeline_threads}")
+            indexed_snippet_generator.save_snippets_to_directory_from_tarfiles(
+                input_tarfiles,
+                parallel_dir,
+                workers=2,
+                pipeline_threads=pipeline_threads,
+            )
+
+            parallel_paths = []
+            self.recursive_helper(parallel_dir, parallel_paths)
+            assert sorted(
+                os.path.relpath(path, serial_dir) for path in serial_paths
+            ) == sorted(os.path.relpath(path, parallel_dir) for path in parallel_paths)
+
+        with self.assertRaises(CustomException):
+            next(
+                snippet_generator.yield_raw_image_and_name_from_tarfile(
+                    reel_path, (0, 1)
+                )
+            )
+
+        shutil.rmtree(out_dir)
+
+    def test_map_tarfiles(self):
+        expected_snippets = list(
+            self.snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path, self.image_tar_path_compressed], 10
+            )
+        )
+
+        for use_tar_index in [False, True]:
+            snippet_generator = SnippetGenerator(
+                self.df,
+                use_tar_index=use_tar_index,
+                tar_index_directory=os.path.join("tests", "output"),
+                map_tarfiles=True,
+            )
+
+            raw_images = list(
+                snippet_generator.yield_raw_image_and_name_from_tarfile(
+                    self.image_tar_path
+                )
+            )
+            assert isinstance(raw_images[0][1], memoryview)
+
+            for pipeline_threads in [0, 2]:
+                assert expected_snippets == list(
+                    snippet_generator.yield_encoded_snippets_from_tarfiles(
+                        [self.image_tar_path, self.image_tar_path_compressed],
+                        10,
+                        pipeline_threads,
+                    )
+                )
+
+        shutil.rmtree(os.path.join("tests", "output"))
+
+    def test_partition_by_reel(self):
+        out_dir = os.path.join("tests", "output")
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+
+        # Both tarfiles contain an image named iowa, with different fields in each reel
+        df = pd.concat(
+            [
+                self.df.iloc[:5].assign(reel_name="iowa_image.tar"),
+                self.df.iloc[5:8].assign(reel_name="iowa_image_gz"),
+                self.df.iloc[8:9].assign(reel_name="not_a_tarfile"),
+            ],
+            ignore_index=True,
+        )
+        index_directory = os.path.join(out_dir, "index")
+        SnippetGenerator.compile_index_file(df, index_directory, True)
+
+        assert sorted(os.listdir(index_directory)) == [
+            "iowa_image.index",
+            "iowa_image_gz.index",
+            "not_a_tarfile.index",
+        ]
+
+        for snippet_generator in [
+            SnippetGenerator(df, partition_by_reel=True),
+            SnippetGenerator(df, compact_index=True, partition_by_reel=True),
+            SnippetGenerator.from_index_file(index_directory),
+        ]:
+            snippets_of_reels = {}
+
+            for (
+                reel_name,
+                image_name,
+                field,
+                _,
+            ) in snippet_generator.yield_encoded_snippets_from_tarfiles(
+                [self.image_tar_path, self.image_tar_path_compressed], 2
+            ):
+                assert image_name == "iowa"
+                snippets_of_reels.setdefault(reel_name, []).append(field)
+
+            assert snippets_of_reels == {
+                "iowa_image": df["snip_name"][:5].tolist(),
+                "iowa_image_gz": df["snip_name"][5:8].tolist(),
+            }
+            assert len(snippet_generator.map_coordinates_to_images) == 0
+
+            with self.assertRaises(CustomException):
+                next(
+                    snippet_generator.get_batches_of_snippets_from_image_paths(
+                        [self.image_path], 10
+                    )
+                )
+
+        with self.assertRaises(CustomException):
+            SnippetGenerator(self.df, partition_by_reel=True)
+
+        # A coordinate map that was already built has no reel names to partition by
+        index_path = os.path.join(out_dir, "iowa.index")
+        SnippetGenerator.compile_index_file(df, index_path)
+        with self.assertRaises(CustomException):
+            SnippetGenerator.from_index_file(index_path, partition_by_reel=True)
+
+        annotation_path = os.path.join(out_dir, "iowa.tsv")
+        df.to_csv(annotation_path, sep="\t", index=False)
+        with self.assertRaises(CustomException):
+            SnippetGenerator.from_annotation_file(
+                annotation_path, partition_by_reel=True
+            )
+
+        shutil.rmtree(out_dir)
+
     def compare_actual_paths_to_expected_paths(
         self, out_dir: str, tarfile_out_filename_no_ext: str, reel_name: str = None
     ):
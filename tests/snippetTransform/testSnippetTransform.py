@@ -0,0 +1,61 @@
+import unittest
+import os
+from PIL import Image
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetTransform import SnippetTransform  # noqa: E402
+from CustomException import CustomException  # noqa: E402
+
+
+class SnippetTransform_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the SnippetTransform class.
+    """
+
+    def setUp(self):
+        self.snippet = Image.open(
+            os.path.join("tests", "resources", "iowa_image_iowa_Card_No.png")
+        ).convert("RGB")
+
+    def test_get_size(self):
+        assert SnippetTransform().get_size((200, 50)) == (200, 50)
+        assert SnippetTransform(height=25).get_size((200, 50)) == (100, 25)
+        assert SnippetTransform(width=50).get_size((200, 50)) == (50, 12)
+        assert SnippetTransform(height=10, width=10).get_size((200, 50)) == (10, 10)
+        assert SnippetTransform(height=1).get_size((1, 50)) == (1, 1)
+
+    def test_get_downscale_factor(self):
+        assert SnippetTransform(height=25).get_downscale_factor((0, 0, 200, 50)) == 2
+        assert SnippetTransform(height=100).get_downscale_factor((0, 0, 200, 50)) == 0.5
+        assert (
+            SnippetTransform(height=10, width=100).get_downscale_factor((0, 0, 200, 50))
+            == 2
+        )
+
+    def test_apply(self):
+        snippet = SnippetTransform(height=32).apply(self.snippet)
+        assert snippet.height == 32 and snippet.mode == "RGB"
+
+        snippet = SnippetTransform(grayscale=True).apply(self.snippet)
+        assert snippet.size == self.snippet.size and snippet.mode == "L"
+
+        snippet = SnippetTransform(height=32, binarize_threshold=128).apply(
+            self.snippet
+        )
+        assert snippet.height == 32 and snippet.mode == "1"
+        assert set(snippet.convert("L").getdata()) <= {0, 255}
+
+        with self.assertRaises(CustomException):
+            SnippetTransform(height=0)
+
+        with self.assertRaises(CustomException):
+            SnippetTransform(binarize_threshold=256)
+
+
+if __name__ == "__main__":
+    unittest.main()
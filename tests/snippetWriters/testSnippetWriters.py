@@ -0,0 +1,354 @@
+import unittest
+import os
+import io
+import json
+import shutil
+import tarfile
+import gzip
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from SnippetWriters import (  # noqa: E402
+    ShardedTarWriter,
+    ParallelGzipFile,
+    open_tar_for_writing,
+    write_shard_manifest,
+    write_tar_member,
+    write_tar_link,
+    write_tar_part,
+    DirectorySnippetWriter,
+)
+from CustomException import CustomException  # noqa: E402
+
+
+class SnippetWriters_Tests(unittest.TestCase):
+    """
+    This class tests the writers in SnippetWriters.
+    """
+
+    def setUp(self):
+        self.out_dir = os.path.join("tests", "output")
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_sharded_tar_writer(self):
+        with ShardedTarWriter(
+            self.out_dir, "snippets", max_snippets_per_shard=3
+        ) as writer:
+            for snippet_id in range(7):
+                writer.add_snippet(f"snippets/{snippet_id}.png", b"x" * 100)
+
+        assert [shard["shard"] for shard in writer.shards] == [
+            "snippets-000000.tar",
+            "snippets-000001.tar",
+            "snippets-000002.tar",
+        ]
+        assert [shard["snippets"] for shard in writer.shards] == [3, 3, 1]
+        assert writer.shards[1]["first_member"] == "snippets/3.png"
+        assert writer.shards[1]["last_member"] == "snippets/5.png"
+
+        with tarfile.open(os.path.join(self.out_dir, "snippets-000002.tar")) as tar_in:
+            assert tar_in.getnames() == ["snippets/6.png"]
+            assert tar_in.extractfile("snippets/6.png").read() == b"x" * 100
+
+        # The small snippets take a 512 byte header and 512 bytes of data, so 2 fit in 2048 bytes.
+        # The 3000 byte snippet doesn't fit in any shard, so it gets one of its own.
+        with ShardedTarWriter(
+            self.out_dir, "sized", ".tar.gz", max_bytes_per_shard=2048
+        ) as writer:
+            for size in [100, 500, 100, 3000, 100]:
+                writer.add_snippet(f"{size}.png", b"x" * size)
+
+        assert [shard["snippets"] for shard in writer.shards] == [2, 1, 1, 1]
+        assert all(
+            shard["bytes"]
+            == os.path.getsize(os.path.join(self.out_dir, shard["shard"]))
+            for shard in writer.shards
+        )
+
+        manifest_path = os.path.join(self.out_dir, "sized.manifest.json")
+        write_shard_manifest(manifest_path, writer.shards)
+
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        assert manifest["snippets"] == 5
+        assert manifest["shards"] == writer.shards
+
+        with self.assertRaises(CustomException):
+            ShardedTarWriter(self.out_dir, "snippets", ".zip")
+
+        with self.assertRaises(CustomException):
+            ShardedTarWriter(self.out_dir, "snippets", max_snippets_per_shard=0)
+
+    def test_sharded_tar_writer_continues_after_shards(self):
+        closed_shards = []
+
+        with ShardedTarWriter(
+            self.out_dir,
+            "snippets",
+            max_snippets_per_shard=3,
+            on_close_shard=closed_shards.append,
+        ) as writer:
+            for snippet_id in range(4):
+                writer.add_snippet(f"snippets/{snippet_id}.png", b"x" * 100)
+
+        assert closed_shards == writer.shards
+
+        # The shards after the first are written again by a second run, which is cut short by an error
+        closed_shards = []
+        with self.assertRaises(ValueError):
+            with ShardedTarWriter(
+                self.out_dir,
+                "snippets",
+                max_snippets_per_shard=3,
+                shards=writer.shards[:1],
+                on_close_shard=closed_shards.append,
+            ) as resumed_writer:
+                for snippet_id in range(3, 7):
+                    resumed_writer.add_snippet(f"snippets/{snippet_id}.png", b"x")
+                raise ValueError()
+
+        assert [shard["shard"] for shard in resumed_writer.shards] == [
+            "snippets-000000.tar",
+            "snippets-000001.tar",
+            "snippets-000002.tar",
+        ]
+        assert [shard["shard"] for shard in closed_shards] == ["snippets-000001.tar"]
+
+    def test_write_tar_link(self):
+        os.makedirs(self.out_dir)
+        tar_path = os.path.join(self.out_dir, "snippets.tar")
+
+        with tarfile.open(tar_path, "w") as tar_out:
+            write_tar_member(tar_out, "snippets/a.png", b"snippet")
+            write_tar_link(tar_out, "snippets/b.png", "snippets/a.png")
+
+        with tarfile.open(tar_path) as tar_in:
+            link_info = tar_in.getmember("snippets/b.png")
+            assert link_info.islnk() and link_info.linkname == "snippets/a.png"
+            assert tar_in.extractfile(link_info).read() == b"snippet"
+
+    def test_sharded_tar_writer_add_link(self):
+        with ShardedTarWriter(
+            self.out_dir, "snippets", max_snippets_per_shard=2
+        ) as writer:
+            first_shard = writer.add_snippet("snippets/a.png", b"snippet")
+            link_shard = writer.add_link(
+                "snippets/b.png", "snippets/a.png", first_shard, b"snippet"
+            )
+            assert first_shard == link_shard == 0
+
+            # The shard is full, so the link can't point back into it and the snippet is added in full
+            copy_shard = writer.add_link(
+                "snippets/c.png", "snippets/a.png", first_shard, b"snippet"
+            )
+            assert copy_shard == 1
+
+        with tarfile.open(os.path.join(self.out_dir, "snippets-000000.tar")) as tar_in:
+            assert tar_in.getmember("snippets/b.png").islnk()
+        with tarfile.open(os.path.join(self.out_dir, "snippets-000001.tar")) as tar_in:
+            snippet_info = tar_in.getmember("snippets/c.png")
+            assert snippet_info.isfile()
+            assert tar_in.extractfile(snippet_info).read() == b"snippet"
+
+        assert [shard["snippets"] for shard in writer.shards] == [2, 1]
+
+    def test_directory_snippet_writer(self):
+        for threads in [0, 3]:
+            written_images = []
+            output_directory = os.path.join(self.out_dir, f"threads_{threads}")
+
+            with DirectorySnippetWriter(
+                output_directory,
+                threads,
+                max_pending_images=2,
+                on_image_written=written_images.append,
+            ) as writer:
+                for image_id in range(10):
+                    writer.add_image(
+                        os.path.join("reel", f"image_{image_id}"),
+                        [
+                            (f"image_{image_id}_{field}.png", bytes([image_id, field]))
+                            for field in range(3)
+                        ],
+                        image_id,
+                    )
+
+            assert written_images == list(range(10))
+            for image_id in range(10):
+                for field in range(3):
+                    snippet_path = os.path.join(
+                        output_directory,
+                        "reel",
+                        f"image_{image_id}",
+                        f"image_{image_id}_{field}.png",
+                    )
+                    with open(snippet_path, "rb") as snippet_file:
+                        assert snippet_file.read() == bytes([image_id, field])
+
+        # Duplicate snippets are hard links to the file they are the same as, and replace what an earlier run left
+        image_directory = os.path.join(self.out_dir, "links", "image")
+        os.makedirs(image_directory)
+        with open(os.path.join(image_directory, "b.png"), "wb") as snippet_file:
+            snippet_file.write(b"old")
+
+        with DirectorySnippetWriter(os.path.join(self.out_dir, "links")) as writer:
+            writer.add_image("image", [("a.png", b"new")], links=[("b.png", "a.png")])
+
+        assert os.path.samefile(
+            os.path.join(image_directory, "a.png"),
+            os.path.join(image_directory, "b.png"),
+        )
+
+        # A run without the links writes the snippets apart, without changing the file they were linked to
+        with DirectorySnippetWriter(os.path.join(self.out_dir, "links")) as writer:
+            writer.add_image("image", [("a.png", b"new"), ("b.png", b"changed")])
+
+        with open(os.path.join(image_directory, "a.png"), "rb") as snippet_file:
+            assert snippet_file.read() == b"new"
+        with open(os.path.join(image_directory, "b.png"), "rb") as snippet_file:
+            assert snippet_file.read() == b"changed"
+
+        # An error while writing is raised in the thread that adds images, and the images after it aren't reported
+        written_images = []
+        with self.assertRaises(OSError):
+            with DirectorySnippetWriter(
+                self.out_dir, 2, on_image_written=written_images.append
+            ) as writer:
+                writer.add_image("good", [("snippet.png", b"x")], "good")
+                writer.add_image("bad", [("missing/snippet.png", b"x")], "bad")
+                writer.add_image("after", [("snippet.png", b"x")], "after")
+
+        assert "bad" not in written_images and "after" not in written_images
+
+    def test_parallel_gzip_file(self):
+        os.makedirs(self.out_dir)
+        gzip_path = os.path.join(self.out_dir, "data.gz")
+        data = os.urandom(5000) + bytes(20000)
+
+        gzip_file = ParallelGzipFile(gzip_path, threads=3, block_size=1000)
+        for start in range(0, len(data), 700):
+            gzip_file.write(data[start : start + 700])
+        assert gzip_file.tell() == len(data)
+        gzip_file.close()
+        gzip_file.close()
+
+        with gzip.open(gzip_path) as gzip_in:
+            assert gzip_in.read() == data
+
+    def test_open_tar_for_writing(self):
+        os.makedirs(self.out_dir)
+        members = {
+            f"snippets/{size}.png": os.urandom(size) for size in [10, 2000, 70000]
+        }
+
+        for tar_name, compress_level, compression_threads in [
+            ("plain.tar", 9, 0),
+            ("serial.tar.gz", 9, 0),
+            ("parallel.tar.gz", 6, 2),
+            ("stored.tar.gz", 0, 2),
+        ]:
+            tar_path = os.path.join(self.out_dir, tar_name)
+
+            with open_tar_for_writing(
+                tar_path, compress_level, compression_threads
+            ) as tar_out:
+                for name, snippet_bytes in members.items():
+                    snippet_info = tarfile.TarInfo(name)
+                    snippet_info.size = len(snippet_bytes)
+                    tar_out.addfile(snippet_info, io.BytesIO(snippet_bytes))
+
+            with tarfile.open(tar_path) as tar_in:
+                assert {
+                    member.name: tar_in.extractfile(member).read() for member in tar_in
+                } == members
+
+        # Stored blocks only add gzip headers to the tar data
+        stored_size = os.path.getsize(os.path.join(self.out_dir, "stored.tar.gz"))
+        plain_size = os.path.getsize(os.path.join(self.out_dir, "plain.tar"))
+        assert stored_size < plain_size + 1024
+
+        # The gzip file and its compression threads are closed when the with block raises
+        with self.assertRaises(ValueError):
+            with open_tar_for_writing(
+                os.path.join(self.out_dir, "failed.tar.gz"), 6, 2
+            ) as tar_out:
+                gzip_file = tar_out.fileobj
+                write_tar_member(tar_out, "snippets/10.png", members["snippets/10.png"])
+                raise ValueError
+
+        assert gzip_file.closed and gzip_file.file.closed
+        with self.assertRaises(RuntimeError):
+            gzip_file.executor.submit(len, b"")
+
+    def test_write_tar_part(self):
+        os.makedirs(self.out_dir)
+        part_path = os.path.join(self.out_dir, "part.tar")
+        members = {f"snippets/{size}.png": os.urandom(size) for size in [0, 512, 70000]}
+
+        with tarfile.open(part_path, "w") as tar_part:
+            for name, member_bytes in members.items():
+                write_tar_member(tar_part, name, member_bytes)
+            write_tar_link(tar_part, "snippets/copy.png", "snippets/512.png")
+            part_size = tar_part.offset
+
+        tar_path = os.path.join(self.out_dir, "snippets.tar")
+        with tarfile.open(tar_path, "w") as tar_out:
+            write_tar_member(tar_out, "snippets/first.png", b"first")
+            write_tar_part(tar_out, part_path, part_size, chunk_size=1000)
+            write_tar_part(tar_out, part_path, part_size)
+
+            assert tar_out.getmembers() == []
+
+        with tarfile.open(tar_path) as tar_in:
+            names = [member.name for member in tar_in]
+            assert names == ["snippets/first.png"] + 2 * (
+                list(members) + ["snippets/copy.png"]
+            )
+            assert (
+                tar_in.extractfile("snippets/copy.png").read()
+                == (members["snippets/512.png"])
+            )
+            assert (
+                tar_in.extractfile("snippets/70000.png").read()
+                == (members["snippets/70000.png"])
+            )
+
+        with self.assertRaises(CustomException):
+            with tarfile.open(tar_path, "w") as tar_out:
+                write_tar_part(tar_out, part_path, os.path.getsize(part_path) + 1)
+
+    def test_write_tar_member(self):
+        members = [
+            (f"snippets/{size}.png", os.urandom(size)) for size in [0, 512, 1000]
+        ]
+
+        addfile_tar = io.BytesIO()
+        with tarfile.open(fileobj=addfile_tar, mode="w") as tar_out:
+            for name, member_bytes in members:
+                member_info = tarfile.TarInfo(name)
+                member_info.size = len(member_bytes)
+                tar_out.addfile(member_info, io.BytesIO(member_bytes))
+
+        written_tar = io.BytesIO()
+        with tarfile.open(fileobj=written_tar, mode="w") as tar_out:
+            for name, member_bytes in members:
+                write_tar_member(tar_out, name, memoryview(member_bytes))
+
+            assert tar_out.getmembers() == []
+
+        assert written_tar.getvalue() == addfile_tar.getvalue()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import io
+import shutil
+import tarfile
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+testFolder = os.path.dirname(current)
+root = os.path.dirname(testFolder)
+sys.path.append(os.path.join(root, "src"))
+
+from TarIndex import (  # noqa: E402
+    TarIndex,
+    MemoryViewFile,
+    get_image_name_of_member,
+    map_tarfile,
+)
+from CustomException import CustomException  # noqa: E402
+
+
+class TarIndex_Tests(unittest.TestCase):
+    """
+    This class tests the functions in the TarIndex class.
+    """
+
+    def setUp(self):
+        self.out_dir = os.path.join("tests", "output")
+        self.tar_path = os.path.join(self.out_dir, "reel.tar")
+        self.members = {
+            f"reel/image_{number}.jpg": bytes([number]) * (1000 + number)
+            for number in range(6)
+        }
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.makedirs(self.out_dir)
+
+        with tarfile.open(self.tar_path, "w") as tar_out:
+            directory_info = tarfile.TarInfo("reel")
+            directory_info.type = tarfile.DIRTYPE
+            tar_out.addfile(directory_info)
+            for name, member_bytes in self.members.items():
+                member_info = tarfile.TarInfo(name)
+                member_info.size = len(member_bytes)
+                tar_out.addfile(member_info, io.BytesIO(member_bytes))
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_build(self):
+        tar_index = TarIndex.build(self.tar_path)
+
+        assert [member[0] for member in tar_index.members] == list(self.members)
+        assert tar_index.get_image_names() == {f"image_{i}" for i in range(6)}
+
+        with open(self.tar_path, "rb") as tar_in:
+            for member_name, offset, size in tar_index.members:
+                tar_in.seek(offset)
+                assert tar_in.read(size) == self.members[member_name]
+
+        compressed_path = os.path.join("tests", "resources", "iowa_image_gz.tar.gz")
+        assert TarIndex.build(compressed_path).get_image_names() == {"iowa"}
+
+    def test_load_or_build(self):
+        index_directory = os.path.join(self.out_dir, "indexes")
+        index_path = os.path.join(index_directory, "reel.tar.index.json")
+
+        tar_index = TarIndex.load_or_build(self.tar_path, index_directory)
+        assert os.path.exists(index_path)
+        assert TarIndex.load_or_build(self.tar_path, index_directory).members == (
+            tar_index.members
+        )
+
+        # An index of a tarfile that changed since it was built is rebuilt
+        with open(index_path, "w") as index_file:
+            index_file.write(
+                '{"tar_size": 1, "tar_mtime_ns": 1, "members": [["stale.jpg", 0, 1]]}'
+            )
+        assert TarIndex.load_or_build(self.tar_path, index_directory).members == (
+            tar_index.members
+        )
+
+        TarIndex.load_or_build(self.tar_path)
+        assert os.path.exists(self.tar_path + ".index.json")
+
+        with open(index_path, "w") as index_file:
+            index_file.write("not json")
+        with self.assertRaises(CustomException):
+            TarIndex.load(index_path)
+
+    def test_split_by_byte_range(self):
+        tar_index = TarIndex.build(self.tar_path)
+        image_names = {"image_1", "image_2", "image_3", "image_4"}
+
+        byte_ranges = tar_index.split_by_byte_range(image_names, 2)
+        assert len(byte_ranges) == 2
+
+        members_of_ranges = [
+            tar_index.get_members_of_images(image_names, byte_range)
+            for byte_range in byte_ranges
+        ]
+        assert [
+            [get_image_name_of_member(member[0]) for member in members]
+            for members in members_of_ranges
+        ] == [["image_1", "image_2"], ["image_3", "image_4"]]
+
+        assert len(tar_index.split_by_byte_range(image_names, 10)) == 4
+        assert tar_index.split_by_byte_range({"not_an_image"}, 2) == []
+
+    def test_map_tarfile(self):
+        tar_index = TarIndex.build(self.tar_path)
+        tar_view = map_tarfile(self.tar_path)
+
+        for member_name, offset, size in tar_index.members:
+            member_view = tar_view[offset : offset + size]
+            assert member_view.readonly
+            assert member_view == self.members[member_name]
+
+        member_file = MemoryViewFile(memoryview(b"0123456789"))
+        assert member_file.read(3) == b"012"
+        assert member_file.seek(-2, io.SEEK_END) == 8
+        assert member_file.read() == b"89"
+        assert member_file.read(5) == b""
+        assert member_file.seek(-3, io.SEEK_CUR) == 7
+        assert member_file.tell() == 7
+
+
+if __name__ == "__main__":
+    unittest.main()